@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""A program to measure the speed of the built-in dataset plugins.
+
+Each plugin is run on datasets of the sizes given (by default 10^6
+and 10^7 points) and its throughput (points per second) is compared
+with a baseline file. The program returns the number of plugins which
+were slower than the baseline by more than the tolerance, or which are
+missing from it, and fails if there is no baseline file. If you use an
+argument "regenerate", the baseline file is recreated instead.
+
+Baselines depend on the computer, so should be regenerated before
+making changes to the plugins on the computer used for testing.
+
+This program requires the veusz module to be on the PYTHONPATH.
+"""
+
+from __future__ import print_function, division
+import json
+import os.path
+import sys
+import time
+import optparse
+
+import numpy as N
+
+import veusz.qtall as qt4
+
+# an application is needed before fonts are loaded by the settings
+app = qt4.QApplication([])
+
+import veusz.document as document
+import veusz.datasets as datasets
+import veusz.plugins as plugins
+
+# required to get structures initialised
+import veusz.windows.mainwindow
+
+# name, plugin class, fields
+benchmarks = [
+    ('movingaverage', plugins.MovingAveragePlugin,
+     {'ds_in': 'y', 'width': 10, 'weighterrors': True, 'ds_out': 'out'}),
+    ('rebinxy', plugins.ReBinXYPlugin,
+     {'ds_y': 'y', 'ds_x': 'x', 'binsize': 10, 'mode': 'average',
+      'ds_yout': 'out', 'ds_xout': 'outx'}),
+    ('histogram2d', plugins.Histogram2D,
+     {'ds_inx': 'x', 'ds_iny': 'y', 'minx': 'Auto', 'maxx': 'Auto',
+      'miny': 'Auto', 'maxy': 'Auto', 'binsx': 100, 'binsy': 100,
+      'mode': 'Count', 'ds_out': 'out'}),
+    ('interleave', plugins.InterleaveDatasetPlugin,
+     {'ds_in': ('x', 'y'), 'ds_out': 'out'}),
+    ('demultiplex', plugins.DemultiplexPlugin,
+     {'ds_in': 'y', 'ds_out': ('out1', 'out2', 'out3')}),
+    ('extremes', plugins.ExtremesDatasetPlugin,
+     {'ds_in': ('x', 'y'), 'errorbars': True, 'ds_min': 'outmin',
+      'ds_max': 'outmax', 'ds_errorbar': 'out'}),
+    ('multiplydatasets', plugins.MultiplyDatasetsPlugin,
+     {'ds_in': ('x', 'y'), 'ds_out': 'out'}),
+    ('groupmean', plugins.GroupMeanPlugin,
+     {'ds_keys': ('key',), 'ds_in': 'y', 'errorbars': 'standard error',
+      'ds_out': 'out', 'ds_labels': ''}),
+    ('groupmedian', plugins.GroupMedianPlugin,
+     {'ds_keys': ('key',), 'ds_in': 'y', 'errorbars': True,
+      'lower': 25., 'upper': 75., 'ds_out': 'out', 'ds_labels': ''}),
+    ]
+
+def makeDocument(size):
+    """Make document containing input datasets of size given."""
+
+    rng = N.random.RandomState(42)
+    doc = document.Document()
+
+    x = N.arange(size, dtype=N.float64)
+    y = rng.normal(size=size)
+    y[::101] = N.nan
+    doc.setData('x', datasets.Dataset(data=x, serr=N.full(size, 0.5)))
+    doc.setData('y', datasets.Dataset(
+        data=y, perr=rng.uniform(0.1, 1, size),
+        nerr=-rng.uniform(0.1, 1, size)))
+    doc.setData('key', datasets.Dataset(
+        data=rng.randint(0, max(size//100, 1), size).astype(N.float64)))
+    return doc
+
+def timePlugin(doc, pluginkls, fields, repeats):
+    """Return shortest time taken to run plugin."""
+
+    helper = plugins.DatasetPluginHelper(doc)
+    best = None
+    for i in range(repeats):
+        plugin = pluginkls()
+        allfields = dict([(f.name, f.default) for f in plugin.fields])
+        allfields.update(fields)
+        plugin.getDatasets(allfields)
+
+        start = time.time()
+        plugin.updateDatasets(allfields, helper)
+        taken = time.time() - start
+        best = taken if best is None else min(best, taken)
+    return best
+
+def runBenchmarks(sizes, repeats):
+    """Run benchmarks, returning dict of 'name size' to points per
+    second."""
+
+    results = {}
+    for size in sizes:
+        doc = makeDocument(size)
+        for name, pluginkls, fields in benchmarks:
+            taken = timePlugin(doc, pluginkls, fields, repeats)
+            rate = size / max(taken, 1e-9)
+            key = '%s %i' % (name, size)
+            results[key] = rate
+            print('%-28s %10.3f s %12.4g points/s' % (key, taken, rate))
+    return results
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage='%prog [options] [regenerate]')
+    parser.add_option(
+        '', '--sizes', default='1e6,1e7',
+        help='comma-separated dataset sizes (default 1e6,1e7)')
+    parser.add_option(
+        '', '--repeats', type='int', default=3,
+        help='number of times to run each plugin (default 3)')
+    parser.add_option(
+        '', '--tolerance', type='float', default=0.3,
+        help='fractional slowdown allowed relative to baseline '
+        '(default 0.3)')
+    parser.add_option(
+        '', '--baseline',
+        default=os.path.join(os.path.dirname(__file__),
+                             'benchmarkplugins.json'),
+        help='baseline file')
+
+    options, args = parser.parse_args()
+    if args not in ([], ['regenerate']):
+        parser.error("argument must be empty or 'regenerate'")
+    if not args and not os.path.exists(options.baseline):
+        print('No baseline file %s: run with "regenerate" to create it' %
+              options.baseline)
+        sys.exit(1)
+
+    sizes = [int(float(s)) for s in options.sizes.split(',')]
+    results = runBenchmarks(sizes, options.repeats)
+
+    if args == ['regenerate']:
+        with open(options.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print('Wrote baseline to %s' % options.baseline)
+        sys.exit(0)
+
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+
+    print()
+    fails = 0
+    for key in sorted(results):
+        if key not in baseline:
+            print('%-28s MISSING from baseline' % key)
+            fails += 1
+            continue
+        ratio = results[key] / baseline[key]
+        if ratio < 1 - options.tolerance:
+            print('%-28s REGRESSED: %.2f times baseline throughput' % (
+                key, ratio))
+            fails += 1
+
+    if fails == 0:
+        print('No throughput regressions')
+    else:
+        print('%i benchmarks regressed or missing from baseline' % fails)
+    sys.exit(fails)
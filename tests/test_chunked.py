@@ -0,0 +1,165 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Tests of editing datasets stored in chunks."""
+
+import os
+import unittest
+
+import numpy as N
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import veusz.qtall as qt4
+app = qt4.QApplication.instance() or qt4.QApplication([])
+
+import veusz.document as document
+import veusz.datasets as datasets
+from veusz.dialogs.dataeditdialog import DatasetTableModel1D
+
+# required to get structures initialised
+import veusz.windows.mainwindow
+
+class ChunkedColumnTest(unittest.TestCase):
+
+    def setUp(self):
+        self.oldchunksize = datasets.ChunkedColumn.chunksize
+        datasets.ChunkedColumn.chunksize = 4
+
+    def tearDown(self):
+        datasets.ChunkedColumn.chunksize = self.oldchunksize
+
+    def testEdit(self):
+        """Setting, inserting and deleting across chunks."""
+        vals = N.arange(20.)
+        orig = vals.copy()
+        col = datasets.ChunkedColumn(vals)
+        expected = list(orig)
+
+        col[5] = -1
+        expected[5] = -1
+        col.insert(6, [100., 101., 102., 103., 104., 105.])
+        expected[6:6] = [100., 101., 102., 103., 104., 105.]
+        col.insert(len(col), [200.])
+        expected.append(200.)
+        deleted = col.delete(2, 9)
+        self.assertEqual(list(deleted), expected[2:11])
+        del expected[2:11]
+
+        self.assertEqual(len(col), len(expected))
+        self.assertEqual([col[i] for i in range(len(col))], expected)
+        self.assertEqual(list(col.toArray()), expected)
+        # the original array is not modified
+        self.assertTrue(N.all(vals == orig))
+
+    def testInsertPromote(self):
+        """Integer columns are promoted when inserting non-integers."""
+        col = datasets.ChunkedColumn(N.arange(10, dtype=N.int32))
+        col.insert(2, [7., 8.])
+        self.assertEqual(col.dtype, N.int32)
+
+        col.insert(3, [1.5, N.nan])
+        self.assertEqual(col.dtype.kind, 'f')
+        out = col.toArray()
+        self.assertEqual(list(out[:4]), [0., 1., 7., 1.5])
+        self.assertEqual(list(out[5:7]), [8., 2.])
+        self.assertTrue(N.isnan(col[4]))
+
+        col = datasets.ChunkedColumn(N.arange(5, dtype=N.int8))
+        col.insert(0, [1000.])
+        self.assertEqual(col[0], 1000.)
+
+        col = datasets.ChunkedColumn(N.array([True, False]))
+        col.insert(1, [0., 1.])
+        self.assertEqual(col.dtype.kind, 'b')
+        col.insert(1, [2.])
+        self.assertEqual(list(col.toArray()), [1., 2., 0., 1., 0.])
+
+class DatasetEditTest(unittest.TestCase):
+
+    def setUp(self):
+        self.oldchunksize = datasets.ChunkedColumn.chunksize
+        datasets.ChunkedColumn.chunksize = 4
+
+        self.doc = document.Document()
+        self.doc.setData('x', datasets.Dataset(
+            data=N.arange(10.), serr=N.arange(10.)*0.1))
+        self.rowsignals = []
+        self.doc.sigDatasetRows.connect(
+            lambda ds, *rows: self.rowsignals.append(rows))
+
+    def tearDown(self):
+        datasets.ChunkedColumn.chunksize = self.oldchunksize
+
+    def values(self):
+        ds = self.doc.data['x']
+        return list(ds.data), list(ds.serr)
+
+    def testInsertDeleteUndo(self):
+        """Rows inserted and deleted are restored by undoing."""
+        orig = self.values()
+
+        self.doc.applyOperation(
+            document.OperationDatasetInsertRow('x', 3, 2))
+        data, serr = self.values()
+        self.assertEqual(data[:5], [0., 1., 2., 0., 0.])
+        self.assertEqual(len(data), 12)
+        self.assertEqual(len(serr), 12)
+
+        self.doc.applyOperation(
+            document.OperationDatasetDeleteRow('x', 1, 6))
+        data, serr = self.values()
+        self.assertEqual(data, [0., 5., 6., 7., 8., 9.])
+
+        self.doc.applyOperation(
+            document.OperationDatasetSetVal('x', 'data', 2, 42.))
+        self.assertEqual(self.values()[0], [0., 5., 42., 7., 8., 9.])
+
+        self.assertEqual(self.rowsignals, [(3, 0, 2), (1, 6, 0), (2, 1, 1)])
+
+        for i in range(3):
+            self.doc.undoOperation()
+        self.assertEqual(self.values(), orig)
+
+    def testModelUpdate(self):
+        """The data editor only updates changed rows, without joining
+        edited columns."""
+        model = DatasetTableModel1D(None, self.doc, 'x')
+        changed, layout = [], []
+        model.dataChanged.connect(
+            lambda a, b, *args: changed.append((a.row(), b.row())))
+        model.layoutChanged.connect(lambda *args: layout.append(True))
+
+        for row in (4, 2):
+            self.doc.applyOperation(
+                document.OperationDatasetSetVal('x', 'data', row, -1.))
+        self.assertEqual(changed, [(4, 4), (2, 2)])
+        self.assertEqual(layout, [])
+
+        ds = self.doc.data['x']
+        self.assertEqual(model.rowCount(qt4.QModelIndex()), 11)
+        self.assertEqual(
+            model.data(model.index(4, 0), qt4.Qt.DisplayRole), -1.)
+        self.assertIn('data', ds.__dict__['_editchunks'])
+
+        # a change in the number of rows updates the whole view
+        self.doc.applyOperation(
+            document.OperationDatasetInsertRow('x', 0, 1))
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(layout, [True])
+        self.assertEqual(model.rowCount(qt4.QModelIndex()), 12)
+
+if __name__ == '__main__':
+    unittest.main()
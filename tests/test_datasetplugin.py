@@ -0,0 +1,120 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Tests of the helper functions and processes of the dataset plugins."""
+
+import os
+import threading
+import time
+import unittest
+
+import numpy as N
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import veusz.qtall as qt4
+app = qt4.QApplication.instance() or qt4.QApplication([])
+
+import veusz.document as document
+from veusz.plugins.datasetplugin import (
+    rollingAverage, DatasetPlugin, DatasetPluginManager, _ProcessPool)
+
+# required to get structures initialised
+import veusz.windows.mainwindow
+
+def directRollingAverage(data, weights, width):
+    """Rolling average summing each window in turn, as done by the
+    compiled helper."""
+    size = len(data) if weights is None else min(len(data), len(weights))
+    out = N.zeros(size)
+    for i in range(size):
+        ct = tot = 0.
+        for ri in range(max(i-width, 0), min(i+width+1, size)):
+            if not N.isfinite(data[ri]):
+                continue
+            w = 1. if weights is None else weights[ri]
+            if N.isfinite(w):
+                ct += w
+                tot += w*data[ri]
+        out[i] = tot/ct if ct != 0. else N.nan
+    return out
+
+class RollingAverageTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = N.random.RandomState(42)
+        self.data = rng.normal(size=4000) + 100.
+        self.data[[10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 3000]] = N.nan
+
+    def check(self, weights, width):
+        out = rollingAverage(self.data, weights, width)
+        expected = directRollingAverage(self.data, weights, width)
+        self.assertTrue(N.array_equal(N.isnan(out), N.isnan(expected)))
+        ok = N.isfinite(expected)
+        N.testing.assert_allclose(out[ok], expected[ok], rtol=1e-12)
+
+    def testUnweighted(self):
+        for width in (0, 1, 5, 37):
+            self.check(None, width)
+
+    def testBadlyScaledWeights(self):
+        """Small errors in one part of the data do not lose precision
+        in the average of the rest."""
+        err = N.ones(4000)
+        err[:2000] = 1e-9
+        self.check(1./err**2, 5)
+
+class ProcessPlugin(DatasetPlugin):
+    run_in_process = True
+
+def inThread(fn):
+    """Return result of calling fn in another thread."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join(30)
+    return result[0]
+
+class ProcessTest(unittest.TestCase):
+
+    def testUseProcess(self):
+        """Plugins are run in processes when painting in another
+        thread, which has no event loop."""
+        manager = DatasetPluginManager(
+            ProcessPlugin(), document.Document(), {})
+        self.assertFalse(manager.useProcess())
+        self.assertTrue(inThread(manager.useProcess))
+
+    def testSubmitInThread(self):
+        """Results of jobs submitted in another thread are passed back
+        in the main thread."""
+        pool = inThread(lambda: _ProcessPool(1))
+        try:
+            calls = []
+            inThread(lambda: pool.submit(
+                max, (3, 4), lambda ok, res: calls.append(
+                    (ok, res, threading.current_thread()))))
+
+            start = time.time()
+            while not calls and time.time()-start < 30:
+                app.processEvents()
+                time.sleep(0.01)
+            self.assertEqual(
+                calls, [(True, 4, threading.main_thread())])
+        finally:
+            pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Tests of decimating and thinning the markers of xy plots."""
+
+import os
+import unittest
+
+import numpy as N
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import veusz.qtall as qt4
+app = qt4.QApplication.instance() or qt4.QApplication([])
+
+import veusz.document as document
+import veusz.datasets as datasets
+import veusz.utils as utils
+from veusz.widgets.point import _thinSegments
+
+# required to get structures initialised
+import veusz.windows.mainwindow
+
+def renderMarkers(x, y, decimate, size=4.):
+    """Render opaque markers onto a transparent image, returning the
+    pixels as an array."""
+    img = qt4.QImage(200, 150, qt4.QImage.Format_ARGB32_Premultiplied)
+    img.fill(0)
+    painter = qt4.QPainter(img)
+    painter.setRenderHint(qt4.QPainter.Antialiasing)
+    painter.setBrush(qt4.QBrush(qt4.QColor('red')))
+    painter.setPen(qt4.QPen(qt4.QColor('black'), 1.))
+    clip = qt4.QRectF(0, 0, 200, 150)
+    if decimate:
+        idx = utils.decimateMarkers(x, y, clip, size*2+1)
+        x, y = x[idx], y[idx]
+    utils.plotMarkers(painter, x, y, 'circle', size, clip=clip)
+    painter.end()
+
+    ptr = img.constBits()
+    ptr.setsize(img.byteCount())
+    pixels = N.frombuffer(ptr, dtype=N.uint8).reshape((150, 200, 4))
+    return pixels.astype(N.int64), len(x)
+
+class DecimateMarkersTest(unittest.TestCase):
+
+    def testOpaqueRender(self):
+        """Decimated opaque markers cover the same pixels, differing
+        only in their antialiased edges."""
+        rng = N.random.RandomState(1)
+        n = 20000
+        x = N.repeat(rng.uniform(0, 200, 200), 100) + rng.normal(0, 0.3, n)
+        y = N.repeat(rng.uniform(0, 150, 200), 100) + rng.normal(0, 0.3, n)
+
+        full, numfull = renderMarkers(x, y, False)
+        dec, numdec = renderMarkers(x, y, True)
+        self.assertLess(numdec, numfull//2)
+        self.assertTrue(N.array_equal(full[:,:,3] > 0, dec[:,:,3] > 0))
+        diff = N.abs(full-dec).max(axis=2)
+        self.assertLess(diff.mean(), 4.)
+
+    def testTransparent(self):
+        """Markers are only decimated if enabled and opaque."""
+        doc = document.Document()
+        doc.makeDefaultDoc()
+        graph = doc.basewidget.children[0].children[0]
+        xy = document.thefactory.makeWidget('xy', graph)
+        s = xy.settings
+        cmap = doc.evaluate.getColormap('grey', False)
+
+        self.assertFalse(xy._canDecimateMarkers(None))
+        s.get('decimate').val = True
+        self.assertTrue(xy._canDecimateMarkers(None))
+        self.assertTrue(xy._canDecimateMarkers(cmap))
+
+        self.assertFalse(xy._canDecimateMarkers(
+            doc.evaluate.getColormap('transblack', False)))
+        s.MarkerFill.get('transparency').val = 50
+        self.assertFalse(xy._canDecimateMarkers(None))
+        s.MarkerFill.get('transparency').val = 0
+        s.MarkerLine.get('color').val = '#80000000'
+        self.assertFalse(xy._canDecimateMarkers(None))
+        s.MarkerLine.get('hide').val = True
+        self.assertTrue(xy._canDecimateMarkers(None))
+        s.MarkerFill.get('hide').val = True
+        self.assertFalse(xy._canDecimateMarkers(None))
+        s.MarkerFill.get('hide').val = False
+        s.get('marker').val = 'circlehole'
+        self.assertFalse(xy._canDecimateMarkers(None))
+
+class ThinMarkersTest(unittest.TestCase):
+
+    def testSegments(self):
+        """Each run of valid points is thinned from its first point."""
+        idx, segments = _thinSegments([(0, 5), (5, 12), (12, 13)], 3)
+        self.assertEqual(list(idx), [0, 3, 5, 8, 11, 12])
+        self.assertEqual(segments, [(0, 2), (2, 5), (5, 6)])
+
+class DecimateLineTest(unittest.TestCase):
+
+    def testPyramid(self):
+        """Points selected using the pyramid give the same decimated
+        line as all the points, in the visible range."""
+        rng = N.random.RandomState(2)
+        n = 200000
+        x = N.linspace(0, 400, n)
+        y = N.cumsum(rng.normal(size=n))
+
+        pyramid = datasets.MinMaxPyramid(y)
+        idx = pyramid.selectIndices(
+            n, lambda i: x[i], 50., 350., utils.linecellsize)
+        self.assertLess(len(idx), n//10)
+
+        full = N.flatnonzero(utils.decimateLine(x, y))
+        sel = idx[utils.decimateLine(x[idx], y[idx])]
+        visible = lambda i: i[(x[i] >= 60.) & (x[i] <= 340.)]
+        self.assertTrue(N.array_equal(visible(full), visible(sel)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Tests of evaluating expressions and caching the results."""
+
+import os
+import threading
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import veusz.qtall as qt4
+app = qt4.QApplication.instance() or qt4.QApplication([])
+
+import veusz.document as document
+import veusz.datasets as datasets
+import veusz.setting as setting
+
+# required to get structures initialised
+import veusz.windows.mainwindow
+
+class CustomFunctionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.oldmemoise = setting.settingdb.get('custom_memoise')
+        setting.settingdb['custom_memoise'] = True
+
+        self.doc = document.Document()
+        self.doc.setData('x', datasets.Dataset(data=[1.]))
+        self.doc.evaluate.customs = [
+            ('function', 'getx(a)', 'a + DATA("x")[0]'),
+            ('function', 'twicex(a)', 'getx(a)*2'),
+            ('function', 'fname()', 'BASENAME()'),
+            ('function', 'triple(a)', 'a*3'),
+            ]
+        self.doc.evaluate.update()
+        self.context = self.doc.evaluate.context
+
+    def tearDown(self):
+        setting.settingdb['custom_memoise'] = self.oldmemoise
+
+    def testImpure(self):
+        """Functions using impure functions are not cached."""
+        impure = self.doc.evaluate.impurecustoms
+        self.assertIn('getx', impure)
+        self.assertIn('fname', impure)
+        self.assertNotIn('triple', impure)
+
+    def testTransitiveImpure(self):
+        """Functions calling impure custom functions are not cached."""
+        self.assertIn('twicex', self.doc.evaluate.impurecustoms)
+        self.assertEqual(self.context['twicex'](1.), 4.)
+        self.doc.setData('x', datasets.Dataset(data=[10.]))
+        self.assertEqual(self.context['twicex'](1.), 22.)
+
+    def testCached(self):
+        """Pure functions are cached until the document changes."""
+        cache = self.doc.evaluate.funccache
+        triple = self.context['triple']
+        self.assertEqual(triple(2.), 6.)
+        self.assertEqual(triple(2.), 6.)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.doc.setData('y', datasets.Dataset(data=[2.]))
+        self.assertEqual(triple(2.), 6.)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+class EvaluationThreadTest(unittest.TestCase):
+
+    def testRead(self):
+        """Datasets read while being evaluated in another thread wait
+        for the evaluation to finish."""
+        doc = document.Document()
+        doc.setData('x', datasets.Dataset(data=[1., 2., 3.]))
+        ds = datasets.DatasetExpression(data='x*2')
+        doc.setData('y', ds)
+
+        started, release = threading.Event(), threading.Event()
+        evaluatepart = ds._evaluatePart
+        def slowEvaluatePart(expr, part):
+            started.set()
+            release.wait(10)
+            return evaluatepart(expr, part)
+        ds._evaluatePart = slowEvaluatePart
+
+        results = []
+        def read():
+            results.append(list(ds.data))
+        painter = threading.Thread(target=read)
+        painter.start()
+        self.assertTrue(started.wait(10))
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(0.2)
+        self.assertTrue(reader.is_alive())
+
+        release.set()
+        painter.join(10)
+        reader.join(10)
+        self.assertEqual(results, [[2., 4., 6.], [2., 4., 6.]])
+
+class RenderCacheKeyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = document.Document()
+        self.doc.makeDefaultDoc()
+        self.doc.setData('d', datasets.Dataset(data=[8.]))
+        graph = self.doc.basewidget.children[0].children[0]
+        self.func = document.thefactory.makeWidget('function', graph)
+        self.axes = graph.getAxes(('x', 'y'))
+        for axis in self.axes:
+            axis.computePlottedRange()
+
+    def key(self, function):
+        self.func.settings.get('function').val = function
+        return self.func.renderCacheKey(self.axes)
+
+    def testPure(self):
+        self.assertIsNotNone(self.key('x**2'))
+
+    def testImpure(self):
+        """Plotters using data not in their settings are not reused."""
+        self.assertIsNone(self.key('DATA("d")[0]*x'))
+
+        self.doc.evaluate.customs = [
+            ('function', 'dval(a)', 'DATA("d")[0]*a')]
+        self.doc.evaluate.update()
+        self.assertIsNone(self.key('dval(x)'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Tests of selections used to filter datasets."""
+
+import os
+import unittest
+
+import numpy as N
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import veusz.qtall as qt4
+app = qt4.QApplication.instance() or qt4.QApplication([])
+
+import veusz.document as document
+import veusz.datasets as datasets
+
+# required to get structures initialised
+import veusz.windows.mainwindow
+
+class SelectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = document.Document()
+        self.doc.setData('x', datasets.Dataset(data=[1., 2., 3., 4., 5.]))
+        self.doc.setData('one', datasets.Dataset(data=[7.]))
+        self.doc.setData('three', datasets.Dataset(data=[1., 2., 3.]))
+
+    def check(self, expr):
+        """Selection is the same as evaluating the whole expression."""
+        sel, err = datasets.evalSelection(self.doc, expr)
+        ds = datasets.evalDatasetExpression(self.doc, expr)
+        if ds is None:
+            self.assertIsNone(sel)
+        else:
+            self.assertIsNone(err)
+            self.assertEqual(
+                list(sel.mask), list(N.asarray(ds.data, dtype=bool)))
+
+    def testBroadcast(self):
+        """Selections of one row are broadcast when combined."""
+        self.check('(x>1) & (one>0)')
+        self.check('(one>0) & (x>1)')
+        self.check('(x>3) | (one<0)')
+        sel = datasets.evalSelection(self.doc, '(x>1) & (one>0)')[0]
+        self.assertEqual(list(sel.mask), [False, True, True, True, True])
+
+    def testLengths(self):
+        """Terms of different lengths are evaluated together."""
+        self.check('(x>1) & (x<4)')
+        self.check('(x>1) & (three>1)')
+
+if __name__ == '__main__':
+    unittest.main()
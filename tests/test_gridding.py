@@ -0,0 +1,81 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Tests of gridding scattered points."""
+
+import unittest
+
+import numpy as N
+
+from veusz.datasets import gridding
+
+def bruteNearest(x, y, z, xaxis, yaxis):
+    """Value of the nearest point to each cell centre, in cell units."""
+    out = N.zeros((yaxis[2], xaxis[2]))
+    for j in range(yaxis[2]):
+        for i in range(xaxis[2]):
+            dx = (x - (xaxis[0]+i*xaxis[1])) / xaxis[1]
+            dy = (y - (yaxis[0]+j*yaxis[1])) / yaxis[1]
+            out[j, i] = z[N.argmin(dx**2 + dy**2)]
+    return out
+
+class GriddingTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = N.random.RandomState(3)
+        self.x = rng.uniform(0, 10, 300)
+        self.y = rng.uniform(-5, 5, 300)
+        self.z = rng.normal(size=300)
+
+    def testSingleCell(self):
+        """Axes with a single cell cover the data."""
+        xaxis = gridding.autoGridAxis(self.x, 6)
+        yaxis = gridding.autoGridAxis(self.y, 1)
+        self.assertEqual(yaxis[2], 1)
+        lo, hi = gridding.axisRange(yaxis)
+        self.assertAlmostEqual(lo, self.y.min())
+        self.assertAlmostEqual(hi, self.y.max())
+
+        for mode in ('nearest', 'average', 'linear'):
+            out = gridding.gridPoints(
+                self.x, self.y, self.z, mode, xaxis, yaxis)
+            self.assertEqual(out.shape, (1, 6))
+            self.assertTrue(N.isfinite(out).all())
+
+        out = gridding.gridPoints(
+            self.x, self.y, self.z, 'nearest', xaxis, yaxis)
+        expected = bruteNearest(self.x, self.y, self.z, xaxis, yaxis)
+        self.assertTrue(N.array_equal(out, expected))
+
+    def testNearestOutside(self):
+        """Nearest points are found when all points are outside the
+        grid."""
+        x = N.array([-100., 100.])
+        y = N.array([0., 0.])
+        z = N.array([1., 2.])
+        xaxis, yaxis = (0., 1., 2), (0., 1., 1)
+        out = gridding.gridPoints(x, y, z, 'nearest', xaxis, yaxis)
+        self.assertTrue(N.array_equal(out, [[1., 2.]]))
+
+    def testNearest(self):
+        xaxis = gridding.autoGridAxis(self.x, 15)
+        yaxis = gridding.autoGridAxis(self.y, 12)
+        out = gridding.gridPoints(
+            self.x, self.y, self.z, 'nearest', xaxis, yaxis)
+        expected = bruteNearest(self.x, self.y, self.z, xaxis, yaxis)
+        self.assertTrue(N.array_equal(out, expected))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Tests of the limits on the undo history."""
+
+import os
+import time
+import unittest
+
+import numpy as N
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import veusz.qtall as qt4
+app = qt4.QApplication.instance() or qt4.QApplication([])
+
+import veusz.document as document
+import veusz.datasets as datasets
+import veusz.setting as setting
+
+# required to get structures initialised
+import veusz.windows.mainwindow
+
+class HistoryLimitTest(unittest.TestCase):
+
+    settings = {
+        'undo_memory': 0.05,
+        'undo_budget': 0.2,
+        'undo_steps': 100,
+        'undo_spill': True,
+        }
+
+    def setUp(self):
+        self.oldsettings = dict([
+            (k, setting.settingdb.get(k)) for k in self.settings])
+        for k, v in self.settings.items():
+            setting.settingdb[k] = v
+        self.doc = document.Document()
+
+    def tearDown(self):
+        for k, v in self.oldsettings.items():
+            if v is None:
+                del setting.settingdb[k]
+            else:
+                setting.settingdb[k] = v
+
+    def setData(self, i, size=1000):
+        self.doc.applyOperation(document.OperationDatasetSet(
+            'x', datasets.Dataset(data=N.arange(size)+i)))
+
+    def testStepLimit(self):
+        """The history is limited to the maximum number of steps, and
+        the time to add an operation does not grow."""
+        times = []
+        for block in range(3):
+            start = time.time()
+            for i in range(1000):
+                self.setData(block*1000+i, size=10)
+            times.append(time.time()-start)
+        self.assertEqual(len(self.doc.historyundo), 100)
+        self.assertEqual(len(self.doc.historyspill.entries), 100)
+        self.assertLess(times[-1], times[0]*3 + 0.5)
+
+    def testMemoryLimit(self):
+        """Data are spilled and dropped to keep within limits."""
+        spill = self.doc.historyspill
+        for i in range(3000):
+            self.setData(i)
+            self.assertLessEqual(spill.memsize, 0.05*1024**2 + 8000)
+            self.assertLessEqual(spill.totalSize(), 0.2*1024**2)
+        self.assertGreater(spill.spillsize, 0)
+        self.assertLess(len(self.doc.historyundo), 100)
+
+    def testUndoSpilled(self):
+        """Spilled data are restored when undoing."""
+        for i in range(30):
+            self.setData(i)
+        numundo = len(self.doc.historyundo)
+        for i in range(numundo):
+            self.doc.undoOperation()
+            if 28-i < 0:
+                # undone creation of dataset
+                self.assertNotIn('x', self.doc.data)
+            else:
+                expected = N.arange(1000) + (28-i)
+                self.assertTrue(N.all(self.doc.data['x'].data == expected))
+        spill = self.doc.historyspill
+        self.assertEqual(len(spill.records), 0)
+        self.assertEqual(spill.memsize + spill.spillsize, 0)
+
+if __name__ == '__main__':
+    unittest.main()
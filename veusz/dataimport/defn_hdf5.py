@@ -187,10 +187,12 @@ def convertDatasetToObject(data, slices):
         raise _ConvertError(_("Could not get kind of HDF5 dataset"))
 
     if kind in ('b', 'i', 'u', 'f'):
-        data = N.array(data, dtype=N.float64)
+        data = N.array(data)
         if len(data.shape) > 2:
             raise _ConvertError(_("HDF5 dataset has more than 2 dimensions"))
-        return data
+        # keep native types (such as int16) if requested
+        return datasets.convertNumpy(
+            data, dims=data.ndim, native=datasets.nativeDtypes())
 
     elif kind in ('S', 'a') or (
         kind == 'O' and h5py.check_dtype(vlen=data.dtype)):
@@ -504,7 +506,7 @@ class OperationDataImportHDF5(base.OperationDataImportBase):
             tdata = [bconv(d) for d in dread.data]
 
             # standard text dataset
-            ds = datasets.DatasetText(tdata)
+            ds = datasets.makeTextDataset(tdata)
 
         return ds
 
@@ -387,7 +387,7 @@ class ReadCSV(object):
             # create dataset
             dstype = self.nametypes[name]
             if dstype == 'string':
-                ds = datasets.DatasetText(data=data[0], linked=linkedfile)
+                ds = datasets.makeTextDataset(data[0], linked=linkedfile)
             elif dstype == 'date':
                 ds = datasets.DatasetDateTime(data=data[0], linked=linkedfile)
             else:
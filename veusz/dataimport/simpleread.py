@@ -337,8 +337,8 @@ class DescriptorPart(object):
                     ds = datasets.DatasetDateTime( data=vals,
                                                    linked=linkedfile )
                 elif self.datatype == 'string':
-                    ds = datasets.DatasetText( data=vals,
-                                               linked = linkedfile )
+                    ds = datasets.makeTextDataset( vals,
+                                                   linked = linkedfile )
                 else:
                     raise RuntimeError("Invalid data type")
 
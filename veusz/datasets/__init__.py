@@ -17,12 +17,16 @@
 ###############################################################################
 
 from .base import *
+from .stats import *
+from .pyramid import *
+from .chunked import *
 from .oned import *
 from .twod import *
 from .text import *
 from .date import *
 from .filtered import *
 from .histo import *
+from .gridding import *
 from .expression import *
 from .plugin import *
 
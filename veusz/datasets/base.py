@@ -61,6 +61,9 @@ class DatasetConcreteBase(DatasetBase):
     # class for representing part of this dataset
     subsetclass = None
 
+    # increased when values are modified in place
+    dataversion = 0
+
     def __init__(self, linked=None):
         """Initialise commonfn members."""
         # document member set when this dataset is set in document
@@ -127,6 +130,17 @@ class DatasetConcreteBase(DatasetBase):
         """Get description of dataset."""
         return ""
 
+    def memorySize(self):
+        """Return approximate memory used by values in dataset (bytes)."""
+        size = 0
+        for col in (self.columns or ('data',)):
+            val = getattr(self, col, None)
+            if isinstance(val, N.ndarray):
+                size += val.nbytes
+            elif isinstance(val, list):
+                size += sum([len(v) for v in val]) + 8*len(val)
+        return size
+
     def uiConvertToDataItem(self, val):
         """Return a value cast to this dataset data type.
         We assume here it is a float, so override if not
@@ -0,0 +1,245 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+
+"""Columns stored in chunks, for editing datasets."""
+
+from __future__ import division
+import bisect
+
+import numpy as N
+
+class ChunkedColumn(object):
+    """A column of values stored as a list of arrays (chunks).
+
+    Rows can be set, inserted or deleted by changing only the chunks
+    affected. Chunks are initially views of the original array and are
+    copied before being modified.
+    """
+
+    # target number of values in each chunk
+    chunksize = 65536
+
+    def __init__(self, vals):
+        vals = N.asarray(vals)
+        self.dtype = vals.dtype
+        cs = self.chunksize
+        self.chunks = [vals[i:i+cs] for i in range(0, len(vals), cs)]
+        self.owned = [False]*len(self.chunks)
+        self._updateStarts()
+
+    def _updateStarts(self):
+        """Recalculate starting row of each chunk."""
+        lens = [len(c) for c in self.chunks]
+        self.starts = list(N.cumsum([0] + lens[:-1])) if lens else []
+        self.length = sum(lens)
+
+    def _findChunk(self, row):
+        """Return index of chunk containing row, and offset in chunk."""
+        idx = bisect.bisect_right(self.starts, row) - 1
+        return idx, row - self.starts[idx]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, row):
+        idx, off = self._findChunk(row)
+        return self.chunks[idx][off]
+
+    def __setitem__(self, row, val):
+        if row < 0 or row >= self.length:
+            raise IndexError('row out of range')
+        idx, off = self._findChunk(row)
+        if not self.owned[idx]:
+            self.chunks[idx] = N.array(self.chunks[idx])
+            self.owned[idx] = True
+        self.chunks[idx][off] = val
+
+    def insert(self, row, vals):
+        """Insert values before row."""
+        if not self.fits(vals):
+            # columns stored as integers or booleans are promoted
+            self.toFloat()
+        vals = N.asarray(vals, dtype=self.dtype)
+        if not self.chunks:
+            self.chunks, self.owned = [N.array(vals)], [True]
+            self._updateStarts()
+            return
+
+        row = max(0, min(row, self.length))
+        if row == self.length:
+            idx, off = len(self.chunks)-1, len(self.chunks[-1])
+        else:
+            idx, off = self._findChunk(row)
+        chunk = self.chunks[idx]
+        new = N.concatenate((chunk[:off], vals, chunk[off:]))
+
+        # split if chunk has become too large
+        cs = self.chunksize
+        if len(new) > 2*cs:
+            parts = [new[i:i+cs] for i in range(0, len(new), cs)]
+        else:
+            parts = [new]
+        self.chunks[idx:idx+1] = parts
+        self.owned[idx:idx+1] = [True]*len(parts)
+        self._updateStarts()
+
+    def delete(self, row, numrows):
+        """Delete numrows rows from row, returning deleted values."""
+        end = min(row+numrows, self.length)
+        if row >= end:
+            return N.array([], dtype=self.dtype)
+
+        deleted = []
+        chunks, owned = [], []
+        for chunk, own, start in zip(self.chunks, self.owned, self.starts):
+            cend = start + len(chunk)
+            if cend <= row or start >= end:
+                chunks.append(chunk)
+                owned.append(own)
+                continue
+            lo, hi = max(row, start)-start, min(end, cend)-start
+            deleted.append(N.array(chunk[lo:hi]))
+            if lo == 0:
+                # a view of the remaining part still needs copying
+                # before modification, if the chunk was not owned
+                rest = chunk[hi:]
+            elif hi == len(chunk):
+                rest = chunk[:lo]
+            else:
+                rest = N.concatenate((chunk[:lo], chunk[hi:]))
+                own = True
+            if len(rest) > 0:
+                chunks.append(rest)
+                owned.append(own)
+
+        self.chunks, self.owned = chunks, owned
+        self._updateStarts()
+        return N.concatenate(deleted)
+
+    def fits(self, vals):
+        """Can vals (a value or array) be stored in the column without
+        losing their values?"""
+        kind = self.dtype.kind
+        if kind not in 'biu':
+            return True
+        try:
+            vals = N.asarray(vals, dtype=N.float64)
+        except (TypeError, ValueError):
+            return False
+        if kind == 'b':
+            return bool(N.all((vals == 0.) | (vals == 1.)))
+        info = N.iinfo(self.dtype)
+        with N.errstate(invalid='ignore'):
+            return bool(N.all(
+                N.isfinite(vals) & (vals == N.trunc(vals)) &
+                (vals >= info.min) & (vals <= info.max)))
+
+    def toFloat(self):
+        """Convert column to float64."""
+        self.chunks = [c.astype(N.float64) for c in self.chunks]
+        self.owned = [True]*len(self.chunks)
+        self.dtype = N.dtype(N.float64)
+
+    def toArray(self):
+        """Return values as a single array."""
+        if not self.chunks:
+            return N.array([], dtype=self.dtype)
+        elif len(self.chunks) == 1 and self.owned[0]:
+            return self.chunks[0]
+        return N.concatenate(self.chunks)
+
+class DatasetChunkedEdit(object):
+    """Base class for datasets whose columns are edited in chunks.
+
+    Edited columns are removed from the dataset's attributes and kept
+    as ChunkedColumns, so that repeated edits do not copy the whole
+    column. They are joined again when the column is next accessed.
+    """
+
+    def _editColumn(self, col):
+        """Return ChunkedColumn for column col, or None if column is
+        not present."""
+        chunks = self.__dict__.setdefault('_editchunks', {})
+        if col in chunks:
+            return chunks[col]
+        vals = self.__dict__.get(col)
+        if vals is None:
+            return None
+        chunks[col] = chunked = ChunkedColumn(vals)
+        del self.__dict__[col]
+        return chunked
+
+    def __getattr__(self, attr):
+        """Join edited column when it is accessed."""
+        chunks = self.__dict__.get('_editchunks')
+        if chunks and attr in chunks:
+            vals = chunks.pop(attr).toArray()
+            self.__dict__[attr] = vals
+            return vals
+        raise AttributeError(attr)
+
+    def columnView(self, col):
+        """Return column col for reading values without joining it if
+        it is being edited (a ChunkedColumn or array), or None if the
+        column is not present."""
+        chunks = self.__dict__.get('_editchunks')
+        if chunks and col in chunks:
+            return chunks[col]
+        return getattr(self, col)
+
+    def _editedColumns(self):
+        """Return columns which are present, for editing."""
+        out = []
+        for col in self.columns:
+            chunked = self._editColumn(col)
+            if chunked is not None:
+                out.append((col, chunked))
+        return out
+
+    def setValue(self, col, row, val):
+        """Set value of column col at row, returning old value."""
+        chunked = self._editColumn(col)
+        if chunked is None:
+            raise ValueError('column %s not present' % col)
+        if not chunked.fits(val):
+            # columns stored as integers or booleans are promoted
+            chunked.toFloat()
+        oldval = chunked[row]
+        chunked[row] = val
+        self.document.modifiedData(self, rows=(row, 1, 1))
+        return oldval
+
+    def deleteRows(self, row, numrows):
+        """Delete numrows rows starting from row.
+        Returns deleted rows as a dict of {column:data, ...}
+        """
+        retn = {}
+        for col, chunked in self._editedColumns():
+            retn[col] = chunked.delete(row, numrows)
+        self.document.modifiedData(self, rows=(row, numrows, 0))
+        return retn
+
+    def insertRows(self, row, numrows, rowdata):
+        """Insert numrows rows starting from row.
+        rowdata is a dict of {column: data}.
+        """
+        for col, chunked in self._editedColumns():
+            data = N.zeros(numrows)
+            if col in rowdata:
+                data[:len(rowdata[col])] = N.array(rowdata[col])
+            chunked.insert(row, data)
+        self.document.modifiedData(self, rows=(row, 0, numrows))
@@ -26,17 +26,35 @@ def _(text, disambiguation=None, context="Datasets"):
     """Translate text."""
     return qt4.QCoreApplication.translate(context, text, disambiguation)
 
-def convertNumpy(a, dims=1):
+# kinds of numpy array which can be kept in their native type
+native_dtype_kinds = 'biuf'
+
+def nativeDtypes():
+    """Should datasets keep arrays in their native numeric type?"""
+    from .. import setting
+    return setting.settingdb.get('dataset_native_dtype', False)
+
+def floatArray(a):
+    """Return numeric array as float64, copying only if necessary."""
+    if ( isinstance(a, N.ndarray) and a.dtype != N.float64 and
+         a.dtype.kind in native_dtype_kinds ):
+        return a.astype(N.float64)
+    return a
+
+def convertNumpy(a, dims=1, native=False):
     """Convert to a numpy double if possible.
 
     dims is number of dimensions to check for
+    if native is set, integer, boolean and floating point arrays keep
+    their type
     """
     if a is None:
         # leave as None
         return None
     elif isinstance(a, N.ndarray):
         # make conversion if numpy type is not correct
-        if a.dtype != N.float64:
+        if a.dtype != N.float64 and not (
+                native and a.dtype.kind in native_dtype_kinds):
             a = a.astype(N.float64)
     else:
         # convert to numpy array
@@ -28,6 +28,7 @@ from ..compat import cbasestr, cstr, crepr
 from .commonfn import _
 from .commonfn import *
 from .oned import Dataset1DBase
+from .chunked import DatasetChunkedEdit
 
 class DatasetDateTimeBase(Dataset1DBase):
     """Dataset holding dates and times."""
@@ -72,7 +73,7 @@ class DatasetDateTimeBase(Dataset1DBase):
         lines.append('')
         return '\n'.join(lines)
 
-class DatasetDateTime(DatasetDateTimeBase):
+class DatasetDateTime(DatasetChunkedEdit, DatasetDateTimeBase):
     """Standard date/time class for use by humans."""
 
     editable = True
@@ -100,27 +101,6 @@ class DatasetDateTime(DatasetDateTimeBase):
         data.attrs['vsz_convert_datetime'] = 1
         data.attrs['vsz_name'] = name.encode('utf-8')
 
-    def deleteRows(self, row, numrows):
-        """Delete numrows rows starting from row.
-        Returns deleted rows as a dict of {column:data, ...}
-        """
-        retn = {
-            'data': self.data[row:row+numrows],
-        }
-        self.data = N.delete(self.data, N.s_[row:row+numrows])
-        self.document.modifiedData(self)
-        return retn
-
-    def insertRows(self, row, numrows, rowdata):
-        """Insert numrows rows starting from row.
-        rowdata is a dict of {column: data}.
-        """
-        data = N.zeros(numrows)
-        if 'data' in rowdata:
-            data[:len(rowdata['data'])] = N.array(rowdata['data'])
-        self.data =  N.insert(self.data, [row]*numrows, data)
-        self.document.modifiedData(self)
-
     def changeValues(self, thetype, vals):
         """Change the requested part of the dataset to vals.
 
@@ -19,15 +19,20 @@
 """For evaluating dataset expressions and dataset classes using expressions."""
 
 from __future__ import division
+import ast
+import hashlib
 import re
+import tempfile
 import numpy as N
 
 from .commonfn import _
 from .commonfn import *
 from .base import DatasetExpressionException
+from .stats import RangeStats
 from .oned import Dataset1DBase, Dataset
 from .twod import Dataset2DBase, Dataset2D
 from .text import DatasetText
+from . import gridding
 
 from ..compat import czip, crange, cstr, crepr
 from .. import utils
@@ -70,22 +75,137 @@ def substituteDatasets(datasets, expression, thispart):
 
     return ''.join(bits), dslist
 
-def _evaluateDataset(datasets, dsname, dspart):
+def _evaluateDataset(datasets, dsname, dspart, tofloat=True):
     """Return the dataset given.
 
     dsname is the name of the dataset
     dspart is the part to get (e.g. data, serr)
+    tofloat converts arrays of other numeric types to float64
     """
     if dspart in dataexpr_columns:
         val = getattr(datasets[dsname], dspart)
         if val is None:
             raise DatasetExpressionException(
                 _("Dataset '%s' does not have part '%s'") % (dsname, dspart))
-        return val
+        return floatArray(val) if tofloat else val
     else:
         raise DatasetExpressionException(
             'Internal error - invalid dataset part')
 
+# non-ufunc functions which are element-wise
+elementwise_funcs = frozenset(('where', 'clip', 'nan_to_num'))
+
+def _elementwiseDatasetParts(expr, env):
+    """Check whether expression (with datasets substituted) is
+    element-wise, so that it can be evaluated in pieces.
+
+    Returns list of (dsname, part) used by the expression, or None if
+    it is not element-wise.
+    """
+
+    try:
+        tree = ast.parse(expr.strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    dsparts = []
+    def check(node):
+        if isinstance(node, ast.Expression):
+            return check(node.body)
+        elif isinstance(node, ast.BinOp):
+            return check(node.left) and check(node.right)
+        elif isinstance(node, ast.UnaryOp):
+            return check(node.operand)
+        elif isinstance(node, ast.Compare):
+            return check(node.left) and all(
+                [check(c) for c in node.comparators])
+        elif isinstance(node, ast.Name):
+            # scalars or parametric t (which is added later)
+            return node.id == 't' or isinstance(
+                env.get(node.id), (int, float, N.number))
+        elif isinstance(node, ast.Call):
+            if ( not isinstance(node.func, ast.Name) or
+                 getattr(node, 'keywords', None) or
+                 getattr(node, 'starargs', None) or
+                 getattr(node, 'kwargs', None) ):
+                return False
+            if node.func.id == '_DS_':
+                try:
+                    dsparts.append(tuple(
+                        [ast.literal_eval(a) for a in node.args]))
+                except ValueError:
+                    return False
+                return len(dsparts[-1]) == 2
+            fn = env.get(node.func.id)
+            if not ( isinstance(fn, N.ufunc) or
+                     node.func.id in elementwise_funcs ):
+                return False
+            return all([check(a) for a in node.args])
+        else:
+            # numbers, but not strings or containers
+            try:
+                val = ast.literal_eval(node)
+            except ValueError:
+                return False
+            return isinstance(val, (int, float, complex))
+
+    if not check(tree):
+        return None
+    return dsparts
+
+def _evaluateStreamed(comp, environment, datasets, dsparts, parametric,
+                      chunksize):
+    """Evaluate an element-wise expression in chunks, writing into a
+    memory-mapped temporary file.
+
+    Returns (output array, RangeStats), or None if the inputs are not
+    suitable.
+    """
+
+    inputs = {}
+    for dsname, dspart in dsparts:
+        # converted to float64 by chunk, to save memory
+        val = _evaluateDataset(datasets, dsname, dspart, tofloat=False)
+        if not isinstance(val, N.ndarray) or val.ndim != 1:
+            return None
+        inputs[(dsname, dspart)] = val
+
+    lengths = set([len(v) for v in inputs.values()])
+    if parametric:
+        lengths.add(parametric[2])
+    if len(lengths) != 1:
+        return None
+    length = lengths.pop()
+    if length <= chunksize:
+        return None
+
+    out = N.memmap(tempfile.TemporaryFile(), dtype=N.float64, mode='w+',
+                   shape=(length,))
+    stats = RangeStats()
+
+    env = environment.copy()
+    for start in crange(0, length, chunksize):
+        end = min(start+chunksize, length)
+        def getchunk(dsname, dspart, start=start, end=end):
+            return floatArray(inputs[(dsname, dspart)][start:end])
+        env['_DS_'] = getchunk
+        if parametric:
+            p = parametric
+            deltat = (p[1]-p[0]) / (p[2]-1)
+            env['t'] = N.arange(start, end)*deltat + p[0]
+
+        chunk = N.array(eval(comp, env), dtype=N.float64)
+        if chunk.ndim == 0:
+            chunk = N.resize(chunk, end-start)
+        elif chunk.shape != (end-start,):
+            raise RuntimeError("Expression is not element-wise")
+
+        out[start:end] = chunk
+        stats.update(chunk)
+
+    out.flush()
+    return out, stats
+
 def _returnNumericDataset(doc, vals, dimensions, subdatasets):
     """Used internally to convert a set of values (which needs to be
     numeric) into a Dataset.
@@ -195,15 +315,17 @@ def evalDatasetExpression(doc, origexpr, datatype='numeric',
     if comp is None:
         return
 
-    # set up environment for evaluation
-    env = doc.evaluate.context.copy()
-    def doeval(dsname, dspart):
-        return _evaluateDataset(doc.data, dsname, dspart)
-    env['_DS_'] = doeval
-
     # do evaluation
     try:
-        evalout = eval(comp, env)
+        if doc.evaluate.useWorker(expr):
+            evalout = doc.evaluate.workerEval(expr, subdatasets)
+        else:
+            # set up environment for evaluation
+            env = doc.evaluate.context.copy()
+            def doeval(dsname, dspart):
+                return _evaluateDataset(doc.data, dsname, dspart)
+            env['_DS_'] = doeval
+            evalout = eval(comp, env)
     except Exception as ex:
         doc.log(_("Error evaluating '%s': '%s'" % (origexpr, cstr(ex))))
         return None
@@ -246,6 +368,9 @@ class DatasetExpression(Dataset1DBase):
         self.docchangeset = -1
         self.evaluated = {}
 
+        # range statistics of parts evaluated by streaming
+        self.partstats = {}
+
     def evaluateDataset(self, dsname, dspart):
         """Return the dataset given.
 
@@ -260,7 +385,8 @@ class DatasetExpression(Dataset1DBase):
         Returns True if succeeded
         """
         # replace dataset names with calls
-        newexpr = substituteDatasets(self.document.data, expr, part)[0]
+        newexpr, subdatasets = substituteDatasets(
+            self.document.data, expr, part)
 
         comp = self.document.evaluate.compileCheckedExpression(
             newexpr, origexpr=expr)
@@ -268,7 +394,9 @@ class DatasetExpression(Dataset1DBase):
             return False
 
         # set up environment to evaluate expressions in
-        environment = self.document.evaluate.context.copy()
+        evaluate = self.document.evaluate
+        environment = evaluate.context.copy()
+        extra = {}
 
         # create dataset using parametric expression
         if self.parametric:
@@ -278,15 +406,22 @@ class DatasetExpression(Dataset1DBase):
                 t = N.arange(p[2])*deltat + p[0]
             else:
                 t = N.array([p[0]])
-            environment['t'] = t
+            environment['t'] = extra['t'] = t
 
         # this fn gets called to return the value of a dataset
         environment['_DS_'] = self.evaluateDataset
 
         # actually evaluate the expression
         try:
-            result = eval(comp, environment)
-            evalout = N.array(result, N.float64)
+            streamed = self._evaluateStreamed(newexpr, comp, environment)
+            if streamed is not None:
+                evalout, self.partstats[part] = streamed
+            elif evaluate.useWorker(newexpr):
+                result = evaluate.workerEval(newexpr, subdatasets, extra)
+            else:
+                result = eval(comp, environment)
+            if streamed is None:
+                evalout = N.array(result, N.float64)
 
             if len(evalout.shape) > 1:
                 raise RuntimeError("Number of dimensions is not 1")
@@ -297,7 +432,9 @@ class DatasetExpression(Dataset1DBase):
             return False
 
         # make evaluated error expression have same shape as data
-        if part != 'data':
+        if part != 'data' and evalout.shape == self.evaluated['data'].shape:
+            pass
+        elif part != 'data':
             data = self.evaluated['data']
             if evalout.shape == ():
                 # zero dimensional - expand to data shape
@@ -315,38 +452,69 @@ class DatasetExpression(Dataset1DBase):
         self.evaluated[part] = evalout
         return True
 
-    def updateEvaluation(self):
-        """Update evaluation of parts of dataset.
+    def _evaluateStreamed(self, newexpr, comp, environment):
+        """Evaluate element-wise expressions over large inputs in chunks,
+        if enabled.
 
-        Returns False if problem with any evaluation
+        Returns (output, statistics) or None if not evaluated
         """
-        ok = True
-        if self.docchangeset != self.document.changeset:
-            # avoid infinite recursion!
-            self.docchangeset = self.document.changeset
+        from .. import setting
+        if not setting.settingdb.get('eval_streaming', False):
+            return None
+        chunksize = setting.settingdb.get('eval_stream_chunksize', 1048576)
 
-            # zero out previous values
-            for part in self.columns:
-                self.evaluated[part] = None
+        dsparts = _elementwiseDatasetParts(newexpr, environment)
+        if dsparts is None or (not dsparts and not self.parametric):
+            return None
+
+        return _evaluateStreamed(
+            comp, environment, self.document.data, dsparts,
+            self.parametric, max(1, chunksize))
+
+    def _calcStats(self, datastats=None):
+        '''Calculate statistics, using those from streamed evaluation if
+        available.'''
+        self.updateEvaluation()
+        return Dataset1DBase._calcStats(
+            self, datastats=self.partstats.get('data'))
 
-            # update all parts
-            for part in self.columns:
-                expr = self.expr[part]
-                if expr is not None and expr.strip() != '':
-                    ok = ok and self._evaluatePart(expr, part)
+    def updateEvaluation(self):
+        """Update evaluation of parts of dataset.
 
-        return ok
+        Returns False if problem with any evaluation
+        """
+        # the document may be painted in another thread
+        with self.document.changelock:
+            ok = True
+            if self.docchangeset != self.document.changeset:
+                # avoid infinite recursion!
+                self.docchangeset = self.document.changeset
+
+                # zero out previous values
+                for part in self.columns:
+                    self.evaluated[part] = None
+                self.partstats = {}
+
+                # update all parts
+                for part in self.columns:
+                    expr = self.expr[part]
+                    if expr is not None and expr.strip() != '':
+                        ok = ok and self._evaluatePart(expr, part)
+
+            return ok
 
     def _propValues(self, part):
         """Check whether expressions need reevaluating,
         and recalculate if necessary."""
 
-        self.updateEvaluation()
+        with self.document.changelock:
+            self.updateEvaluation()
 
-        # catch case where error in setting data, need to return "real" data
-        if self.evaluated['data'] is None:
-            self.evaluated['data'] = N.array([])
-        return self.evaluated[part]
+            # catch case where error in setting data, need to return
+            # "real" data
+            if self.evaluated['data'] is None:
+                self.evaluated['data'] = N.array([])
+            return self.evaluated[part]
 
     # expose evaluated data as properties
     # this allows us to recalculate the expressions on the fly
@@ -450,25 +618,56 @@ def getSpacing(data):
     return (uniquesorted[0], uniquesorted[-1], mindelta,
             int((uniquesorted[-1]-uniquesorted[0])/mindelta)+1)
 
+def latticeAxis(data):
+    """Return grid axis (minimum, step, number) if the values lie on
+    a regular lattice, or None."""
+    try:
+        minval, maxval, step, num = getSpacing(data)
+    except DatasetExpressionException:
+        return None
+    dev = (data-minval)*(1./step)
+    if N.abs(dev-N.rint(dev)).max() > 1e-2:
+        return None
+    return (float(minval), float(step), num)
+
+def _arraysDigest(arrays):
+    """Return a digest of the contents of the arrays."""
+    h = hashlib.sha1()
+    for a in arrays:
+        a = N.ascontiguousarray(a)
+        h.update(('%s %s' % (a.dtype.str, a.shape)).encode('ascii'))
+        h.update(a.data)
+    return h.digest()
+
 class Dataset2DXYZExpression(Dataset2DBase):
     '''A 2d dataset with expressions for x, y and z.'''
 
     dstype = _('2D XYZ')
 
-    def __init__(self, exprx, expry, exprz):
+    def __init__(self, exprx, expry, exprz, gridmode='auto', gridsize=None):
         """Initialise dataset.
 
-        Parameters are mathematical expressions based on datasets."""
+        Parameters are mathematical expressions based on datasets.
+
+        gridmode is the method of converting the points to a grid (see
+        gridding.gridmodes) and gridsize is the number of cells (nx,
+        ny), or None to choose automatically.
+        """
         Dataset2DBase.__init__(self)
 
         self.lastchangeset = -1
         self.cacheddata = None
         self.xedge = self.yedge = self.xcent = self.ycent = None
 
+        # digest of evaluated values used to make cached data
+        self.cachedinputs = None
+
         # copy parameters
         self.exprx = exprx
         self.expry = expry
         self.exprz = exprz
+        self.gridmode = gridmode
+        self.gridsize = None if gridsize is None else tuple(gridsize)
 
     def evaluateDataset(self, dsname, dspart):
         """Return the dataset given.
@@ -480,17 +679,19 @@ class Dataset2DXYZExpression(Dataset2DBase):
 
     def evalDataset(self):
         """Return the evaluated dataset."""
+        # the document may be painted in another thread
+        with self.document.changelock:
+            return self._evalDataset()
 
-        # FIXME: handle irregular grids
+    def _evalDataset(self):
         # return cached data if document unchanged
         if self.document.changeset == self.lastchangeset:
             return self.cacheddata
         self.lastchangeset = self.document.changeset
-        self.cacheddata = None
 
         evaluated = {}
 
-        environment = self.document.evaulate.context.copy()
+        environment = self.document.evaluate.context.copy()
         environment['_DS_'] = self.evaluateDataset
 
         # evaluate the x, y and z expressions
@@ -501,36 +702,75 @@ class Dataset2DXYZExpression(Dataset2DBase):
             comp = self.document.evaluate.compileCheckedExpression(
                 expr, origexpr=origexpr)
             if comp is None:
+                self.cacheddata = self.cachedinputs = None
                 return None
 
             try:
-                evaluated[name] = eval(comp, environment)
+                evaluated[name] = N.array(
+                    eval(comp, environment), dtype=N.float64).ravel()
             except Exception as e:
                 self.document.log(_("Error evaluating expression: %s\n"
                                     "Error: %s") % (expr, cstr(e)) )
+                self.cacheddata = self.cachedinputs = None
                 return None
 
-        minx, maxx, stepx, stepsx = getSpacing(evaluated['exprx'])
-        miny, maxy, stepy, stepsy = getSpacing(evaluated['expry'])
+        x, y, z = evaluated['exprx'], evaluated['expry'], evaluated['exprz']
+        if not (len(x) == len(y) == len(z)):
+            self.document.log(_("Shape mismatch when constructing dataset\n"
+                                "Error: x, y and z have different lengths"))
+            self.cacheddata = self.cachedinputs = None
+            return None
 
-        # update cached x and y ranges
-        self._xrange = (minx-stepx*0.5, maxx+stepx*0.5)
-        self._yrange = (miny-stepy*0.5, maxy+stepy*0.5)
+        # gridding is only redone if the values have changed
+        inputs = _arraysDigest((x, y, z))
+        if inputs != self.cachedinputs:
+            self.cacheddata = self.gridData(x, y, z)
+            self.cachedinputs = inputs if self.cacheddata is not None else None
+        return self.cacheddata
 
-        self.cacheddata = N.empty( (stepsy, stepsx) )
-        self.cacheddata[:,:] = N.nan
-        xpts = ((1./stepx)*(evaluated['exprx']-minx)).astype('int32')
-        ypts = ((1./stepy)*(evaluated['expry']-miny)).astype('int32')
+    def gridData(self, x, y, z):
+        """Convert x, y and z values to 2D array, setting ranges."""
 
-        # this is ugly - is this really the way to do it?
-        try:
-            self.cacheddata.flat [ xpts + ypts*stepsx ] = evaluated['exprz']
-        except Exception as e:
-            self.document.log(_("Shape mismatch when constructing dataset\n"
-                                "Error: %s") % cstr(e) )
+        finite = N.isfinite(x) & N.isfinite(y)
+        if not finite.any():
+            self.document.log(_("No finite x and y values to make dataset"))
             return None
+        xf, yf = x[finite], y[finite]
 
-        return self.cacheddata
+        mode = self.gridmode
+        if self.gridsize is not None:
+            xaxis = gridding.autoGridAxis(xf, self.gridsize[0])
+            yaxis = gridding.autoGridAxis(yf, self.gridsize[1])
+            lattice = False
+        else:
+            # use lattice of points if they are on one of a sensible size
+            xaxis, yaxis = latticeAxis(xf), latticeAxis(yf)
+            lattice = (
+                xaxis is not None and yaxis is not None and
+                xaxis[2]*yaxis[2] <= max(16*len(xf), 4096) )
+            if not lattice:
+                xaxis = gridding.autoGridAxis(xf)
+                yaxis = gridding.autoGridAxis(yf)
+
+        if mode == 'auto':
+            mode = 'lattice' if lattice else 'average'
+
+        self._xrange = gridding.axisRange(xaxis)
+        self._yrange = gridding.axisRange(yaxis)
+
+        if mode == 'lattice':
+            # place values at the lattice points
+            out = N.full((yaxis[2], xaxis[2]), N.nan)
+            xpts = N.rint((xf-xaxis[0])*(1./xaxis[1])).astype(N.intp)
+            ypts = N.rint((yf-yaxis[0])*(1./yaxis[1])).astype(N.intp)
+            out.flat[xpts + ypts*xaxis[2]] = z[finite]
+            return out
+
+        try:
+            return gridding.gridPoints(x, y, z, mode, xaxis, yaxis)
+        except ValueError as e:
+            self.document.log(_("Could not grid dataset\nError: %s") % cstr(e))
+            return None
 
     @property
     def xrange(self):
@@ -561,9 +801,13 @@ class Dataset2DXYZExpression(Dataset2DBase):
         '''Save expressions to file.
         '''
 
-        s = 'SetData2DExpressionXYZ(%s, %s, %s, %s, linked=True)\n' % (
-            crepr(name), crepr(self.exprx), crepr(self.expry), crepr(self.exprz) )
-        fileobj.write(s)
+        args = [crepr(name), crepr(self.exprx), crepr(self.expry),
+                crepr(self.exprz), 'linked=True']
+        if self.gridmode != 'auto':
+            args.append('gridmode=%s' % crepr(self.gridmode))
+        if self.gridsize is not None:
+            args.append('gridsize=%s' % crepr(self.gridsize))
+        fileobj.write('SetData2DExpressionXYZ(%s)\n' % ', '.join(args))
 
     def canUnlink(self):
         """Can relationship be unlinked?"""
@@ -17,6 +17,8 @@
 ###############################################################################
 
 from __future__ import division, print_function
+import ast
+import weakref
 import numpy as N
 
 from ..compat import citems, czip, crepr
@@ -25,8 +27,170 @@ from .commonfn import _
 from .commonfn import *
 from .base import DatasetBase
 from .oned import Dataset
+from .text import CategoricalValues
 from .expression import evalDatasetExpression
 
+class Selection(object):
+    """A selection of rows of datasets, stored as a boolean mask.
+
+    Selections can be combined with &, | and ~. The selected indices
+    are computed when first needed.
+    """
+
+    def __init__(self, mask):
+        self.mask = N.asarray(mask, dtype=N.bool_)
+        self._indices = None
+
+    def __len__(self):
+        return len(self.mask)
+
+    def _masks(self, other):
+        """Masks of the selections to combine. Selections of one row
+        are broadcast, as in numpy, otherwise they are truncated to
+        the shorter length."""
+        m1, m2 = self.mask, other.mask
+        if len(m1) != len(m2) and len(m1) != 1 and len(m2) != 1:
+            n = min(len(m1), len(m2))
+            m1, m2 = m1[:n], m2[:n]
+        return m1, m2
+
+    def __and__(self, other):
+        m1, m2 = self._masks(other)
+        return Selection(m1 & m2)
+
+    def __or__(self, other):
+        m1, m2 = self._masks(other)
+        return Selection(m1 | m2)
+
+    def __invert__(self):
+        return Selection(~self.mask)
+
+    def indices(self):
+        """Return indices of selected rows."""
+        if self._indices is None:
+            self._indices = N.flatnonzero(self.mask)
+        return self._indices
+
+    def count(self):
+        """Number of selected rows."""
+        return len(self.indices())
+
+    def apply(self, vals):
+        """Return the selected rows of array or list vals.
+
+        Rows beyond the end of the selection are not selected. Where
+        the selected rows are contiguous, a view of an array is
+        returned rather than a copy.
+        """
+        idx = self.indices()
+        idx = idx[:N.searchsorted(idx, len(vals))]
+        if isinstance(vals, CategoricalValues):
+            return vals.take(idx)
+        elif len(idx) == 0:
+            return vals[:0]
+        elif idx[-1]-idx[0]+1 == len(idx):
+            return vals[idx[0]:idx[-1]+1]
+        elif isinstance(vals, N.ndarray):
+            return vals[idx]
+        else:
+            return [vals[i] for i in idx]
+
+    def blank(self, vals, blankval):
+        """Return copy of vals with rows not selected replaced by
+        blankval, truncated to the length of the selection."""
+        n = min(len(vals), len(self))
+        keep = self.mask[:n]
+        if isinstance(vals, N.ndarray):
+            out = N.array(vals[:n])
+            if out.dtype.kind != 'f':
+                out = out.astype(N.float64)
+            out[~keep] = blankval
+            return out
+        else:
+            return [(v if k else blankval) for k, v in czip(keep, vals)]
+
+# document -> (changeset, {expression: (selection, error)},
+#              selections for previous changeset)
+_selectioncache = weakref.WeakKeyDictionary()
+
+def _logicalTerms(expr):
+    """If expr is a & or | of two comparisons (or combinations of
+    them), return (operator, left expr, right expr), else None."""
+
+    getsegment = getattr(ast, 'get_source_segment', None)
+    if getsegment is None or '\n' in expr:
+        return None
+    try:
+        node = ast.parse(expr.strip(), mode='eval').body
+    except SyntaxError:
+        return None
+
+    def islogical(n):
+        if isinstance(n, ast.Compare):
+            return True
+        if isinstance(n, ast.BinOp) and isinstance(
+                n.op, (ast.BitAnd, ast.BitOr)):
+            return islogical(n.left) and islogical(n.right)
+        return False
+
+    if not isinstance(node, ast.BinOp) or not islogical(node):
+        return None
+    return (
+        '&' if isinstance(node.op, ast.BitAnd) else '|',
+        getsegment(expr.strip(), node.left),
+        getsegment(expr.strip(), node.right),
+    )
+
+def evalSelection(doc, expr):
+    """Evaluate a filter expression, returning (Selection, error).
+
+    Selections are kept until the document changes, so filters using
+    the same expression, or the same terms combined by & or |, only
+    evaluate them once. If a selection is unchanged after the
+    document changes, the previous Selection object is returned.
+    """
+
+    changeset, cache, prevcache = _selectioncache.get(doc, (None, {}, {}))
+    if changeset != doc.changeset:
+        prevcache = cache
+        cache = {}
+        _selectioncache[doc] = (doc.changeset, cache, prevcache)
+
+    key = expr.strip()
+    if key in cache:
+        return cache[key]
+
+    def store(sel, err):
+        prev = prevcache.get(key, (None,))[0]
+        if ( sel is not None and prev is not None and
+             N.array_equal(sel.mask, prev.mask) ):
+            sel = prev
+        cache[key] = (sel, err)
+        return sel, err
+
+    terms = _logicalTerms(expr)
+    if terms is not None:
+        op, left, right = terms
+        lsel, err = evalSelection(doc, left)
+        if lsel is not None:
+            rsel, err = evalSelection(doc, right)
+            # other lengths are an error when evaluating the whole
+            # expression, which numpy cannot broadcast
+            if rsel is not None and (
+                    len(lsel) == len(rsel) or 1 in (len(lsel), len(rsel))):
+                return store(lsel & rsel if op == '&' else lsel | rsel, None)
+
+    d = evalDatasetExpression(doc, expr)
+    if d is None:
+        return store(None, _("Invalid filter expression: '%s'") % expr)
+    elif d.dimensions != 1:
+        return store(None, _(
+            "Invalid number of dimensions in filter expression '%s'") % expr)
+    elif d.datatype != "numeric":
+        return store(
+            None, _("Input filter expression non-numeric: '%s'") % expr)
+    return store(Selection(d.data), None)
+
 class DatasetFilterGenerator(object):
     """This object is shared by all DatasetFiltered datasets, to calculate
     the filter expression."""
@@ -51,33 +215,30 @@ class DatasetFilterGenerator(object):
         self.invert = invert
         self.replaceblanks = replaceblanks
 
-        self.outdatasets = {}
+        self.selection = self.baseselection = None
+        # dataset name -> (input columns, selection, output dataset)
+        self.outcache = {}
 
-    def filterNumeric(self, ds, filterarr):
+    def filterNumeric(self, ds, selection):
         """Filter a numeric dataset."""
         outdata = {}
-        minlen = len(filterarr)
         for attr in ds.columns:
             data = getattr(ds, attr)
             if data is None:
                 filtered = None
+            elif self.replaceblanks:
+                filtered = selection.blank(data, N.nan)
             else:
-                filtered = N.array(data[:minlen])
-                if self.replaceblanks:
-                    filtered[N.logical_not(filterarr)] = N.nan
-                else:
-                    filtered = filtered[filterarr]
+                filtered = selection.apply(data)
             outdata[attr] = filtered
         return ds.returnCopyWithNewData(**outdata)
 
-    def filterText(self, ds, filterarr):
+    def filterText(self, ds, selection):
         """Filter a text dataset."""
-        data = ds.data
         if self.replaceblanks:
-            filtered = [(d if f else "")
-                        for f, d in czip(filterarr, data)]
+            filtered = selection.blank(ds.data, "")
         else:
-            filtered = [d for f, d in czip(filterarr, data) if f]
+            filtered = selection.apply(ds.data)
         return ds.returnCopyWithNewData(data=filtered)
 
     def checkUpdate(self, doc):
@@ -89,31 +250,22 @@ class DatasetFilterGenerator(object):
                 doc.log('\n'.join(log)+'\n')
 
     def evaluateFilter(self, doc):
-        """Update filtering calculation if doc changed.
+        """Update filter selection if doc changed.
+
+        Filtered datasets are only computed when requested.
 
         Returns log of errors
         """
 
-        # this is populated by output
-        self.outdatasets = {}
-
-        # evaluate filter expression
-        d = evalDatasetExpression(doc, self.inexpr)
-        if d is None:
-            return ["Invalid filter expression: '%s'" % self.inexpr]
-        if d.dimensions != 1:
-            return [
-                _("Invalid number of dimensions in filter expression '%s'") %
-                self.inexpr]
-        if d.datatype != "numeric":
-            return [
-                _("Input filter expression non-numeric: '%s'") % self.inexpr]
-
-        filterarr = d.data.astype(N.bool)
-        if self.invert:
-            filterarr = N.logical_not(filterarr)
+        selection, err = evalSelection(doc, self.inexpr)
+        if selection is not self.baseselection:
+            self.baseselection = selection
+            if selection is not None and self.invert:
+                selection = ~selection
+            self.selection = selection
+        if err:
+            return [err]
 
-        # do filtering of datasets
         log = []
         for name in self.indatasets:
             ds = doc.data.get(name)
@@ -122,21 +274,42 @@ class DatasetFilterGenerator(object):
             if ds.dimensions != 1:
                 log.append(
                     _("Filtered dataset '%s' has more than 1 dimension") % name)
-                continue
-            minlen = min(len(ds.data), len(filterarr))
-            filterarrchop = filterarr[:minlen]
-
-            if ds.datatype == "numeric":
-                filtered = self.filterNumeric(ds, filterarrchop)
-            elif ds.datatype == "text":
-                filtered = self.filterText(ds, filterarrchop)
-            else:
+            elif ds.datatype not in ("numeric", "text"):
                 log.append(_("Could not filter dataset '%s'") % name)
-                continue
-
-            self.outdatasets[name] = filtered
         return log
 
+    def getOutput(self, doc, name):
+        """Return filtered version of input dataset name, or None.
+
+        The previous output is reused if neither the input dataset
+        nor the selection have changed."""
+
+        # the document may be painted in another thread
+        with doc.changelock:
+            return self._getOutput(doc, name)
+
+    def _getOutput(self, doc, name):
+        self.checkUpdate(doc)
+        ds = doc.data.get(name)
+        if ( self.selection is None or ds is None or ds.dimensions != 1 or
+             ds.datatype not in ("numeric", "text") ):
+            self.outcache.pop(name, None)
+            return None
+
+        cols = [getattr(ds, c) for c in ds.columns]
+        cached = self.outcache.get(name)
+        if ( cached is not None and cached[1] is self.selection and
+             len(cached[0]) == len(cols) and
+             all(a is b for a, b in czip(cached[0], cols)) ):
+            return cached[2]
+
+        if ds.datatype == "numeric":
+            filtered = self.filterNumeric(ds, self.selection)
+        else:
+            filtered = self.filterText(ds, self.selection)
+        self.outcache[name] = (cols, self.selection, filtered)
+        return filtered
+
     def saveToFile(self, doc, fileobj):
         """Save datasets to file."""
 
@@ -179,15 +352,16 @@ class DatasetFiltered(DatasetBase):
 
     def _checkUpdate(self):
         """Recalculate if document has changed."""
-        if self.document.changeset != self.changeset:
-            self.generator.checkUpdate(self.document)
-            self.changeset = self.document.changeset
-
-            ds = self.generator.outdatasets.get(self.namein)
-            if ds is None:
-                self._internalds = Dataset(data=[])
-            else:
-                self._internalds = ds
+        # the document may be painted in another thread
+        with self.document.changelock:
+            if self.document.changeset != self.changeset:
+                ds = self.generator.getOutput(self.document, self.namein)
+                self.changeset = self.document.changeset
+
+                if ds is None:
+                    self._internalds = Dataset(data=[])
+                else:
+                    self._internalds = ds
 
     def linkedInformation(self):
         return _("Filtered '%s' using '%s'") % (
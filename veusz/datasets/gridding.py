@@ -0,0 +1,234 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+
+"""Convert scattered x, y and z values to a regular 2D grid.
+
+A grid axis is described by a tuple (minimum, step, number) giving
+the centres of the cells. Distances are measured in units of cells,
+so that x and y may have different units.
+"""
+
+from __future__ import division
+import math
+
+import numpy as N
+from scipy.spatial import cKDTree
+from scipy.interpolate import LinearNDInterpolator
+
+from ..compat import crange
+
+# methods of gridding (auto uses the lattice of the points if there
+# is one, or averages the points in each cell otherwise)
+gridmodes = ('auto', 'nearest', 'average', 'linear')
+
+# maximum number of cells for each axis if chosen automatically
+maxautocells = 1000
+
+def autoGridAxis(vals, num=None):
+    """Return grid axis covering finite values vals.
+
+    If num is None, choose the number of cells so that there are
+    around 4 values per cell, if they are spread over the grid.
+    """
+    if num is None:
+        num = int(math.sqrt(len(vals)/4))
+        num = max(10, min(maxautocells, num))
+    num = max(int(num), 1)
+
+    minval, maxval = float(vals.min()), float(vals.max())
+    if maxval == minval:
+        return (minval, 1., 1)
+    if num == 1:
+        # a single cell covering the values
+        return (0.5*(minval+maxval), maxval-minval, 1)
+    return (minval, (maxval-minval)/(num-1), num)
+
+def axisRange(axis):
+    """Return (minimum, maximum) of cell edges for grid axis."""
+    minval, step, num = axis
+    return (minval-0.5*step, minval+(num-0.5)*step)
+
+def _cellCoords(vals, axis):
+    """Return the index of the cell containing each value and the
+    offset of the value from the centre of the cell."""
+    minval, step, num = axis
+    u = (vals-minval)*(1./step)
+    idx = N.clip(N.rint(u), 0, num-1).astype(N.intp)
+    return idx, u-idx
+
+def _average(cell, z, ncells):
+    """Mean of z in each cell, and number of values in each cell."""
+    counts = N.bincount(cell, minlength=ncells)
+    sums = N.bincount(cell, weights=z, minlength=ncells)
+    with N.errstate(invalid='ignore', divide='ignore'):
+        return sums/counts, counts
+
+def _dilate(mask, dist):
+    """Return 2D mask of cells within dist cells of True cells in mask."""
+    ny, nx = mask.shape
+    padded = N.pad(mask, dist, mode='constant')
+    rows = N.zeros((ny+2*dist, nx), dtype=bool)
+    for i in crange(2*dist+1):
+        rows |= padded[:, i:i+nx]
+    out = N.zeros_like(mask)
+    for i in crange(2*dist+1):
+        out |= rows[i:i+ny, :]
+    return out
+
+def _nearest(ix, iy, fx, fy, z, nx, ny):
+    """Value of nearest point to the centre of each cell.
+
+    Each point is placed in a cell (a grid hash). The nearest point
+    is found from the points in each cell, then from the points in
+    neighbouring cells, if they could be nearer. Cells without a
+    point within 1.5 cells use a k-d tree of points near empty cells
+    or outside the grid.
+    """
+
+    ncells = nx*ny
+    cell = iy*nx + ix
+    bestd2 = N.full(ncells, N.inf)
+
+    # points in the same cell are at most sqrt(0.5) from the centre
+    d2 = fx**2 + fy**2
+    N.minimum.at(bestd2, cell, d2)
+    candidates = [(cell, d2, z)]
+
+    # points in neighbouring cells are at least 0.5 from the centre
+    need = bestd2 > 0.5**2
+    okx = {-1: ix > 0, 1: ix < nx-1}
+    oky = {-1: iy > 0, 1: iy < ny-1}
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dx == 0 and dy == 0:
+                continue
+            target = cell + (dy*nx + dx)
+            sel = need.take(target, mode='clip')
+            if dx != 0:
+                sel &= okx[dx]
+            if dy != 0:
+                sel &= oky[dy]
+            idx = N.flatnonzero(sel)
+            if len(idx) == 0:
+                continue
+
+            target = target[idx]
+            d2 = (fx[idx]-dx)**2 + (fy[idx]-dy)**2
+            N.minimum.at(bestd2, target, d2)
+            candidates.append((target, d2, z[idx]))
+
+    bestz = N.full(ncells, N.nan)
+    for target, d2, vals in candidates:
+        isbest = d2 == bestd2[target]
+        bestz[target[isbest]] = vals[isbest]
+
+    # Any point within 1.5 of the centre is in a neighbouring cell.
+    # If the nearest point is further, there is an empty circle of
+    # radius 1.5 touching it, which contains a cell within two cells
+    # of the point's cell.
+    unresolved = N.flatnonzero(bestd2 > 1.5**2)
+    if len(unresolved) > 0:
+        empty = (N.bincount(cell, minlength=ncells) == 0).reshape(ny, nx)
+        # points outside the grid are not in their cells, so may be
+        # nearest to cells away from empty ones
+        outside = (N.abs(fx) > 0.5) | (N.abs(fy) > 0.5)
+        pts = N.flatnonzero(_dilate(empty, 2).ravel()[cell] | outside)
+        if len(pts) == 0:
+            pts = N.arange(len(z))
+        tree = cKDTree(N.column_stack((ix[pts]+fx[pts], iy[pts]+fy[pts])))
+        centres = N.column_stack((unresolved % nx, unresolved // nx))
+        bestz[unresolved] = z[pts[tree.query(centres)[1]]]
+
+    return bestz
+
+def _linear(means, counts, nx, ny):
+    """Linearly interpolate cell means into empty cells.
+
+    Empty cells between two filled cells in x or y take the mean of
+    them. Filled cells next to the remaining empty cells are
+    triangulated, and the values at the centres of the empty cells
+    inside the triangulation are interpolated.
+    """
+
+    grid = means.reshape(ny, nx)
+    empty = counts.reshape(ny, nx) == 0
+    if not empty.any():
+        return means
+
+    # gaps of one cell
+    padded = N.pad(grid, 1, mode='constant', constant_values=N.nan)
+    interpx = 0.5*(padded[1:-1, :-2] + padded[1:-1, 2:])
+    interpy = 0.5*(padded[:-2, 1:-1] + padded[2:, 1:-1])
+    interp = N.where(
+        N.isfinite(interpx),
+        N.where(N.isfinite(interpy), 0.5*(interpx+interpy), interpx),
+        interpy)
+    gap = empty & N.isfinite(interp)
+    grid[gap] = interp[gap]
+    empty &= ~gap
+    if not empty.any():
+        return means
+
+    # filled cells next to empty ones
+    border = N.flatnonzero(_dilate(empty, 1) & ~empty)
+    if len(border) < 3:
+        return means
+
+    emptyidx = N.flatnonzero(empty)
+    try:
+        interp = LinearNDInterpolator(
+            N.column_stack((border % nx, border // nx)), means[border])
+        means[emptyidx] = interp(
+            N.column_stack((emptyidx % nx, emptyidx // nx)))
+    except Exception:
+        # points may all be in a line
+        pass
+    return means
+
+def gridPoints(x, y, z, mode, xaxis, yaxis):
+    """Grid the points x, y with values z on the grid axes given.
+
+    mode is one of:
+     'nearest': value of nearest point to cell centre
+     'average': mean of the values in each cell
+     'linear': mean of the values in each cell, with empty cells
+               linearly interpolated from the surrounding cells
+
+    Non-finite points are ignored. Returns a 2D array of shape
+    (ny, nx), where cells without a value are NaN.
+    """
+
+    nx, ny = xaxis[2], yaxis[2]
+    finite = N.isfinite(x) & N.isfinite(y) & N.isfinite(z)
+    x, y, z = x[finite], y[finite], z[finite].astype(N.float64)
+    if len(z) == 0:
+        return N.full((ny, nx), N.nan)
+
+    ix, fx = _cellCoords(x, xaxis)
+    iy, fy = _cellCoords(y, yaxis)
+
+    if mode == 'nearest':
+        out = _nearest(ix, iy, fx, fy, z, nx, ny)
+    elif mode == 'average':
+        out = _average(iy*nx + ix, z, nx*ny)[0]
+    elif mode == 'linear':
+        means, counts = _average(iy*nx + ix, z, nx*ny)
+        out = _linear(means, counts, nx, ny)
+    else:
+        raise ValueError('Invalid gridding mode')
+
+    return out.reshape(ny, nx)
@@ -21,6 +21,7 @@
 from __future__ import division
 import numpy as N
 
+from ..compat import czip, cstr
 from .base import DatasetBase
 from .oned import Dataset
 from .twod import Dataset2D
@@ -49,14 +50,10 @@ def valsToDataset(vals, datatype, dimensions):
 
     raise RuntimeError('Invalid array')
 
-def generateValidDatasetParts(datasets, breakds=True):
-    """Generator to return array of valid parts of datasets.
-
-    if breakds is True:
-      Yields new datasets between rows which are invalid
-    else:
-      Yields single, filtered dataset
-    """
+def _invalidDatasetPoints(datasets):
+    """Return (invalid, minlen) where invalid is a boolean array
+    marking rows invalid in any of the datasets, and minlen is the
+    shortest length."""
 
     # find NaNs and INFs in input dataset
     invalid = datasets[0].invalidDataPoints()
@@ -66,34 +63,79 @@ def generateValidDatasetParts(datasets, breakds=True):
             nextinvalid = ds.invalidDataPoints()
             minlen = min(nextinvalid.shape[0], minlen)
             invalid = N.logical_or(invalid[:minlen], nextinvalid[:minlen])
+    return invalid, minlen
+
+def _validRuns(invalid):
+    """Return arrays of start and end indices of runs of valid points."""
+    valid = N.concatenate(([False], N.logical_not(invalid), [False]))
+    changes = N.flatnonzero(valid[1:] != valid[:-1])
+    return changes[0::2], changes[1::2]
+
+def _selectRows(ds, idx):
+    """Return rows with indices idx from dataset or list."""
+    if isinstance(ds, list):
+        return [ds[i] for i in idx]
+    return ds[idx]
+
+def validDatasetSegments(datasets):
+    """Get the valid parts of a set of datasets, as a single set of
+    datasets with invalid rows removed, and the boundaries between the
+    runs of valid rows.
+
+    Returns (datasets, bounds), where the runs of valid rows are given
+    by datasets[bounds[i]:bounds[i+1]]. Unlike
+    generateValidDatasetParts, the number of datasets created does not
+    depend on the number of invalid rows.
+    """
+
+    invalid, minlen = _invalidDatasetPoints(datasets)
+    if not N.any(invalid):
+        # no bad points: optimisation
+        return datasets, N.array([0, minlen])
+
+    starts, ends = _validRuns(invalid)
+    bounds = N.concatenate(([0], N.cumsum(ends-starts)))
+
+    idx = N.flatnonzero(N.logical_not(invalid))
+    retn = []
+    for ds in datasets:
+        if ds is not None and (
+                not isinstance(ds, DatasetBase) or not ds.empty()):
+            retn.append(_selectRows(ds, idx))
+        else:
+            retn.append(None)
+    return retn, bounds
+
+def generateValidDatasetParts(datasets, breakds=True):
+    """Generator to return array of valid parts of datasets.
+
+    if breakds is True:
+      Yields new datasets between rows which are invalid
+    else:
+      Yields single, filtered dataset
+    """
+
+    invalid, minlen = _invalidDatasetPoints(datasets)
 
     if breakds:
         # return multiple datasets, breaking at invalid values
 
-        # get indexes of invalid points
-        indexes = invalid.nonzero()[0].tolist()
-
         # no bad points: optimisation
-        if not indexes:
+        if not N.any(invalid):
             yield datasets
             return
 
-        # add on shortest length of datasets
-        indexes.append(minlen)
-
-        lastindex = 0
-        for index in indexes:
-            if index != lastindex:
-                retn = []
-                for ds in datasets:
-                    if ds is not None and (
-                            not isinstance(ds, DatasetBase) or
-                            not ds.empty()):
-                        retn.append(ds[lastindex:index])
-                    else:
-                        retn.append(None)
-                yield retn
-            lastindex = index+1
+        starts, ends = _validRuns(invalid)
+        for start, end in czip(starts, ends):
+            retn = []
+            for ds in datasets:
+                if ds is not None and (
+                        not isinstance(ds, DatasetBase) or
+                        not ds.empty()):
+                    retn.append(ds[start:end])
+                else:
+                    retn.append(None)
+            yield retn
 
     else:
         # in this mode we return single datasets where the invalid
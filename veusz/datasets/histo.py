@@ -25,6 +25,44 @@ from .commonfn import _
 from .commonfn import *
 from .oned import Dataset1DBase
 from .expression import evalDatasetExpression
+from .stats import StatsCache
+
+def _selectedBinIndices(sel, edges, islog):
+    """Compute bin indices of values sel, which are within the range
+    of the bins."""
+
+    numbins = len(edges)-1
+    lo, hi = edges[0], edges[-1]
+    if islog:
+        x, x0, x1 = N.log(sel), N.log(lo), N.log(hi)
+    else:
+        x, x0, x1 = sel, lo, hi
+
+    idx = ((x - x0) * (numbins / (x1 - x0))).astype(N.intp)
+    N.clip(idx, 0, numbins-1, out=idx)
+    # correct for rounding near the edges, so values are counted in
+    # the same bins as numpy.histogram would count them
+    idx -= sel < edges[idx]
+    idx += (sel >= edges[idx+1]) & (idx != numbins-1)
+    return idx
+
+def uniformBinIndices(data, edges, islog=False):
+    """Return index of bin for each value in data, for bins with edges
+    spaced uniformly (logarithmically if islog). Values outside the
+    bins, or not finite, have an index of -1."""
+
+    insel = (data >= edges[0]) & (data <= edges[-1])
+    out = N.full(len(data), -1, dtype=N.intp)
+    out[insel] = _selectedBinIndices(data[insel], edges, islog)
+    return out
+
+def _uniformBinCounts(data, edges, islog):
+    """Count data in bins with edges spaced uniformly (logarithmically
+    if islog), computing bin indices directly rather than searching."""
+
+    sel = data[(data >= edges[0]) & (data <= edges[-1])]
+    idx = _selectedBinIndices(sel, edges, islog)
+    return N.bincount(idx, minlength=len(edges)-1)
 
 class DatasetHistoGenerator(object):
     def __init__(self, document, inexpr,
@@ -55,20 +93,37 @@ class DatasetHistoGenerator(object):
         self.errors = errors
         self.bindataset = self.valuedataset = None
 
+        # finite input data, kept until the input array changes
+        self._datacache = StatsCache()
+        # (data, edges, counts) of last histogram computed
+        self._histcache = None
+
     def getData(self):
         """Get data from input expression, caching result."""
-        if self.document.changeset != self.changeset:
-            d = evalDatasetExpression(self.document, self.inexpr)
-            if d is not None:
-                d = d.data
-                # only use finite data
-                d = d[N.isfinite(d)]
-                if len(d) == 0:
-                    d = None
-
-            self._cacheddata = d
-            self.changeset = self.document.changeset
-        return self._cacheddata
+        # the document may be painted in another thread
+        with self.document.changelock:
+            if self.document.changeset != self.changeset:
+                self._cacheddata = self._evalData()
+                self.changeset = self.document.changeset
+            return self._cacheddata
+
+    def _evalData(self):
+        ds = evalDatasetExpression(self.document, self.inexpr)
+        if ds is None:
+            return None
+        raw = ds.data
+        version = getattr(ds, 'dataversion', 0)
+        cached = self._datacache.get([raw], version)
+        if cached is not None:
+            return cached[0]
+
+        # only use finite data
+        d = raw[N.isfinite(raw)]
+        if len(d) == 0:
+            d = None
+        minmax = (None, None) if d is None else (d.min(), d.max())
+        self._datacache.set([raw], version, (d, minmax))
+        return d
 
     def binLocations(self):
         """Compute locations of bins edges, giving N+1 items."""
@@ -81,10 +136,11 @@ class DatasetHistoGenerator(object):
                 data = self.getData()
                 if data is None:
                     return N.array([])
+                datamin, datamax = self._datacache.stats[1]
                 if minval == 'Auto':
-                    minval = N.min(data)
+                    minval = datamin
                 if maxval == 'Auto':
-                    maxval = N.max(data)
+                    maxval = datamax
 
             if not islog:
                 delta = (maxval - minval) / numbins
@@ -98,13 +154,45 @@ class DatasetHistoGenerator(object):
                 delta = (lmax - lmin) / numbins
                 return N.exp( N.arange(numbins+1)*delta + lmin )
 
+    def _countBins(self, data, edges):
+        """Count data in bins with edges given."""
+        if ( not self.binmanual and len(edges) > 1 and
+             N.all(N.isfinite(edges)) and edges[-1] > edges[0] ):
+            return _uniformBinCounts(data, edges, self.binparams[3])
+        return N.histogram(data, bins=edges)[0]
+
+    def getHistogram(self):
+        """Return bin edges and counts in each bin, caching result.
+
+        If the data are unchanged, or only have had values appended,
+        the previous counts are reused.
+        """
+
+        data = self.getData()
+        edges = self.binLocations()
+        cache = self._histcache
+        if cache is not None and N.array_equal(cache[1], edges):
+            olddata, oldcounts = cache[0], cache[2]
+            if data is olddata:
+                return edges, oldcounts
+            if ( len(data) >= len(olddata) and
+                 N.array_equal(data[:len(olddata)], olddata) ):
+                counts = oldcounts + self._countBins(
+                    data[len(olddata):], edges)
+                self._histcache = (data, edges, counts)
+                return edges, counts
+
+        counts = self._countBins(data, edges)
+        self._histcache = (data, edges, counts)
+        return edges, counts
+
     def getBinLocations(self):
         """Return bin centre, -ve bin width, +ve bin width."""
 
         if self.getData() is None:
             return (N.array([]), None, None)
 
-        binlocs = self.binLocations()
+        binlocs = self.getHistogram()[0]
 
         if self.binparams and self.binparams[3]:
             # log bins
@@ -119,11 +207,10 @@ class DatasetHistoGenerator(object):
         perr = binlocs[1:] - data
         return data, nerr, perr
 
-    def getErrors(self, data, binlocs):
+    def getErrors(self, data, edges, counts):
         """Compute error bars if requried."""
 
-        hist, edges = N.histogram(data, bins=binlocs)
-        hist = hist.astype(N.float64)  # integers can break plots (github#49)
+        hist = counts.astype(N.float64)  # integers can break plots (github#49)
 
         # calculate scaling values for error bars
         if self.method == 'density':
@@ -152,12 +239,12 @@ class DatasetHistoGenerator(object):
         if data is None:
             return (N.array([]), None, None)
 
-        normed = self.method == 'density'
-        binlocs = self.binLocations()
-        hist, edges = N.histogram(data, bins=binlocs, normed=normed)
-        hist = hist.astype(N.float64)  # integers can break plots (github#49)
-        
-        if self.method == 'fractions':
+        edges, counts = self.getHistogram()
+        hist = counts.astype(N.float64)  # integers can break plots (github#49)
+
+        if self.method == 'density':
+            hist = hist / (hist.sum() * N.diff(edges))
+        elif self.method == 'fractions':
             hist = hist * (1./data.size)
 
         # if cumulative wanted
@@ -167,7 +254,7 @@ class DatasetHistoGenerator(object):
             hist = N.cumsum(hist[::-1])[::-1]
 
         if self.errors:
-            nerr, perr = self.getErrors(data, binlocs)
+            nerr, perr = self.getErrors(data, edges, counts)
         else:
             nerr, perr = None, None
 
@@ -226,10 +313,12 @@ class DatasetHistoBins(Dataset1DBase):
 
     def getData(self):
         """Get bin positions, caching results."""
-        if self.changeset != self.generator.document.changeset:
-            self.datacache = self.generator.getBinLocations()
-            self.changeset = self.generator.document.changeset
-        return self.datacache
+        # the document may be painted in another thread
+        with self.document.changelock:
+            if self.changeset != self.document.changeset:
+                self.datacache = self.generator.getBinLocations()
+                self.changeset = self.document.changeset
+            return self.datacache
 
     def linkedInformation(self):
         """Informating about linking."""
@@ -261,10 +350,12 @@ class DatasetHistoValues(Dataset1DBase):
 
     def getData(self):
         """Get bin heights, caching results."""
-        if self.changeset != self.generator.document.changeset:
-            self.datacache = self.generator.getBinVals()
-            self.changeset = self.generator.document.changeset
-        return self.datacache
+        # the document may be painted in another thread
+        with self.document.changelock:
+            if self.changeset != self.document.changeset:
+                self.datacache = self.generator.getBinVals()
+                self.changeset = self.document.changeset
+            return self.datacache
 
     def saveDataRelationToText(self, fileobj, name):
         """Save dataset and its counterpart to a file."""
@@ -23,6 +23,9 @@ import numpy as N
 from .commonfn import _
 from .commonfn import *
 from .base import DatasetConcreteBase, DatasetException
+from .stats import RangeStats, DatasetStats, StatsCache
+from .pyramid import MinMaxPyramid
+from .chunked import DatasetChunkedEdit
 
 from ..compat import czip, crange, citems, cbasestr, cstr, crepr
 from .. import utils
@@ -94,22 +97,66 @@ class Dataset1DBase(DatasetConcreteBase):
 
     def getRange(self):
         '''Get total range of coordinates. Returns None if empty.'''
-        minvals, maxvals = self.getPointRanges()
-        if len(minvals) > 0 and len(maxvals) > 0:
-            return ( minvals.min(), maxvals.max() )
-        else:
-            return None
+        return self.getStats().pointrange
 
     def rangeVisit(self, fn):
-        '''Call fn on data points and error values, in order to get range.'''
-        fn(self.data)
+        '''Call fn on data points and error values, in order to get range.
+
+        fn is given an array with the same finite (and positive)
+        minimum and maximum as the data and error values, rather than
+        the values themselves.'''
+        fn(self.getStats().extent.summary())
+
+    def getStats(self):
+        '''Return DatasetStats for dataset, recalculating only if the
+        data have changed.'''
+        arrays = [getattr(self, c) for c in self.columns]
+        cache = self.__dict__.setdefault('_statscache', StatsCache())
+        stats = cache.get(arrays, self.dataversion)
+        if stats is None:
+            stats = self._calcStats()
+            cache.set(arrays, self.dataversion, stats)
+        return stats
+
+    def getPyramid(self):
+        '''Return MinMaxPyramid of data, recalculating only if the data
+        have changed.'''
+        cache = self.__dict__.setdefault('_pyramidcache', StatsCache())
+        pyramid = cache.get([self.data], self.dataversion)
+        if pyramid is None:
+            pyramid = MinMaxPyramid(self.data)
+            cache.set([self.data], self.dataversion, pyramid)
+        return pyramid
+
+    def _calcStats(self, datastats=None):
+        '''Calculate DatasetStats for dataset.
+        datastats is optional precalculated RangeStats of the data.'''
+
+        if datastats is None:
+            datastats = RangeStats()
+            datastats.update(self.data)
+
+        extent = RangeStats()
+        extent.merge(datastats)
         if self.serr is not None:
-            fn(self.data - self.serr)
-            fn(self.data + self.serr)
+            extent.update(self.data - self.serr)
+            extent.update(self.data + self.serr)
         if self.nerr is not None:
-            fn(self.data + self.nerr)
+            extent.update(self.data + self.nerr)
         if self.perr is not None:
-            fn(self.data + self.perr)
+            extent.update(self.data + self.perr)
+
+        if self.hasErrors():
+            minvals, maxvals = self.getPointRanges()
+            pointrange = None
+            if len(minvals) > 0 and len(maxvals) > 0:
+                pointrange = (minvals.min(), maxvals.max())
+        elif datastats.nfinite > 0:
+            pointrange = (datastats.minval, datastats.maxval)
+        else:
+            pointrange = None
+
+        return DatasetStats(datastats, extent, pointrange)
 
     def empty(self):
         '''Is the data defined?'''
@@ -144,7 +191,7 @@ class Dataset1DBase(DatasetConcreteBase):
         """Return dataset of same type using the column data given."""
         return Dataset(**args)
 
-class Dataset(Dataset1DBase):
+class Dataset(DatasetChunkedEdit, Dataset1DBase):
     '''Represents a dataset.'''
 
     editable = True
@@ -160,7 +207,7 @@ class Dataset(Dataset1DBase):
         Dataset1DBase.__init__(self, linked=linked)
 
         # convert data to numpy arrays
-        self.data = convertNumpy(data)
+        self.data = convertNumpy(data, native=nativeDtypes())
         self.serr = convertNumpyAbs(serr)
         self.perr = convertNumpyAbs(perr)
         self.nerr = convertNumpyNegAbs(nerr)
@@ -220,35 +267,6 @@ class Dataset(Dataset1DBase):
                 odgrp[key] = getattr(self, key)
                 odgrp[key].attrs['vsz_name'] = (name + suffix).encode('utf-8')
 
-    def deleteRows(self, row, numrows):
-        """Delete numrows rows starting from row.
-        Returns deleted rows as a dict of {column:data, ...}
-        """
-        retn = {}
-        for col in self.columns:
-            coldata = getattr(self, col)
-            if coldata is not None:
-                retn[col] = coldata[row:row+numrows]
-                setattr(self, col, N.delete( coldata, N.s_[row:row+numrows] ))
-
-        self.document.modifiedData(self)
-        return retn
-
-    def insertRows(self, row, numrows, rowdata):
-        """Insert numrows rows starting from row.
-        rowdata is a dict of {column: data}.
-        """
-        for col in self.columns:
-            coldata = getattr(self, col)
-            data = N.zeros(numrows)
-            if col in rowdata:
-                data[:len(rowdata[col])] = N.array(rowdata[col])
-            if coldata is not None:
-                newdata = N.insert(coldata, [row]*numrows, data)
-                setattr(self, col, newdata)
-
-        self.document.modifiedData(self)
-
 class DatasetRange(Dataset1DBase):
     """Dataset consisting of a range of values e.g. 1 to 10 in 10 steps."""
 
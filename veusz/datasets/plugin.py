@@ -31,8 +31,10 @@ class _DatasetPlugin(object):
         self.pluginds = ds
 
     def getPluginData(self, attr):
-        self.pluginmanager.update()
-        return getattr(self.pluginds, attr)
+        # the document may be painted in another thread
+        with self.pluginmanager.document.changelock:
+            self.pluginmanager.update()
+            return getattr(self.pluginds, attr)
 
     def linkedInformation(self):
         """Return information about how this dataset was created."""
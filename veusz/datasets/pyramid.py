@@ -0,0 +1,139 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+
+"""Multi-resolution minima and maxima of datasets, for quickly
+plotting the parts of long series which are visible."""
+
+from __future__ import division
+import numpy as N
+
+class MinMaxPyramid(object):
+    """Indices of the minimum and maximum values in blocks of an array.
+
+    Level k has blocks of basesize*2**k values. The levels are only
+    calculated when first used.
+
+    finite: whether all the values are finite
+    ascending: whether the values are finite and do not decrease
+    """
+
+    basesize = 16
+
+    def __init__(self, vals):
+        self.vals = vals
+        self.finite = bool(N.isfinite(vals).all())
+        self.ascending = self.finite and bool(
+            (vals[1:] >= vals[:-1]).all())
+        self._levels = None
+
+    @property
+    def levels(self):
+        """List of (minidx, maxidx) arrays for each level."""
+        if self._levels is None:
+            self._levels = self._buildLevels()
+        return self._levels
+
+    def _buildLevels(self):
+        vals = self.vals
+        n = len(vals)
+        size = self.basesize
+
+        # lowest level from blocks of values (including final part)
+        nfull = n // size
+        blocks = vals[:nfull*size].reshape(nfull, size)
+        offset = N.arange(nfull) * size
+        minidx = [N.argmin(blocks, axis=1) + offset]
+        maxidx = [N.argmax(blocks, axis=1) + offset]
+        if n > nfull*size:
+            tail = vals[nfull*size:]
+            minidx.append([N.argmin(tail) + nfull*size])
+            maxidx.append([N.argmax(tail) + nfull*size])
+        levels = [( N.concatenate(minidx).astype(N.intp),
+                    N.concatenate(maxidx).astype(N.intp) )]
+
+        # combine pairs of blocks until there is a single block
+        while len(levels[-1][0]) > 1:
+            lmin, lmax = levels[-1]
+            if len(lmin) % 2 == 1:
+                lmin = N.append(lmin, lmin[-1])
+                lmax = N.append(lmax, lmax[-1])
+            amin, bmin = lmin[0::2], lmin[1::2]
+            amax, bmax = lmax[0::2], lmax[1::2]
+            levels.append((
+                N.where(vals[bmin] < vals[amin], bmin, amin),
+                N.where(vals[bmax] > vals[amax], bmax, amax) ))
+        return levels
+
+    def selectIndices(self, n, coordfn, lo, hi, cellsize):
+        """Return sorted indices of the points needed to draw a line
+        through the first n points at the resolution given.
+
+        coordfn(indices) returns the coordinates (such as on the
+        screen) of the points with the indices given. These must not
+        decrease or must not increase with index.
+
+        Blocks of points with coordinates entirely outside lo to hi
+        are represented by their first and last points. Blocks of
+        points in the same cell of size cellsize are represented by
+        their first and last points, and the minimum and maximum
+        values. Other blocks are split into their parts. The time
+        taken is proportional to the number of cells, and not the
+        number of points.
+
+        The points include those kept by utils.decimateLine for cells
+        within lo to hi, so decimating them gives the same line.
+        """
+
+        n = min(n, len(self.vals))
+        if n == 0:
+            return N.zeros(0, dtype=N.intp)
+        scale = 1./cellsize
+        levels = self.levels
+
+        keep = []
+        blocks = N.arange(len(levels[-1][0]))
+        for k in range(len(levels)-1, -1, -1):
+            size = self.basesize << k
+            first = blocks*size
+            blocks = blocks[first < n]
+            first = first[first < n]
+            last = N.minimum(first+size, n) - 1
+
+            cfirst = N.asarray(coordfn(first), dtype=N.float64)
+            clast = N.asarray(coordfn(last), dtype=N.float64)
+            with N.errstate(invalid='ignore'):
+                outside = ( (N.maximum(cfirst, clast) < lo) |
+                            (N.minimum(cfirst, clast) > hi) )
+                incell = ( N.floor(cfirst*scale) == N.floor(clast*scale) )
+
+            # blocks which end beyond n have to be split
+            incell &= last-first == size-1
+            done = outside | incell
+            keep += [first[done], last[done]]
+            minidx, maxidx = levels[k]
+            keep += [minidx[blocks[incell]], maxidx[blocks[incell]]]
+
+            split = blocks[~done]
+            if k > 0:
+                blocks = N.column_stack((2*split, 2*split+1)).ravel()
+            else:
+                # use all points of remaining blocks
+                pts = ( split[:,N.newaxis]*size +
+                        N.arange(size)[N.newaxis,:] ).ravel()
+                keep.append(pts[pts < n])
+
+        return N.unique(N.concatenate(keep))
@@ -0,0 +1,111 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+
+"""Summary statistics of datasets, used for finding axis ranges."""
+
+from __future__ import division
+import weakref
+
+import numpy as N
+
+class RangeStats(object):
+    """Range statistics of the finite values in a set of arrays."""
+
+    def __init__(self):
+        self.minval, self.maxval = N.inf, -N.inf
+        self.posminval, self.posmaxval = N.inf, -N.inf
+        self.nfinite = 0
+
+    def update(self, vals):
+        """Include array vals in statistics."""
+        finite = vals[N.isfinite(vals)]
+        if len(finite) == 0:
+            return
+        self.nfinite += len(finite)
+        # values may be of other numeric types, so convert to float
+        self.minval = min(self.minval, float(finite.min()))
+        self.maxval = max(self.maxval, float(finite.max()))
+        pos = finite[finite > 0]
+        if len(pos) > 0:
+            self.posminval = min(self.posminval, float(pos.min()))
+            self.posmaxval = max(self.posmaxval, float(pos.max()))
+
+    def merge(self, other):
+        """Include statistics from other RangeStats."""
+        self.nfinite += other.nfinite
+        self.minval = min(self.minval, other.minval)
+        self.maxval = max(self.maxval, other.maxval)
+        self.posminval = min(self.posminval, other.posminval)
+        self.posmaxval = max(self.posmaxval, other.posmaxval)
+
+    def summary(self):
+        """Return a short array with the same finite minimum and maximum,
+        and positive minimum and maximum, as the original values."""
+        vals = [v for v in (self.minval, self.posminval,
+                            self.posmaxval, self.maxval) if N.isfinite(v)]
+        return N.array(vals)
+
+class DatasetStats(object):
+    """Statistics for a 1D dataset.
+
+    data: RangeStats of the data values
+    extent: RangeStats of the data values, and values extended by errors
+    pointrange: (minimum, maximum) of error-extended points, or None
+    """
+
+    def __init__(self, data, extent, pointrange):
+        self.data = data
+        self.extent = extent
+        self.pointrange = pointrange
+
+class StatsCache(object):
+    """Keep statistics until the arrays of a dataset change.
+
+    The arrays are referenced weakly, so that old data can be freed.
+    The cache may be used by several threads, so the arrays, version
+    and statistics are replaced together.
+    """
+
+    def __init__(self):
+        # (weak references to arrays, version, statistics)
+        self.entry = None
+
+    @property
+    def stats(self):
+        """Statistics stored, or None."""
+        entry = self.entry
+        return None if entry is None else entry[2]
+
+    def get(self, arrays, version):
+        """Return stored statistics if still valid for arrays given,
+        or None."""
+        entry = self.entry
+        if entry is None:
+            return None
+        refs, cachedversion, stats = entry
+        if version != cachedversion or len(arrays) != len(refs):
+            return None
+        for ref, array in zip(refs, arrays):
+            if (ref() if ref is not None else None) is not array:
+                return None
+        return stats
+
+    def set(self, arrays, version, stats):
+        """Store statistics for arrays given."""
+        self.entry = (
+            [None if a is None else weakref.ref(a) for a in arrays],
+            version, stats)
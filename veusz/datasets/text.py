@@ -19,11 +19,12 @@
 """Text datasets."""
 
 from __future__ import division
+import numpy as N
 
 from .commonfn import _
 from .base import DatasetConcreteBase
 
-from ..compat import cstr, crepr
+from ..compat import cstr, crepr, crange
 from .. import utils
 
 class DatasetText(DatasetConcreteBase):
@@ -110,6 +111,11 @@ class DatasetText(DatasetConcreteBase):
 
         self.document.modifiedData(self)
 
+    def groupKeys(self):
+        """Return (integer codes, list of unique values), for grouping
+        rows by value."""
+        return encodeCategories(self.data)
+
     def returnCopy(self):
         """Returns version of dataset with no linking."""
         return DatasetText(self.data)
@@ -117,3 +123,226 @@ class DatasetText(DatasetConcreteBase):
     def returnCopyWithNewData(self, **args):
         """Return dataset of same type using the column data given."""
         return DatasetText(**args)
+
+def encodeCategories(values):
+    """Encode sequence of text as (integer codes, list of unique text).
+
+    Unique text is listed in order of first appearance."""
+    if isinstance(values, CategoricalValues):
+        return values.codes, values.categories
+    lookup = {}
+    categories = []
+    codes = N.empty(len(values), dtype=N.int32)
+    for i, v in enumerate(values):
+        code = lookup.get(v)
+        if code is None:
+            code = lookup[v] = len(categories)
+            categories.append(v)
+        codes[i] = code
+    return codes, categories
+
+class CategoricalValues(object):
+    """Sequence of text, stored as integer codes into a list of unique
+    values (categories).
+
+    This behaves like a list of text, except that comparisons with text
+    or another CategoricalValues give numpy boolean arrays, evaluated
+    using the codes.
+    """
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _table(self):
+        """Return categories as an object array."""
+        table = N.empty(len(self.categories), dtype=object)
+        table[:] = self.categories
+        return table
+
+    def tolist(self):
+        """Return values as a list of text."""
+        return self._table()[self.codes].tolist()
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._table()[self.codes[key]].tolist()
+        elif isinstance(key, (list, N.ndarray)):
+            return self.take(key)
+        return self.categories[self.codes[key]]
+
+    def __setitem__(self, key, val):
+        try:
+            code = self.categories.index(val)
+        except ValueError:
+            code = len(self.categories)
+            self.categories.append(val)
+        self.codes[key] = code
+
+    # other list operations give lists
+    def __add__(self, other):
+        return self.tolist() + list(other)
+    def __radd__(self, other):
+        return list(other) + self.tolist()
+    def __mul__(self, num):
+        return self.tolist() * num
+    __rmul__ = __mul__
+    def __contains__(self, val):
+        return val in self.categories and bool(N.any(self == val))
+    def index(self, val):
+        return self.tolist().index(val)
+    def count(self, val):
+        return int(N.count_nonzero(self == val))
+
+    def take(self, indices):
+        """Return CategoricalValues for the rows given."""
+        return CategoricalValues(self.codes[indices], self.categories)
+
+    def __array__(self, dtype=None, copy=None):
+        return self._table()[self.codes].astype(dtype or N.str_)
+
+    def __eq__(self, other):
+        if isinstance(other, CategoricalValues):
+            if other.categories is self.categories:
+                return self.codes == other.codes
+            # map the other codes into this table
+            lookup = dict((v, i) for i, v in enumerate(self.categories))
+            mapping = N.array(
+                [lookup.get(v, -1) for v in other.categories], dtype=N.int32)
+            return self.codes == mapping[other.codes]
+        elif isinstance(other, (list, tuple, N.ndarray)):
+            return self._table()[self.codes] == N.asarray(other, dtype=object)
+        try:
+            return self.codes == self.categories.index(other)
+        except ValueError:
+            return N.zeros(len(self.codes), dtype=N.bool_)
+
+    def __ne__(self, other):
+        return N.logical_not(self == other)
+
+    __hash__ = None
+
+    def isin(self, values):
+        """Return boolean array of whether each row is in values."""
+        values = set(values)
+        sel = [i for i, v in enumerate(self.categories) if v in values]
+        return N.isin(self.codes, sel)
+
+class DatasetTextCategorical(DatasetText):
+    """Text dataset stored as integer codes into a list of unique values.
+
+    This uses much less memory than DatasetText when values repeat.
+    """
+
+    dstype = _('Text (categorical)')
+
+    def __init__(self, data=None, codes=None, categories=None, linked=None):
+        """Initialise dataset from list of text data, or from integer
+        codes indexing into list of unique text categories."""
+
+        DatasetConcreteBase.__init__(self, linked=linked)
+        if data is not None:
+            codes, categories = encodeCategories(data)
+        self.codes = N.array(codes, dtype=N.int32)
+        self.categories = list(categories)
+
+    def _getData(self):
+        return CategoricalValues(self.codes, self.categories)
+    def _setData(self, vals):
+        codes, categories = encodeCategories(vals)
+        self.codes = N.array(codes, dtype=N.int32)
+        self.categories = list(categories)
+    data = property(_getData, _setData)
+
+    def changeValues(self, type, vals):
+        if type == 'data':
+            self.data = vals
+        else:
+            raise ValueError('type does not contain an allowed value')
+
+        self.document.modifiedData(self)
+
+    def description(self):
+        return _('Text (length %i, %i unique values)') % (
+            len(self.codes), len(self.categories))
+
+    def memorySize(self):
+        """Return approximate memory used by values in dataset (bytes)."""
+        return self.codes.nbytes + sum(
+            [len(v) for v in self.categories]) + 8*len(self.categories)
+
+    def groupKeys(self):
+        """Return (integer codes, list of unique values)."""
+        return self.codes, self.categories
+
+    def saveDataDumpToText(self, fileobj, name):
+        """Save data to file."""
+        fileobj.write("SetDataTextCategorical(%s, codes=[\n" % crepr(name))
+        for i in crange(0, len(self.codes), 20):
+            fileobj.write("    %s,\n" % ', '.join(
+                [str(c) for c in self.codes[i:i+20]]))
+        fileobj.write("], categories=[\n")
+        for cat in self.categories:
+            fileobj.write("    %s,\n" % crepr(cat))
+        fileobj.write("])\n")
+
+    def saveDataDumpToHDF5(self, group, name):
+        """Save categorical text data to hdf5 file."""
+        tgrp = group.create_group(utils.escapeHDFDataName(name))
+        tgrp.attrs['vsz_datatype'] = 'textcat'
+        tgrp['codes'] = self.codes
+        tgrp['codes'].attrs['vsz_name'] = name.encode('utf-8')
+        if self.categories:
+            # h5py cannot write an empty list
+            tgrp['categories'] = [x.encode('utf-8') for x in self.categories]
+
+    def deleteRows(self, row, numrows):
+        """Delete numrows rows starting from row.
+        Returns deleted rows as a dict of {column:data, ...}
+        """
+        retn = {'data': self.data[row:row+numrows]}
+        self.codes = N.delete(self.codes, N.s_[row:row+numrows])
+        self.document.modifiedData(self)
+        return retn
+
+    def insertRows(self, row, numrows, rowdata):
+        """Insert numrows rows starting from row.
+        rowdata is a dict of {column: data}.
+        """
+        data = rowdata.get('data', [])
+        insdata = list(data) + (['']*(numrows-len(data)))
+        newcodes = N.empty(numrows, dtype=N.int32)
+        values = CategoricalValues(newcodes, self.categories)
+        for i, d in enumerate(insdata):
+            values[i] = d
+        self.codes = N.insert(self.codes, [row]*numrows, newcodes)
+        self.document.modifiedData(self)
+
+    def returnCopy(self):
+        """Returns version of dataset with no linking."""
+        return DatasetTextCategorical(
+            codes=N.array(self.codes), categories=self.categories)
+
+    def returnCopyWithNewData(self, **args):
+        """Return dataset of same type using the column data given."""
+        return DatasetTextCategorical(**args)
+
+def makeTextDataset(data, linked=None):
+    """Make a text dataset for imported data.
+
+    If the text_categorical setting is enabled and values are often
+    repeated, a DatasetTextCategorical is returned."""
+
+    from .. import setting
+    if setting.settingdb.get('text_categorical', False) and len(data) > 0:
+        codes, categories = encodeCategories(data)
+        if len(categories) <= len(data)//2:
+            return DatasetTextCategorical(
+                codes=codes, categories=categories, linked=linked)
+    return DatasetText(data=data, linked=linked)
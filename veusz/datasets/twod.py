@@ -334,7 +334,11 @@ class Dataset2DXYFunc(Dataset2DBase):
 
     def evalDataset(self):
         """Evaluate the 2d dataset."""
+        # the document may be painted in another thread
+        with self.document.changelock:
+            return self._evalDataset()
 
+    def _evalDataset(self):
         if self.document.changeset == self.lastchangeset:
             return self.cacheddata
 
@@ -44,6 +44,26 @@ def checkGetStep(text):
             pass
     return None
 
+def checkGetGridSize(text):
+    """Check grid size syntax is okay.
+    Syntax is blank (automatic), n or nx,ny
+    Returns (nx, ny), None if automatic or False if fails
+    """
+
+    text = text.strip()
+    if not text:
+        return None
+    parts = text.split(',')
+    if len(parts) in (1, 2):
+        try:
+            vals = [int(x) for x in parts]
+        except ValueError:
+            pass
+        else:
+            if min(vals) > 0:
+                return (vals[0], vals[-1])
+    return False
+
 class DataCreate2DDialog(VeuszDialog):
 
     def __init__(self, parent, document):
@@ -65,6 +85,14 @@ class DataCreate2DDialog(VeuszDialog):
         for combo in (self.namecombo, self.xexprcombo, self.yexprcombo,
                       self.zexprcombo):
             combo.editTextChanged.connect(self.enableDisableCreate)
+        self.gridsizeedit.textChanged.connect(self.enableDisableCreate)
+
+        for mode, name in (
+                ('auto', _('Automatic')),
+                ('nearest', _('Nearest point')),
+                ('average', _('Average in cells')),
+                ('linear', _('Linear interpolation'))):
+            self.gridmodecombo.addItem(name, mode)
 
         self.fromxyzexpr.toggle()
         self.enableDisableCreate()
@@ -105,6 +133,10 @@ class DataCreate2DDialog(VeuszDialog):
         # help the user by listing existing datasets
         utils.populateCombo(self.namecombo, datasets[0])
 
+        # gridding only applies to points
+        for widget in self.gridmodecombo, self.gridsizeedit:
+            widget.setEnabled(self.mode == 'xyzexpr')
+
         if self.mode == 'xyzexpr':
             # enable everything
             for combo in self.xexprcombo, self.yexprcombo, self.zexprcombo:
@@ -137,6 +169,10 @@ class DataCreate2DDialog(VeuszDialog):
             self.xexprcombo.setEditText(ds.exprx)
             self.yexprcombo.setEditText(ds.expry)
             self.zexprcombo.setEditText(ds.exprz)
+            self.gridmodecombo.setCurrentIndex(
+                self.gridmodecombo.findData(ds.gridmode))
+            self.gridsizeedit.setText(
+                '' if ds.gridsize is None else '%i,%i' % ds.gridsize)
 
         elif isinstance(ds, datasets.Dataset2DExpression):
             self.from2dexpr.click()
@@ -168,6 +204,8 @@ class DataCreate2DDialog(VeuszDialog):
         if self.mode == 'xyzexpr':
             # need x and yexpr
             disable = disable or not text['xexpr'] or not text['yexpr']
+            disable = disable or checkGetGridSize(
+                self.gridsizeedit.text()) is False
 
         elif self.mode == '2dexpr':
             # nothing else
@@ -197,7 +235,10 @@ class DataCreate2DDialog(VeuszDialog):
                 op = document.OperationDataset2DCreateExpressionXYZ(
                     text['name'],
                     text['xexpr'], text['yexpr'], text['zexpr'],
-                    link)
+                    link,
+                    gridmode=self.gridmodecombo.itemData(
+                        self.gridmodecombo.currentIndex()),
+                    gridsize=checkGetGridSize(self.gridsizeedit.text()))
 
             elif self.mode == '2dexpr':
                 op = document.OperationDataset2DCreateExpression(
@@ -43,8 +43,24 @@ class DatasetTableModel1D(qt4.QAbstractTableModel):
         self.document = document
         self.dsname = datasetname
 
+        # dataset and its version when the view was last updated, and
+        # row changes to the dataset since then
+        self.dsstate = self._datasetState()
+        self.rowchanges = []
+
+        document.sigDatasetRows.connect(self.slotDatasetRows)
         document.signalModified.connect(self.slotDocumentModified)
 
+    def _datasetState(self):
+        ds = self.document.data.get(self.dsname)
+        return (ds, getattr(ds, 'dataversion', None))
+
+    def _column(self, ds, col):
+        """Get column from dataset, without joining edited columns."""
+        if isinstance(ds, datasets.DatasetChunkedEdit):
+            return ds.columnView(col)
+        return getattr(ds, col)
+
     def rowCount(self, parent):
         """Return number of rows."""
         if parent.isValid():
@@ -52,13 +68,35 @@ class DatasetTableModel1D(qt4.QAbstractTableModel):
             return 0
 
         try:
-            return len(self.document.data[self.dsname].data)+1
-        except (KeyError, AttributeError):
+            ds = self.document.data[self.dsname]
+            return len(self._column(ds, 'data'))+1
+        except (KeyError, AttributeError, TypeError):
             return 0
 
+    def slotDatasetRows(self, dataset, row, numremoved, numinserted):
+        """Record rows of the dataset which were changed."""
+        if dataset is self.document.data.get(self.dsname):
+            self.rowchanges.append((row, numremoved, numinserted))
+
     def slotDocumentModified(self):
         """Called when document modified."""
-        self.layoutChanged.emit()
+
+        changes, self.rowchanges = self.rowchanges, []
+        oldds, oldversion = self.dsstate
+        self.dsstate = ds, version = self._datasetState()
+
+        # if the only changes to the dataset were values being set,
+        # update those rows, rather than the whole view
+        if ( ds is not None and ds is oldds and changes and
+             version - oldversion == len(changes) and
+             all((r[1] == r[2] for r in changes)) ):
+            first = min((r[0] for r in changes))
+            last = max((r[0]+r[1]-1 for r in changes))
+            self.dataChanged.emit(
+                self.index(first, 0),
+                self.index(last, len(ds.column_descriptions)-1))
+        else:
+            self.layoutChanged.emit()
 
     def columnCount(self, parent):
         """Return number of columns."""
@@ -77,7 +115,7 @@ class DatasetTableModel1D(qt4.QAbstractTableModel):
         ds = self.document.data[self.dsname]
         if ds is not None:
             # select correct part of dataset
-            data = getattr(ds, ds.columns[index.column()])
+            data = self._column(ds, ds.columns[index.column()])
         if ds is not None and data is not None and role in (
             qt4.Qt.DisplayRole, qt4.Qt.EditRole):
             # blank row at end of data
@@ -104,7 +142,7 @@ class DatasetTableModel1D(qt4.QAbstractTableModel):
                 # column names
                 return ds.column_descriptions[section]
             else:
-                if section == len(ds.data):
+                if section == len(self._column(ds, 'data')):
                     return "+"
                 # return row numbers
                 return section+1
@@ -140,7 +178,7 @@ class DatasetTableModel1D(qt4.QAbstractTableModel):
         row = index.row()
         column = index.column()
         ds = self.document.data[self.dsname]
-        data = getattr(ds, ds.columns[index.column()])
+        data = self._column(ds, ds.columns[index.column()])
 
         # add new column if necessary
         ops = document.OperationMultiple([], descr=_('set value'))
@@ -150,7 +188,7 @@ class DatasetTableModel1D(qt4.QAbstractTableModel):
                                                    ds.columns[column]))
 
         # add a row if necessary
-        if row == len(ds.data):
+        if row == len(self._column(ds, 'data')):
             ops.addOperation(
                 document.OperationDatasetInsertRow(self.dsname, row, 1))
 
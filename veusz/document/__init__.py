@@ -26,6 +26,7 @@ from .commandinterpreter import *
 from .operations import *
 from .mime import *
 from .painthelper import *
+from .snapshot import *
 from .export import Export, printDialog
 from .dbusinterface import *
 from .loader import loadDocument, executeScript, LoadError
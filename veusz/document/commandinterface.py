@@ -87,6 +87,7 @@ class CommandInterface(qt4.QObject):
         'SetDataExpression',
         'SetDataRange',
         'SetDataText',
+        'SetDataTextCategorical',
         'SettingType',
         'SetVerbose',
         'TagDatasets',
@@ -521,17 +522,30 @@ class CommandInterface(qt4.QObject):
                       data.data.shape[0], data.data.shape[1])
             )
 
-    def SetData2DExpressionXYZ(self, name, xexpr, yexpr, zexpr, linked=False):
+    def SetData2DExpressionXYZ(self, name, xexpr, yexpr, zexpr, linked=False,
+                               gridmode='auto', gridsize=None):
         """Create a 2D dataset based on expressions in x, y and z
 
-        xexpr is an expression which expands to an equally-spaced grid of x coordinates
-        yexpr expands to equally spaced y coordinates
+        xexpr is an expression which expands to x coordinates
+        yexpr expands to y coordinates
         zexpr expands to z coordinates.
         linked specifies whether to permanently link the dataset to the expressions
+        gridmode is how points are converted to the grid: 'auto' (use
+          the equally-spaced grid of the points, or average if
+          irregular), 'nearest', 'average' or 'linear'
+        gridsize is the number of cells (nx, ny), or None for automatic
         """
 
-        op = operations.OperationDataset2DCreateExpressionXYZ(name, xexpr, yexpr, zexpr,
-                                                              linked)
+        if gridmode not in datasets.gridmodes:
+            raise ValueError("Invalid gridding mode '%s'" % gridmode)
+        if gridsize is not None:
+            gridsize = (int(gridsize[0]), int(gridsize[1]))
+            if min(gridsize) < 1:
+                raise ValueError("gridsize must be positive")
+
+        op = operations.OperationDataset2DCreateExpressionXYZ(
+            name, xexpr, yexpr, zexpr, linked,
+            gridmode=gridmode, gridsize=gridsize)
         data = self.document.applyOperation(op)
 
         if self.verbose:
@@ -628,6 +642,26 @@ class CommandInterface(qt4.QObject):
                       name, repr(data.data))
             )
 
+    def SetDataTextCategorical(self, name, val=None,
+                               codes=None, categories=None):
+        """Create a text dataset stored as codes into unique values.
+
+        Either val is a list of text, or codes is a list of integer
+        indices into the list of text categories.
+        """
+
+        data = datasets.DatasetTextCategorical(
+            data=val, codes=codes, categories=categories)
+        op = operations.OperationDatasetSet(name, data)
+        self.document.applyOperation(op)
+
+        if self.verbose:
+            print(
+                _("Set categorical text dataset '%s'\n"
+                  "Unique values = %s") % (
+                      name, repr(data.categories))
+            )
+
     def GetData(self, name):
         """Return the data with the name.
 
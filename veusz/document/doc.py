@@ -41,6 +41,8 @@ from .. import qtall as qt4
 from . import widgetfactory
 from . import painthelper
 from . import evaluate
+from . import history
+from . import snapshot
 
 from .. import datasets
 from .. import utils
@@ -85,6 +87,9 @@ class Document(qt4.QObject):
     sigWiped = qt4.pyqtSignal()
     # to ask whether the import is allowed (module name and symbol list)
     sigAllowedImports = qt4.pyqtSignal(cstr, list)
+    # emitted when rows of a dataset change (dataset, first row,
+    # number of rows removed, number of rows inserted)
+    sigDatasetRows = qt4.pyqtSignal(object, int, int, int)
 
     def __init__(self):
         """Initialise the document."""
@@ -97,6 +102,10 @@ class Document(qt4.QObject):
         # change tracking of document as a whole
         self.changeset = 0            # increased when the document changes
 
+        # held while changing or painting the document, as it may be
+        # painted in another thread
+        self.changelock = snapshot.ChangeLock()
+
         # map tags to dataset names
         self.datasettags = defaultdict(list)
 
@@ -115,12 +124,13 @@ class Document(qt4.QObject):
 
     def wipe(self):
         """Wipe out any stored data."""
-        self.data = {}
-        self.basewidget = widgetfactory.thefactory.makeWidget(
-            'document', None, None)
-        self.basewidget.document = self
-        self.setModified(False)
-        self.filename = ""
+        with self.changelock:
+            self.data = {}
+            self.basewidget = widgetfactory.thefactory.makeWidget(
+                'document', None, None)
+            self.basewidget.document = self
+            self.setModified(False)
+            self.filename = ""
         self.sigWiped.emit()
 
     def clearHistory(self):
@@ -128,20 +138,30 @@ class Document(qt4.QObject):
         self.historybatch = []
         self.historyundo = []
         self.historyredo = []
+        if getattr(self, 'historyspill', None) is None:
+            self.historyspill = history.HistorySpill()
+        self.historyspill.clear()
 
     def suspendUpdates(self):
         """Holds sending update messages.
         This speeds up modification of the document and prevents the document
-        from being updated on the screen."""
+        from being updated on the screen.
+
+        The document is locked against painting in other threads until
+        updates are reenabled."""
+        self.changelock.acquire()
         self.suspendupdates.append(self.changeset)
 
     def enableUpdates(self):
         """Reenables document updates."""
-        changeset = self.suspendupdates.pop()
-        if not self.suspendupdates and changeset != self.changeset:
-            # bump this up as some watchers might ignore this otherwise
-            self.changeset += 1
-            self.setModified()
+        try:
+            changeset = self.suspendupdates.pop()
+            if not self.suspendupdates and changeset != self.changeset:
+                # bump this up as some watchers might ignore this otherwise
+                self.changeset += 1
+                self.setModified()
+        finally:
+            self.changelock.release()
 
     def suspend(self):
         """Return context manager for suspending updates."""
@@ -168,6 +188,8 @@ class Document(qt4.QObject):
         Updates are suspended during the operation.
         """
 
+        # redone operations may have had their data spilled
+        self.historyspill.restoreOperation(operation)
         with DocSuspend(self):
             retn = operation.do(self)
             self.changeset += 1
@@ -176,8 +198,8 @@ class Document(qt4.QObject):
             # in batch mode, create an OperationMultiple for all changes
             self.historybatch[-1].addOperation(operation)
         else:
-            # standard mode
-            self.historyundo = self.historyundo[-9:] + [operation]
+            # standard mode, keeping history within memory budget
+            self.historyspill.push(self, self.historyundo, operation)
         self.historyredo = []
 
         return retn
@@ -200,7 +222,7 @@ class Document(qt4.QObject):
     def undoOperation(self):
         """Undo the previous operation."""
 
-        operation = self.historyundo.pop()
+        operation = self.historyspill.pop(self.historyundo)
         with DocSuspend(self):
             operation.undo(self)
             self.changeset += 1
@@ -264,23 +286,35 @@ class Document(qt4.QObject):
 
     def setData(self, name, dataset):
         """Set data to val, with symmetric or negative and positive errors."""
-        self.data[name] = dataset
-        dataset.document = self
-        dataset.username = name
+        with self.changelock:
+            self.data[name] = dataset
+            dataset.document = self
+            dataset.username = name
 
-        # update the change tracking
-        self.setModified()
+            # update the change tracking
+            self.setModified()
 
     def deleteData(self, name):
         """Remove a dataset"""
-        if name in self.data:
-            del self.data[name]
-            self.setModified()
+        with self.changelock:
+            if name in self.data:
+                del self.data[name]
+                self.setModified()
 
-    def modifiedData(self, dataset):
-        """The named dataset was modified"""
-        if dataset in self.data.values():
-            self.setModified()
+    def modifiedData(self, dataset, rows=None):
+        """The named dataset was modified.
+
+        rows is optionally (first row, number of rows removed, number
+        of rows inserted), if only some rows were changed.
+        """
+        with self.changelock:
+            dataset.dataversion += 1
+            if rows is not None:
+                # sent before signalModified, so views can update
+                # only the changed rows
+                self.sigDatasetRows.emit(dataset, *rows)
+            if dataset in self.data.values():
+                self.setModified()
 
     def getLinkedFiles(self, filenames=None):
         """Get a list of LinkedFile objects used by the document.
@@ -328,12 +362,13 @@ class Document(qt4.QObject):
 
     def renameDataset(self, oldname, newname):
         """Rename the dataset."""
-        d = self.data[oldname]
-        del self.data[oldname]
-        self.data[newname] = d
-        d.username = newname
+        with self.changelock:
+            d = self.data[oldname]
+            del self.data[oldname]
+            self.data[newname] = d
+            d.username = newname
 
-        self.setModified()
+            self.setModified()
 
     def getData(self, name):
         """Get data with name"""
@@ -404,7 +439,8 @@ class Document(qt4.QObject):
 
     def paintTo(self, painthelper, page):
         """Paint page specified to the paint helper."""
-        self.basewidget.draw(painthelper, page)
+        with self.changelock:
+            self.basewidget.draw(painthelper, page)
 
     def getNumberPages(self):
         """Return the number of pages in the document."""
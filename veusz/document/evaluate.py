@@ -17,10 +17,12 @@
 ##############################################################################
 
 from __future__ import division
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import os.path
 import re
 import datetime
+import hashlib
+import threading
 
 import numpy as N
 
@@ -30,12 +32,17 @@ from .. import utils
 from .. import datasets
 from .. import qtall as qt
 from ..openreliability import cst
+from . import evalworker
 
 # python identifier
 identifier_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
 # for splitting
 identifier_split_re = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
 
+# functions whose results depend on more than their arguments
+impure_re = re.compile(
+    r'\b(DATA|SETTING|FILENAME|BASENAME|DATE|TIME|ENVIRON)\b')
+
 # python module
 module_re = re.compile(r'^[A-Za-z_\.]+$')
 
@@ -53,6 +60,123 @@ def _(text, disambiguation=None, context="Evaluate"):
     """Translate text."""
     return qt.QCoreApplication.translate(context, text, disambiguation)
 
+class _Unhashable(Exception):
+    """Raised if a custom function argument cannot be used as a key."""
+
+def _memoKey(val):
+    """Make a hashable key for a custom function argument."""
+    if val is None or isinstance(val, (bool, int, float, complex, cstr)):
+        # include type so that 1 and 1.0 are distinct
+        return (type(val), val)
+    elif isinstance(val, N.ndarray):
+        if val.dtype.hasobject:
+            raise _Unhashable()
+        return (val.dtype.str, val.shape,
+                hashlib.sha1(val.tobytes()).digest())
+    elif isinstance(val, N.generic):
+        return (val.dtype.str, val.item())
+    elif isinstance(val, (list, tuple)):
+        return (type(val),) + tuple(_memoKey(v) for v in val)
+    raise _Unhashable()
+
+class CustomFunctionCache(object):
+    """Least-recently-used cache of results of custom functions.
+
+    Results are keyed on the function name and its arguments, so the
+    cache has to be cleared if the custom definitions are changed.
+    Results are also dropped when the changeset of document doc
+    changes. The cache may be used by several threads, so the results
+    are only changed holding a lock (which is not held when calling
+    the functions).
+    """
+
+    def __init__(self, maxsize, doc=None):
+        self.maxsize = maxsize
+        self.doc = doc
+        self.changeset = None
+        self.results = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Remove cached results and reset statistics."""
+        with self.lock:
+            self.results.clear()
+            self.hits = self.misses = 0
+
+    def wrap(self, name, fn):
+        """Return function which caches results of calling fn."""
+        def cachedfn(*args, **kwargs):
+            try:
+                key = (name, _memoKey(args), _memoKey(
+                    tuple(sorted(citems(kwargs)))))
+            except _Unhashable:
+                return fn(*args, **kwargs)
+            return self.call(key, fn, args, kwargs)
+        return cachedfn
+
+    def call(self, key, fn, args, kwargs):
+        """Return cached result for key, or evaluate fn and store."""
+        results = self.results
+        with self.lock:
+            if ( self.doc is not None and
+                 self.changeset != self.doc.changeset ):
+                results.clear()
+                self.changeset = self.doc.changeset
+
+            found = key in results
+            if found:
+                self.hits += 1
+                val = results.pop(key)
+                results[key] = val
+            else:
+                self.misses += 1
+                changeset = self.changeset
+
+        if not found:
+            val = fn(*args, **kwargs)
+            with self.lock:
+                # not stored if the document changed while evaluating
+                if changeset == self.changeset:
+                    results[key] = val
+                    while len(results) > self.maxsize:
+                        results.popitem(last=False)
+
+        # callers may modify array results in place
+        if isinstance(val, N.ndarray):
+            val = N.array(val)
+        return val
+
+    def statistics(self):
+        """Return text describing cache use."""
+        return _("Custom function cache: %i hits, %i misses, "
+                 "%i results stored") % (
+                     self.hits, self.misses, len(self.results))
+
+def addStandardSymbols(context):
+    """Add symbols which do not depend on the document to context."""
+
+    # we try to avoid various bits and pieces for safety
+    # we add OpenReliability things first to avoid overwritting numpy stuff
+    listModules = [cst, N]
+    for module in listModules:
+        for name, val in citems(module.__dict__):
+            if ( (callable(val) or type(val)==float) and
+             name not in __builtins__ and
+             name[:1] != '_' and name[-1:] != '_' ):
+                context[name] = val
+
+    # safe functions
+    context['os_path_join'] = os.path.join
+    context['os_path_dirname'] = os.path.dirname
+    context['veusz_markercodes'] = tuple(utils.MarkerCodes)
+
+    # helpful functions for expansion
+    context['ENVIRON'] = dict(os.environ)
+    context['DATE'] = Evaluate._evalformatdate
+    context['TIME'] = Evaluate._evalformattime
+    context['ESCAPE'] = utils.latexEscape
+
 class Evaluate:
     """Class to manage evaluation of expressions in a special environment."""
 
@@ -68,6 +192,13 @@ class Evaluate:
         # we use this format to preserve evaluation order
         self.customs = []
 
+        # optional cache of custom function results
+        self.funccache = None
+
+        # optional process for evaluating dataset expressions
+        self.worker = None
+        self.defnsource = []
+
         # this is the context used to evaluate expressions
         self.context = {}
         self.update()
@@ -92,32 +223,24 @@ class Evaluate:
         c = self.context
         c.clear()
 
-        # add numpy and OpenReliability things
-        # we try to avoid various bits and pieces for safety
-        # we add OpenReliability things first to avoid overwritting numpy stuff
-        listModules = [cst, N]
-        for module in listModules:
-            for name, val in citems(module.__dict__):
-                if ( (callable(val) or type(val)==float) and
-                 name not in __builtins__ and
-                 name[:1] != '_' and name[-1:] != '_' ):
-                    c[name] = val
-
-        # safe functions
-        c['os_path_join'] = os.path.join
-        c['os_path_dirname'] = os.path.dirname
-        c['veusz_markercodes'] = tuple(utils.MarkerCodes)
-
-        # helpful functions for expansion
-        c['ENVIRON'] = dict(os.environ)
-        c['DATE'] = self._evalformatdate
-        c['TIME'] = self._evalformattime
+        # cached results are invalid if the definitions change
+        self._updateFuncCache()
+
+        # source of successful custom definitions, for evaluation worker
+        del self.defnsource[:]
+
+        # add numpy and OpenReliability things, and safe functions
+        addStandardSymbols(c)
+
+        # functions which use the document
         c['DATA'] = self._evaldata
         c['FILENAME'] = self._evalfilename
         c['BASENAME'] = self._evalbasename
-        c['ESCAPE'] = utils.latexEscape
         c['SETTING'] = self._evalsetting
 
+        # custom definitions which cannot be cached
+        self.impurecustoms = self._findImpureCustoms()
+
         # custom definitions
         for ctype, name, val in self.customs:
             name = name.strip()
@@ -130,6 +253,49 @@ class Evaluate:
             else:
                 raise ValueError('Invalid custom type')
 
+    def _findImpureCustoms(self):
+        """Return set of names of custom functions and constants
+        whose values depend on more than their arguments, because they
+        use impure functions or other impure custom definitions."""
+
+        defns = {}
+        for ctype, name, val in self.customs:
+            if ctype == 'function':
+                m = function_re.match(name.strip())
+                if m:
+                    defns[m.group(1)] = val
+            elif ctype == 'constant':
+                defns[name.strip()] = val
+
+        impure = set(
+            [name for name, val in citems(defns) if impure_re.search(val)])
+        # repeat until no more definitions use impure definitions
+        changed = True
+        while changed:
+            changed = False
+            for name, val in citems(defns):
+                if ( name not in impure and
+                     not impure.isdisjoint(identifier_split_re.findall(val)) ):
+                    impure.add(name)
+                    changed = True
+        return impure
+
+    def _updateFuncCache(self):
+        """Reset the custom function cache, logging its use."""
+
+        if self.funccache is not None:
+            if self.funccache.hits or self.funccache.misses:
+                self.doc.log(self.funccache.statistics())
+            self.funccache.clear()
+
+        if setting.settingdb.get('custom_memoise', False):
+            size = max(1, setting.settingdb.get('custom_memoise_size', 256))
+            if self.funccache is None:
+                self.funccache = CustomFunctionCache(size, doc=self.doc)
+            self.funccache.maxsize = size
+        else:
+            self.funccache = None
+
     def _updateImport(self, module, val):
         """Add an import statement to the eval function context."""
         if module_re.match(module):
@@ -146,6 +312,7 @@ class Evaluate:
                         "Failed to import '%s' from module '%s'") %
                                  (', '.join(toimport), module))
                     return
+                self.defnsource.append(defn)
 
             delta = set(symbols)-set(toimport)
             if delta:
@@ -223,10 +390,17 @@ class Evaluate:
         if comp is None:
             return
         try:
-            self.context[name] = eval(comp, self.context)
+            val = eval(comp, self.context)
         except Exception as e:
             self.doc.log( _(
                 "Error evaluating '%s': '%s'") % (name, cstr(e)) )
+            return
+
+        if ( ctype == 'function' and self.funccache is not None and
+             name not in self.impurecustoms ):
+            val = self.funccache.wrap(name, val)
+        self.context[name] = val
+        self.defnsource.append('%s = %s' % (name, defn))
 
     def compileCheckedExpression(self, expr, origexpr=None, log=True):
         """Compile expression and check for errors.
@@ -285,26 +459,26 @@ class Evaluate:
         """DATA(name, [part]) eval: return dataset as array."""
         if part not in ('data', 'perr', 'serr', 'nerr'):
             raise RuntimeError("Invalid dataset part '%s'" % part)
-        if name not in self.data:
+        if name not in self.doc.data:
             raise RuntimeError("Dataset '%s' does not exist" % name)
-        data = getattr(self.data[name], part)
+        data = getattr(self.doc.data[name], part)
         if isinstance(data, N.ndarray):
-            return N.array(data)
+            return N.array(datasets.floatArray(data))
         elif isinstance(data, list):
             return list(data)
         return data
 
     def _evalfilename(self):
         """FILENAME() eval: returns filename."""
-        return utils.latexEscape(self.filename)
+        return utils.latexEscape(self.doc.filename)
 
     def _evalbasename(self):
         """BASENAME() eval: returns base filename."""
-        return utils.latexEscape(os.path.basename(self.filename))
+        return utils.latexEscape(os.path.basename(self.doc.filename))
 
     def _evalsetting(self, path):
         """SETTING() eval: return setting given full path."""
-        return self.resolveFullSettingPath(path).get()
+        return self.doc.resolveFullSettingPath(path).get()
 
     def evalDatasetExpression(self, expr, part='data', datatype='numeric',
                               dimensions=1):
@@ -316,15 +490,63 @@ class Evaluate:
         """
 
         key = (expr, part, datatype, dimensions)
-        if self.exprdscachechangeset != self.doc.changeset:
-            self.exprdscachechangeset = self.doc.changeset
-            self.exprdscache.clear()
-        elif key in self.exprdscache:
-            return self.exprdscache[key]
-
-        self.exprdscache[key] = ds = datasets.evalDatasetExpression(
-            self.doc, expr, part=part, datatype=datatype, dimensions=dimensions)
-        return ds
+        # the document may be painted in another thread
+        with self.doc.changelock:
+            if self.exprdscachechangeset != self.doc.changeset:
+                self.exprdscachechangeset = self.doc.changeset
+                self.exprdscache.clear()
+            elif key in self.exprdscache:
+                return self.exprdscache[key]
+
+            self.exprdscache[key] = ds = datasets.evalDatasetExpression(
+                self.doc, expr, part=part, datatype=datatype,
+                dimensions=dimensions)
+            return ds
+
+    def useWorker(self, expr):
+        """Should expression be evaluated in the worker process?"""
+        if not setting.settingdb.get('eval_worker', False):
+            return False
+        if evalworker.worker_unsupported_re.search(expr):
+            return False
+        for defn in self.defnsource:
+            if evalworker.worker_unsupported_re.search(defn):
+                return False
+        return True
+
+    def workerEval(self, expr, dsnames, extra=None):
+        """Evaluate expression in the worker process.
+
+        expr has dataset names substituted by _DS_(name, part)
+        dsnames is list of names of substituted datasets
+        extra is a dict of further names to add to the environment
+
+        Returns result, or raises evalworker.EvalWorkerError
+        """
+
+        dsvals = {}
+        for name in dsnames:
+            ds = self.doc.data[name]
+            for part in ds.columns:
+                val = getattr(ds, part)
+                if val is not None:
+                    dsvals[(name, part)] = datasets.floatArray(val)
+
+        if self.worker is None:
+            self.worker = evalworker.EvalWorker()
+        return self.worker.evaluate(
+            expr, self.defnsource, dsvals, extra or {},
+            setting.settingdb.get('eval_worker_timeout', 30),
+            setting.settingdb.get('eval_worker_memlimit', 0))
+
+    def workerBusy(self):
+        """Is the worker process evaluating an expression?"""
+        return self.worker is not None and self.worker.busy
+
+    def cancelWorker(self):
+        """Cancel any evaluation in progress in the worker."""
+        if self.worker is not None:
+            self.worker.cancel()
 
     def _processSafeImports(self, module, symbols):
         """Check what symbols are safe to import."""
@@ -0,0 +1,273 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Evaluate expressions in a separate worker process.
+
+The worker is given the custom definitions as source, the datasets an
+expression uses and the expression itself. Numeric arrays are passed
+in both directions using shared memory, where available. If the
+worker takes too long, or the user cancels, it is killed and started
+again when next needed.
+"""
+
+from __future__ import division
+import re
+import sys
+import time
+import traceback
+import multiprocessing
+
+import numpy as N
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from ..compat import cexec, cstr
+from ..utils import sharedmem
+from .. import qtall as qt
+
+def _(text, disambiguation=None, context="EvalWorker"):
+    """Translate text."""
+    return qt.QCoreApplication.translate(context, text, disambiguation)
+
+# functions which need the document and so cannot be used in the worker
+worker_unsupported_re = re.compile(r'\b(DATA|SETTING|FILENAME|BASENAME)\b')
+
+class EvalWorkerError(RuntimeError):
+    """Raised if the worker fails to evaluate an expression."""
+    pass
+
+class EvalWorkerCancelled(EvalWorkerError):
+    """Raised if the evaluation was cancelled or timed out."""
+    pass
+
+def _workerMakeContext(defns):
+    """Make evaluation context in worker from custom definition source."""
+    from . import evaluate
+    context = {}
+    evaluate.addStandardSymbols(context)
+    for defn in defns:
+        try:
+            cexec(defn, context)
+        except Exception:
+            pass
+    return context
+
+def _workerEvaluate(conn, request, contexts):
+    """Evaluate a single request in the worker."""
+    expr, defns, dsvals, extra = request
+
+    # definitions are cached as they rarely change
+    key = tuple(defns)
+    if key not in contexts:
+        contexts.clear()
+        contexts[key] = _workerMakeContext(defns)
+    env = contexts[key].copy()
+
+    inblocks = []
+    outblocks = []
+    try:
+        data = {}
+        for (dsname, part), desc in dsvals.items():
+            data[(dsname, part)] = sharedmem.unpackArray(desc, inblocks)
+        for name, desc in extra.items():
+            env[name] = sharedmem.unpackArray(desc, inblocks)
+
+        def getds(dsname, dspart):
+            try:
+                return data[(dsname, dspart)]
+            except KeyError:
+                raise RuntimeError(
+                    "Dataset '%s' does not have part '%s'" % (dsname, dspart))
+        env['_DS_'] = getds
+
+        result = eval(compile(expr, '<expression>', 'eval'), env)
+        if isinstance(result, N.ndarray):
+            # do not return views onto the input shared memory
+            result = N.array(result)
+        reply = ('ok', sharedmem.packArray(result, outblocks))
+    except MemoryError:
+        reply = ('error', _('Memory limit exceeded'))
+    except Exception as e:
+        reply = ('error', cstr(e))
+    finally:
+        env = data = result = None
+
+    try:
+        conn.send(reply)
+    except Exception as e:
+        sharedmem.closeBlocks(outblocks, unlink=True)
+        conn.send(('error', cstr(e)))
+    else:
+        # the receiver removes the output blocks
+        sharedmem.closeBlocks(outblocks)
+    sharedmem.closeBlocks(inblocks)
+
+def _workerMain(conn, memlimit):
+    """Main loop of the worker process."""
+
+    if resource is not None and memlimit > 0:
+        try:
+            nbytes = memlimit*1024*1024
+            resource.setrlimit(resource.RLIMIT_AS, (nbytes, nbytes))
+        except (ValueError, resource.error):
+            pass
+
+    contexts = {}
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        try:
+            _workerEvaluate(conn, request, contexts)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            break
+
+class EvalWorker(object):
+    """Manage a process for evaluating expressions."""
+
+    # time before a progress dialog is shown (s)
+    progressdelay = 0.5
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.memlimit = 0
+        self.busy = False
+        self.cancelled = False
+
+    def start(self, memlimit):
+        """Start worker process, if not already running."""
+        if self.process is not None and (
+                not self.process.is_alive() or self.memlimit != memlimit):
+            self.stop()
+        if self.process is None:
+            sharedmem.ensureTracker()
+            self.memlimit = memlimit
+            self.conn, childconn = multiprocessing.Pipe()
+            self.process = multiprocessing.Process(
+                target=_workerMain, args=(childconn, memlimit))
+            self.process.daemon = True
+            self.process.start()
+            childconn.close()
+
+    def stop(self):
+        """Kill worker process."""
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process.join()
+            self.conn.close()
+            self.process = self.conn = None
+
+    def cancel(self):
+        """Cancel the current evaluation."""
+        self.cancelled = True
+
+    def evaluate(self, expr, defns, dsvals, extra, timeout, memlimit):
+        """Evaluate expression in worker.
+
+        expr: expression, with datasets substituted by _DS_(name, part)
+        defns: list of source lines for custom definitions
+        dsvals: dict of (dsname, part) to values
+        extra: dict of extra names to values to add to the environment
+        timeout: time limit (s), or 0 for no limit
+        memlimit: limit for memory of the worker (MB), or 0
+
+        Returns result or raises EvalWorkerError.
+        """
+
+        if self.busy:
+            raise EvalWorkerError(_('Evaluation already in progress'))
+
+        self.start(memlimit)
+        self.busy = True
+        self.cancelled = False
+        blocks = []
+        try:
+            packds = dict([
+                (k, sharedmem.packArray(v, blocks)) for k, v in dsvals.items()])
+            packextra = dict([
+                (k, sharedmem.packArray(v, blocks)) for k, v in extra.items()])
+            self.conn.send((expr, list(defns), packds, packextra))
+            self.wait(timeout)
+            status, desc = self.conn.recv()
+        except EvalWorkerCancelled:
+            self.stop()
+            raise
+        except (EOFError, OSError, IOError):
+            self.stop()
+            raise EvalWorkerError(_('Evaluation process failed'))
+        finally:
+            sharedmem.closeBlocks(blocks, unlink=True)
+            self.busy = False
+
+        if status != 'ok':
+            raise EvalWorkerError(desc)
+
+        outblocks = []
+        try:
+            val = sharedmem.unpackArray(desc, outblocks)
+            if isinstance(val, N.ndarray) and outblocks:
+                val = N.array(val)
+        finally:
+            sharedmem.closeBlocks(outblocks, unlink=True)
+        return val
+
+    def wait(self, timeout):
+        """Wait for result, showing a dialog allowing cancellation if
+        the program has a user interface."""
+
+        start = time.time()
+        dialog = None
+        app = qt.QCoreApplication.instance()
+        # only show dialog in the user interface thread
+        gui = ( isinstance(app, qt.QApplication) and
+                qt.QThread.currentThread() is app.thread() )
+
+        try:
+            while not self.conn.poll(0.05):
+                elapsed = time.time() - start
+                if not self.process.is_alive():
+                    raise EvalWorkerError(_('Evaluation process failed'))
+                if timeout > 0 and elapsed > timeout:
+                    raise EvalWorkerCancelled(
+                        _('Evaluation exceeded time limit (%g s)') % timeout)
+
+                if gui and dialog is None and elapsed > self.progressdelay:
+                    dialog = qt.QProgressDialog(
+                        _('Evaluating expression...'), _('Cancel'), 0, 0)
+                    dialog.setWindowTitle(_('Evaluating'))
+                    dialog.setWindowModality(qt.Qt.ApplicationModal)
+                    dialog.canceled.connect(self.cancel)
+                    dialog.show()
+                if dialog is not None:
+                    qt.QCoreApplication.processEvents()
+
+                if self.cancelled:
+                    raise EvalWorkerCancelled(_('Evaluation cancelled'))
+        finally:
+            if dialog is not None:
+                dialog.canceled.disconnect(self.cancel)
+                dialog.close()
+                dialog.deleteLater()
@@ -250,11 +250,24 @@ class Export(object):
         else:
             image.fill(backqcolor.rgb())
 
-        # paint to the image
-        painter = painthelper.DirectPainter(image)
-        painter.setRenderHint(qt4.QPainter.Antialiasing, self.antialias)
-        painter.setRenderHint(qt4.QPainter.TextAntialiasing, self.antialias)
-        self.renderPage(page, size, (dpi,dpi), painter)
+        numthreads = 1
+        if qt4.QFontDatabase.supportsThreadedFontRendering():
+            numthreads = qt4.QThread.idealThreadCount()
+
+        if painthelper.useTiles(size, numthreads):
+            # large images are rendered in tiles in parallel
+            helper = painthelper.PaintHelper(
+                size, dpi=(dpi,dpi), bitmap=True, antialias=self.antialias)
+            self.doc.paintTo(helper, page)
+            helper.renderToImage(
+                image, antialias=self.antialias, numthreads=numthreads)
+        else:
+            # paint to the image
+            painter = painthelper.DirectPainter(image)
+            painter.setRenderHint(qt4.QPainter.Antialiasing, self.antialias)
+            painter.setRenderHint(
+                qt4.QPainter.TextAntialiasing, self.antialias)
+            self.renderPage(page, size, (dpi,dpi), painter)
 
         # write image to disk
         writer = qt4.QImageWriter()
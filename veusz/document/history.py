@@ -0,0 +1,271 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Limit the memory used by the undo history.
+
+Operations keep references to the datasets they replace or delete, so
+that they can be undone. The data of these datasets is measured once,
+when the operation is added to the history, and running totals are
+kept. Once the history holds more than a given amount, the data of the
+oldest datasets is compressed into a temporary file and restored if the
+operation is undone or redone. The oldest operations are removed from
+the history once the total size exceeds a budget, or the number of
+operations exceeds a maximum.
+"""
+
+from __future__ import division
+import collections
+import pickle
+import tempfile
+import zlib
+
+import numpy as N
+
+from ..compat import citems, cvalues
+from .. import datasets
+from .. import setting
+
+# nominal size of an operation without data (bytes)
+operation_overhead = 1024
+
+def _datasetColumns(ds):
+    """Return dict of column names to values stored directly in dataset."""
+    cols = {}
+    for col in list(ds.__dict__.get('_editchunks', {})):
+        # join columns being edited
+        getattr(ds, col)
+    for col in (ds.columns or ('data',)):
+        val = ds.__dict__.get(col)
+        if isinstance(val, (N.ndarray, list)):
+            cols[col] = val
+    return cols
+
+def _columnSize(val):
+    """Estimate memory used by a column."""
+    if isinstance(val, N.ndarray):
+        return val.nbytes
+    return sum([len(v) for v in val]) + 8*len(val)
+
+def _operationDatasets(op, out):
+    """Find datasets referenced by operation op, adding them to dict
+    out (by id). Sub-operations and containers are also searched."""
+
+    stack = [op]
+    seen = set()
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, datasets.DatasetBase):
+            out[id(obj)] = obj
+        elif isinstance(obj, dict):
+            stack += list(obj.keys()) + list(obj.values())
+        elif isinstance(obj, (list, tuple, set)):
+            stack += list(obj)
+        elif ( hasattr(obj, 'do') and hasattr(obj, 'undo') and
+               hasattr(obj, '__dict__') ):
+            # an operation
+            stack += list(obj.__dict__.values())
+
+class _DatasetRecord(object):
+    """Size of dataset held by the undo history."""
+
+    def __init__(self, ds, size):
+        self.ds = ds
+        self.size = size
+        # number of operations in history using dataset
+        self.refs = 0
+        # size of data in file, or None if in memory
+        self.spillsize = None
+
+class HistorySpill(object):
+    """Keep track of the data held by the undo history, limiting its
+    size.
+
+    Data spilled to the temporary file are removed from their datasets
+    until restored.
+    """
+
+    def __init__(self):
+        self.file = None
+        self.clear()
+
+    def clear(self):
+        """Forget history and all spilled data."""
+        # ids of datasets used by each operation in the history
+        self.entries = collections.deque()
+        # id(dataset) -> _DatasetRecord for datasets in history
+        self.records = {}
+        # records of datasets in memory, oldest first
+        self.inmemory = collections.OrderedDict()
+        # total size of data in memory and in file
+        self.memsize = self.spillsize = 0
+        # id(dataset) -> (dataset, file offset, length)
+        self.spilled = {}
+        self._closeFile()
+
+    def _closeFile(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def totalSize(self):
+        """Total size of history, including overheads."""
+        return ( self.memsize + self.spillsize +
+                 operation_overhead*len(self.entries) )
+
+    def spill(self, ds):
+        """Write data of dataset to the file, returning compressed size."""
+        if id(ds) in self.spilled:
+            return self.spilled[id(ds)][2]
+        cols = _datasetColumns(ds)
+        if not cols:
+            return 0
+
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(prefix='veusz_undo_')
+        payload = zlib.compress(
+            pickle.dumps(cols, pickle.HIGHEST_PROTOCOL), 1)
+        self.file.seek(0, 2)
+        offset = self.file.tell()
+        self.file.write(payload)
+
+        for col in cols:
+            setattr(ds, col, None)
+        self.spilled[id(ds)] = (ds, offset, len(payload))
+        return len(payload)
+
+    def restore(self, ds):
+        """Put spilled data back into dataset."""
+        rec = self.spilled.pop(id(ds), None)
+        if rec is None:
+            return
+        self.file.seek(rec[1])
+        cols = pickle.loads(zlib.decompress(self.file.read(rec[2])))
+        for col, val in citems(cols):
+            setattr(ds, col, val)
+        if not self.spilled:
+            # nothing left, so free file space
+            self._closeFile()
+
+    def restoreOperation(self, op):
+        """Restore any spilled data used by operation."""
+        if not self.spilled:
+            return
+        found = {}
+        _operationDatasets(op, found)
+        for ds in cvalues(found):
+            self._restoreRecord(id(ds))
+            self.restore(ds)
+
+    def discard(self, ds):
+        """Forget spilled data of dataset."""
+        self.spilled.pop(id(ds), None)
+        if not self.spilled:
+            self._closeFile()
+
+    def _restoreRecord(self, dsid):
+        """Account for data of dataset moving back into memory."""
+        rec = self.records.get(dsid)
+        if rec is not None and rec.spillsize is not None:
+            self.spillsize -= rec.spillsize
+            self.memsize += rec.size
+            rec.spillsize = None
+            self.inmemory[dsid] = rec
+
+    def _release(self, dsids, restore):
+        """Remove a reference to the datasets with dsids, forgetting
+        those no longer used. Spilled data are restored if restore is
+        set, or discarded otherwise."""
+        for dsid in dsids:
+            rec = self.records[dsid]
+            rec.refs -= 1
+            if rec.refs > 0:
+                continue
+            del self.records[dsid]
+            if rec.spillsize is None:
+                self.memsize -= rec.size
+                del self.inmemory[dsid]
+            else:
+                self.spillsize -= rec.spillsize
+                if restore:
+                    self.restore(rec.ds)
+                else:
+                    self.discard(rec.ds)
+
+    def push(self, doc, history, op):
+        """Add operation op to the end of the history list, spilling
+        data and removing old operations from the list so that the
+        history stays within the limits in the settings.
+        """
+
+        memlimit = setting.settingdb.get('undo_memory', 256) * 1024**2
+        budget = setting.settingdb.get('undo_budget', 2048) * 1024**2
+        maxsteps = max(setting.settingdb.get('undo_steps', 100), 1)
+        dospill = setting.settingdb.get('undo_spill', True)
+
+        # measure datasets which are not in the document, counting
+        # datasets used by several operations once
+        found = {}
+        _operationDatasets(op, found)
+        indoc = set([id(ds) for ds in cvalues(doc.data)])
+        dsids = []
+        for dsid, ds in citems(found):
+            if dsid in indoc:
+                continue
+            rec = self.records.get(dsid)
+            if rec is None:
+                size = sum([
+                    _columnSize(c) for c in cvalues(_datasetColumns(ds))])
+                rec = self.records[dsid] = _DatasetRecord(ds, size)
+                self.memsize += size
+                self.inmemory[dsid] = rec
+            rec.refs += 1
+            dsids.append(dsid)
+
+        history.append(op)
+        self.entries.append(dsids)
+
+        # spill oldest data, keeping the newest operation in memory
+        newest = set(dsids)
+        while dospill and self.memsize > memlimit and self.inmemory:
+            dsid = next(iter(self.inmemory))
+            if dsid in newest:
+                break
+            rec = self.inmemory.pop(dsid)
+            rec.spillsize = self.spill(rec.ds)
+            self.memsize -= rec.size
+            self.spillsize += rec.spillsize
+
+        # remove oldest operations, always keeping the newest
+        numdrop = 0
+        while len(self.entries) > 1 and (
+                len(self.entries) > maxsteps or self.totalSize() > budget):
+            self._release(self.entries.popleft(), False)
+            numdrop += 1
+        del history[:numdrop]
+
+    def pop(self, history):
+        """Remove the newest operation from history, restoring its
+        data, and return it."""
+        op = history.pop()
+        self._release(self.entries.pop(), True)
+        # data still used by other operations
+        self.restoreOperation(op)
+        return op
@@ -148,6 +148,15 @@ def loadHDF5DatasetText(datagrp):
     data = [d.decode('utf-8') for d in datagrp['data']]
     return datasets.DatasetText(data=data)
 
+def loadHDF5DatasetTextCategorical(datagrp):
+    # categories are not saved if there are none (see loadHDF5Dataset1D
+    # for why a set is used)
+    categories = []
+    if 'categories' in set(datagrp):
+        categories = [d.decode('utf-8') for d in datagrp['categories']]
+    return datasets.DatasetTextCategorical(
+        codes=N.array(datagrp['codes']), categories=categories)
+
 def loadHDF5Datasets(thedoc, hdffile):
     """Load all the Veusz datasets in the HDF5 file."""
     alldatagrp = hdffile['Veusz']['Data']
@@ -157,6 +166,7 @@ def loadHDF5Datasets(thedoc, hdffile):
         '2d': loadHDF5Dataset2D,
         'date': loadHDF5DatasetDate,
         'text': loadHDF5DatasetText,
+        'textcat': loadHDF5DatasetTextCategorical,
     }
 
     for name in alldatagrp:
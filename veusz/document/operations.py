@@ -811,15 +811,19 @@ class OperationDataset2DBase(object):
 class OperationDataset2DCreateExpressionXYZ(OperationDataset2DBase):
     descr = _('create 2D dataset from x, y and z expressions')
 
-    def __init__(self, datasetname, xexpr, yexpr, zexpr, link):
+    def __init__(self, datasetname, xexpr, yexpr, zexpr, link,
+                 gridmode='auto', gridsize=None):
         OperationDataset2DBase.__init__(self, datasetname, link)
         self.xexpr = xexpr
         self.yexpr = yexpr
         self.zexpr = zexpr
+        self.gridmode = gridmode
+        self.gridsize = gridsize
 
     def makeDSClass(self):
         return datasets.Dataset2DXYZExpression(
-            self.xexpr, self.yexpr, self.zexpr)
+            self.xexpr, self.yexpr, self.zexpr,
+            gridmode=self.gridmode, gridsize=self.gridsize)
 
 class OperationDataset2DCreateExpression(OperationDataset2DBase):
     descr = _('create 2D dataset from expression')
@@ -992,6 +996,10 @@ class OperationDatasetSetVal(object):
     def do(self, document):
         """Set the value."""
         ds = document.data[self.datasetname]
+        if hasattr(ds, 'setValue'):
+            # avoid copying whole column
+            self.oldval = ds.setValue(self.columnname, self.row, self.val)
+            return
         datacol = getattr(ds, self.columnname)
         self.oldval = datacol[self.row]
         datacol[self.row] = self.val
@@ -1000,6 +1008,9 @@ class OperationDatasetSetVal(object):
     def undo(self, document):
         """Restore the value."""
         ds = document.data[self.datasetname]
+        if hasattr(ds, 'setValue'):
+            ds.setValue(self.columnname, self.row, self.oldval)
+            return
         datacol = getattr(ds, self.columnname)
         datacol[self.row] = self.oldval
         ds.changeValues(self.columnname, datacol)
@@ -20,28 +20,162 @@
 """
 
 from __future__ import division
+import hashlib
+import threading
+import weakref
+
+import numpy as N
+
+from ..compat import cbasestr, crange, czip
 from .. import qtall as qt4
 from .. import setting
+from .snapshot import PaintCancelled
 
 try:
     from ..helpers.recordpaint import RecordPaintDevice
+    # native recordings can be played in several threads at once
+    _threadedplay = True
 except ImportError:
     # fallback to this if we don't get the native recorded
     def RecordPaintDevice(width, height, dpix, dpiy):
         return qt4.QPicture()
+    _threadedplay = False
+
+# images with at least this many pixels are rendered in tiles in
+# parallel, if several threads are allowed
+tileminpixels = 1024*1024
+
+def useTiles(size, numthreads):
+    """Would an image of size (width, height) be rendered in tiles by
+    PaintHelper.renderToImage with numthreads threads?"""
+    return ( _threadedplay and numthreads > 1 and
+             size[0]*size[1] >= tileminpixels )
+
+# digests of arrays, by id: (weakref to array, version, digest)
+# changed holding the lock, as digests are made in several threads
+# (reentrant, as arrays may be freed when the lock is held)
+_arraydigests = {}
+_arraydigestslock = threading.RLock()
+
+def _arrayDigest(arr, version):
+    """Return digest of array contents, reusing the previous digest if
+    the array and version of its dataset are unchanged."""
+
+    key = id(arr)
+    entry = _arraydigests.get(key)
+    if entry is not None and entry[0]() is arr and entry[1] == version:
+        return entry[2]
+
+    h = hashlib.sha1()
+    h.update(('%s %s' % (arr.dtype.str, arr.shape)).encode('ascii'))
+    if arr.dtype.hasobject:
+        h.update(repr(arr.tolist()).encode('utf-8'))
+    else:
+        h.update(N.ascontiguousarray(arr).data)
+    digest = h.digest()
+
+    def remove(ref, key=key):
+        with _arraydigestslock:
+            if _arraydigests.get(key, (None,))[0] is ref:
+                del _arraydigests[key]
+    entry = (weakref.ref(arr, remove), version, digest)
+    with _arraydigestslock:
+        _arraydigests[key] = entry
+    return digest
+
+def _hashDataset(h, ds):
+    """Add values of dataset to hash h."""
+
+    h.update(type(ds).__name__.encode('ascii'))
+    version = getattr(ds, 'dataversion', 0)
+    cols = list(ds.columns or ('data',))
+    if ds.dimensions == 2:
+        cols += ['xrange', 'yrange', 'xedge', 'yedge', 'xcent', 'ycent']
+    for col in cols:
+        val = getattr(ds, col, None)
+        if isinstance(val, N.ndarray):
+            h.update(_arrayDigest(val, version))
+        else:
+            h.update(repr(val).encode('utf-8'))
+
+def _hashSettings(h, settings, doc):
+    """Add values of settings, and the data of datasets they use, to
+    hash h."""
+
+    for s in settings.getList():
+        if isinstance(s, setting.Settings):
+            _hashSettings(h, s, doc)
+            continue
+
+        h.update(repr((s.name, s.val)).encode('utf-8'))
+        if doc is not None and hasattr(s, 'getData'):
+            try:
+                data = s.getData(doc)
+            except Exception:
+                data = None
+            if not isinstance(data, list):
+                data = [data]
+            for d in data:
+                if d is None or isinstance(d, cbasestr):
+                    h.update(repr(d).encode('utf-8'))
+                else:
+                    _hashDataset(h, d)
+
+def settingsDigest(settings, doc):
+    """Return digest of the values of settings (including
+    subsettings) and the datasets they use in document doc."""
+    h = hashlib.sha1()
+    _hashSettings(h, settings, doc)
+    return h.digest()
+
+class RenderCache(object):
+    """Keep the recorded layers of widgets between paints.
+
+    A widget giving a key when painting reuses the layer recorded in
+    an earlier paint with the same key, rather than drawing again.
+    Layers not used since the previous paint are dropped by
+    finishPaint.
+    """
+
+    def __init__(self):
+        self.layers = {}
+        self.used = {}
+
+    def get(self, key):
+        """Get recorded layer with key, or None."""
+        record = self.layers.get(key)
+        if record is not None:
+            self.used[key] = record
+        return record
+
+    def set(self, key, record):
+        """Store recorded layer with key."""
+        self.used[key] = record
+
+    def finishPaint(self):
+        """Called after painting, keeping only layers used."""
+        self.layers = self.used
+        self.used = {}
+
+    def abortPaint(self):
+        """Called if painting fails, dropping layers recorded."""
+        self.used = {}
 
 class DrawState(object):
     """Each widget plotted has a recorded state in this object."""
 
-    def __init__(self, widget, bounds, clip, helper):
+    def __init__(self, widget, bounds, clip, helper, record=None):
         """Initialise state for widget.
         bounds: tuple of (x1, y1, x2, y2)
-        clip: if clipping should be done, another tuple."""
+        clip: if clipping should be done, another tuple.
+        record: previously recorded layer to reuse, if set"""
 
         self.widget = widget
-        self.record = RecordPaintDevice(
-            helper.pagesize[0], helper.pagesize[1],
-            helper.dpi[0], helper.dpi[1])
+        if record is None:
+            record = RecordPaintDevice(
+                helper.pagesize[0], helper.pagesize[1],
+                helper.dpi[0], helper.dpi[1])
+        self.record = record
         self.bounds = bounds
         self.clip = clip
 
@@ -51,6 +185,28 @@ class DrawState(object):
         # list of child widgets states
         self.children = []
 
+class _TileRenderer(qt4.QRunnable):
+    """Render part of the output of a PaintHelper to an image."""
+
+    def __init__(self, helper, img, rect, antialias):
+        """Render rect (QRect) of helper output into img, which has
+        the size of rect."""
+        qt4.QRunnable.__init__(self)
+        self.setAutoDelete(False)
+        self.helper = helper
+        self.img = img
+        self.rect = rect
+        self.antialias = antialias
+
+    def run(self):
+        painter = qt4.QPainter(self.img)
+        painter.setRenderHint(qt4.QPainter.Antialiasing, self.antialias)
+        painter.setRenderHint(
+            qt4.QPainter.TextAntialiasing, self.antialias)
+        painter.translate(-self.rect.left(), -self.rect.top())
+        self.helper.renderToPainter(painter, rect=qt4.QRectF(self.rect))
+        painter.end()
+
 class Painter(qt4.QPainter):
     def __init__(self, helper, widget, outdev):
         qt4.QPainter.__init__(self, outdev)
@@ -83,7 +239,8 @@ class PaintHelper(object):
     """
 
     def __init__(self, pagesize, scaling=1., dpi=(100, 100),
-                 directpaint=None):
+                 directpaint=None, rendercache=None, bitmap=False,
+                 antialias=True):
         """Initialise using page size (tuple of pixelw, pixelh).
 
         If directpaint is set to a painter, use this directly rather
@@ -91,6 +248,13 @@ class PaintHelper(object):
         case the painter must be a DirectPainter object, and
         save()/restore() must be placed around doing the rendering to
         the painter.
+
+        rendercache is an optional RenderCache, to reuse layers of
+        unchanged widgets from earlier paints.
+
+        If bitmap is set, the layers are only rendered to bitmaps, with
+        antialiasing if antialias is set. Markers can then be drawn
+        from images.
         """
 
         self.dpi = dpi
@@ -108,12 +272,26 @@ class PaintHelper(object):
         # whether to directly render to a painter or make new layers
         self.directpaint = directpaint
 
+        # whether layers are only rendered to bitmaps
+        self.bitmap = bitmap and directpaint is None
+        self.antialias = antialias
+
         # state for root widget
         self.rootstate = None
 
         # keep track of last widget being plotted
         self.widgetstack = []
 
+        # layers to reuse, and keys of layers to store once painted
+        self.rendercache = rendercache if directpaint is None else None
+        self.pendingkeys = {}
+
+        # if set, function returning whether painting should be cancelled
+        self.cancelcheck = None
+
+        # index of the states and where they can draw, made when needed
+        self._stateindex = None
+
     @property
     def maxsize(self):
         """Return maximum page dimension (using PaintHelper's DPI)."""
@@ -135,20 +313,20 @@ class PaintHelper(object):
         bounds: tuple (x1, y1, x2, y2) of widget bounds
         clip: a QRectF, if set
         layer: layer to plot widget, or None to get next automatically
+
+        Raises PaintCancelled if painting has been cancelled.
         """
 
-        # automatically add a layer if not given
-        if layer is None:
-            layer = 0
-            while (widget, layer) in self.states:
-                layer += 1
+        if self.cancelcheck is not None and self.cancelcheck():
+            raise PaintCancelled()
 
-        s = self.states[(widget, layer)] = DrawState(widget, bounds, clip, self)
+        layer = self._getLayer(widget, layer)
+        s = self._addState(widget, bounds, clip, layer)
 
-        if self.widgetstack:
-            self.states[(self.widgetstack[-1], 0)].children.append(s)
-        else:
-            self.rootstate = s
+        # store layer in cache if reuseLayer was called first
+        key = self.pendingkeys.pop((widget, layer), None)
+        if key is not None:
+            self.rendercache.set(key, s.record)
 
         if self.directpaint is None:
             # save to multiple recorded layers
@@ -171,6 +349,60 @@ class PaintHelper(object):
 
         return p
 
+    def _getLayer(self, widget, layer):
+        """Return layer, adding a new layer if not given."""
+        if layer is None:
+            layer = 0
+            while (widget, layer) in self.states:
+                layer += 1
+        return layer
+
+    def _addState(self, widget, bounds, clip, layer, record=None):
+        """Add a new DrawState for the widget."""
+        s = self.states[(widget, layer)] = DrawState(
+            widget, bounds, clip, self, record=record)
+        self._stateindex = None
+
+        if self.widgetstack:
+            self.states[(self.widgetstack[-1], 0)].children.append(s)
+        else:
+            self.rootstate = s
+        return s
+
+    def reuseLayer(self, widget, bounds, keyfn, clip=None, layer=None):
+        """Reuse layer recorded for the widget in an earlier paint.
+
+        keyfn is called to return a key which changes if anything
+        affecting the drawing of the widget changes, or None if the
+        layer should not be reused. The bounds, clip, page size,
+        scaling and dpi are added to the key here.
+
+        Returns True if the layer was reused. Otherwise the widget
+        should call painter() to draw the layer, which is stored for
+        later paints.
+        """
+
+        if self.rendercache is None:
+            return False
+        key = keyfn()
+        if key is None:
+            return False
+
+        layer = self._getLayer(widget, layer)
+        cliptuple = None if clip is None else tuple(clip.getCoords())
+        fullkey = (
+            widget, layer, key, tuple(bounds), cliptuple,
+            self.pagesize, self.scaling, tuple(self.dpi),
+            self.bitmap, self.antialias)
+
+        record = self.rendercache.get(fullkey)
+        if record is None:
+            self.pendingkeys[(widget, layer)] = fullkey
+            return False
+
+        self._addState(widget, bounds, clip, layer, record=record)
+        return True
+
     def setControlGraph(self, widget, cgis):
         """Records the control graph list for the widget given."""
         self.states[(widget,0)].cgis = cgis
@@ -182,47 +414,118 @@ class PaintHelper(object):
         except KeyError:
             return None
 
-    def renderToPainter(self, painter):
+    def renderToPainter(self, painter, rect=None):
         """Render saved output to painter.
+
+        If rect (a QRectF) is given, only output which could be drawn
+        inside it is rendered, skipping widgets clipped outside it.
         """
-        self._renderState(self.rootstate, painter)
+        self._renderState(self.rootstate, painter, rect)
 
-    def _renderState(self, state, painter, indent=0):
+    def _renderState(self, state, painter, rect, indent=0):
         """Render state to painter."""
 
-        painter.save()
-        state.record.play(painter)
-        painter.restore()
+        if rect is None or state.clip is None or state.clip.intersects(rect):
+            painter.save()
+            state.record.play(painter)
+            painter.restore()
 
         for child in state.children:
             #print '  '*indent, child.widget
-            self._renderState(child, painter, indent=indent+1)
+            self._renderState(child, painter, rect, indent=indent+1)
+
+    def renderToImage(self, img, antialias=True, numthreads=1):
+        """Render saved output to the QImage img.
+
+        Large images are split into horizontal tiles, which are
+        rendered in up to numthreads threads and copied into the
+        image. Only widgets which could draw in a tile are played
+        into it.
+        """
+
+        width, height = img.width(), img.height()
+        if not useTiles((width, height), numthreads):
+            painter = qt4.QPainter(img)
+            painter.setRenderHint(qt4.QPainter.Antialiasing, antialias)
+            painter.setRenderHint(qt4.QPainter.TextAntialiasing, antialias)
+            self.renderToPainter(painter)
+            painter.end()
+            return
+
+        # more tiles than threads helps share out the work
+        numtiles = min(numthreads*2, height)
+        edges = [height*i // numtiles for i in crange(numtiles+1)]
+
+        pool = qt4.QThreadPool()
+        pool.setMaxThreadCount(numthreads)
+        tiles = []
+        for y1, y2 in czip(edges[:-1], edges[1:]):
+            rect = qt4.QRect(0, y1, width, y2-y1)
+            # tiles start with the background of the image
+            tile = _TileRenderer(self, img.copy(rect), rect, antialias)
+            tiles.append(tile)
+            pool.start(tile)
+        pool.waitForDone()
+
+        painter = qt4.QPainter(img)
+        painter.setCompositionMode(qt4.QPainter.CompositionMode_Source)
+        for tile in tiles:
+            painter.drawImage(tile.rect.topLeft(), tile.img)
+        painter.end()
+
+    def _getStateIndex(self):
+        """Return list of states in the order drawn, and an array of
+        the rectangles (x1, y1, x2, y2) they can draw within.
+
+        The index is made when first needed after painting.
+        """
+
+        if self._stateindex is None:
+            states = []
+            stack = [self.rootstate] if self.rootstate is not None else []
+            while stack:
+                state = stack.pop()
+                states.append(state)
+                stack += state.children[::-1]
+
+            inf = float('inf')
+            rects = N.empty((len(states), 4))
+            for i, state in enumerate(states):
+                # states without clipping could draw anywhere
+                if state.clip is None:
+                    rects[i] = (-inf, -inf, inf, inf)
+                else:
+                    rects[i] = state.clip.getCoords()
+            self._stateindex = (states, rects)
+
+        return self._stateindex
 
     def identifyWidgetAtPoint(self, x, y, antialias=True):
         """What widget has drawn at the point x,y?
 
         Returns the widget drawn last on the point, or None if it is
         an empty part of the page.
-        root is the root widget to recurse from
         if antialias is true, do test for antialiased drawing
         """
-        
+
         # make a small image filled with a specific color
         box = 3
         specialcolor = qt4.QColor(254, 255, 254)
         origpix = qt4.QPixmap(2*box+1, 2*box+1)
         origpix.fill(specialcolor)
         origimg = origpix.toImage()
-        # store most recent widget here
-        lastwidget = [None]
-        
-        def rendernextstate(state):
-            """Recursively draw painter.
-
-            Checks whether drawing a widgetchanges the small image
-            around the point given.
-            """
 
+        # only draw states which could draw on the small image
+        states, rects = self._getStateIndex()
+        near = N.flatnonzero(
+            (rects[:,0] <= x+box+1) & (rects[:,2] >= x-box) &
+            (rects[:,1] <= y+box+1) & (rects[:,3] >= y-box) )
+
+        # check whether drawing each widget changes the small image
+        # around the point given, keeping the last to change it
+        lastwidget = None
+        for i in near:
+            state = states[i]
             pixmap = qt4.QPixmap(origpix)
             painter = qt4.QPainter(pixmap)
             painter.setRenderHint(qt4.QPainter.Antialiasing, antialias)
@@ -235,13 +538,9 @@ class PaintHelper(object):
             newimg = pixmap.toImage()
 
             if newimg != origimg:
-                lastwidget[0] = state.widget
-
-            for child in state.children:
-                rendernextstate(child)
+                lastwidget = state.widget
 
-        rendernextstate(self.rootstate)
-        return lastwidget[0]
+        return lastwidget
 
     def pointInWidgetBounds(self, x, y, widgettype):
         """Which graph widget plots at point x,y?
@@ -0,0 +1,126 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+
+"""Paint the document in a thread other than the user interface.
+
+Painting a document reads its widgets and datasets, and updates the
+state of the widgets, such as the ranges of axes. The document must
+not change while it is painted, so changes and painting are made
+holding the document's ChangeLock. Painting a DocumentSnapshot in
+another thread gives a fixed view of the document. The painting is
+cancelled when it next starts to paint a widget if another thread
+waits to change (or paint) the document.
+"""
+
+import threading
+
+class PaintCancelled(BaseException):
+    """Raised when painting a document is cancelled.
+
+    This is not an Exception, so that it is not caught by code
+    handling errors in widgets."""
+
+class ChangeLock(object):
+    """Lock held while changing or painting the document.
+
+    The lock can be acquired more than once by the same thread. Use
+    as a context manager to wait for the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._countlock = threading.Lock()
+        self._waiting = 0
+
+    def acquire(self, blocking=True, interrupt=True):
+        """Acquire lock, returning whether acquired. If blocking and
+        interrupt, painting in other threads is cancelled."""
+        if not blocking:
+            return self._lock.acquire(False)
+        if not interrupt:
+            return self._lock.acquire()
+        with self._countlock:
+            self._waiting += 1
+        try:
+            return self._lock.acquire()
+        finally:
+            with self._countlock:
+                self._waiting -= 1
+
+    def release(self):
+        """Release lock."""
+        self._lock.release()
+
+    def waiting(self):
+        """Are other threads waiting for the lock?"""
+        return self._waiting > 0
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+class DocumentSnapshot(object):
+    """A fixed view of a document, for painting in another thread.
+
+    changeset is the changeset of the document when it was last
+    painted (or when the snapshot was made).
+    """
+
+    def __init__(self, doc, background=False):
+        """Background snapshots wait for other painting to finish,
+        rather than cancelling it."""
+        self.doc = doc
+        self.changeset = doc.changeset
+        self.cancelled = False
+        self.background = background
+
+    def cancel(self):
+        """Cancel painting of snapshot."""
+        self.cancelled = True
+
+    def _checkCancel(self):
+        return self.cancelled or self.doc.changelock.waiting()
+
+    def paintTo(self, painthelper, page):
+        """Paint page of document to painthelper.
+
+        Raises PaintCancelled if cancelled. The layers recorded are
+        stored in the RenderCache of the helper, if any, only if
+        painting finishes.
+        """
+
+        lock = self.doc.changelock
+        lock.acquire(interrupt=not self.background)
+        try:
+            if self.cancelled:
+                raise PaintCancelled()
+            self.changeset = self.doc.changeset
+            painthelper.cancelcheck = self._checkCancel
+            try:
+                self.doc.paintTo(painthelper, page)
+            except BaseException:
+                if painthelper.rendercache is not None:
+                    painthelper.rendercache.abortPaint()
+                raise
+            if painthelper.rendercache is not None:
+                painthelper.rendercache.finishPaint()
+        finally:
+            painthelper.cancelcheck = None
+            lock.release()
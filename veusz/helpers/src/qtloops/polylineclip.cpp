@@ -437,23 +437,110 @@ QPolygonF RotatedRectangle::makePolygon() const
   return poly;
 }
 
+namespace
+{
+  // rectangles covering more grid cells than this are not in the grid
+  const int MAX_RECT_CELLS = 64;
+
+  // do bounding rectangles overlap (including touching)?
+  inline bool boundsOverlap(const QRectF& a, const QRectF& b)
+  {
+    return a.left() <= b.right() && b.left() <= a.right() &&
+      a.top() <= b.bottom() && b.top() <= a.bottom();
+  }
+}
+
 RectangleOverlapTester::RectangleOverlapTester()
+  : _cellsize(0)
 {
 }
 
+bool RectangleOverlapTester::cellRange(const QRectF& bounds,
+                                       int& x0, int& y0,
+                                       int& x1, int& y1) const
+{
+  const double fx0 = std::floor(bounds.left() / _cellsize);
+  const double fy0 = std::floor(bounds.top() / _cellsize);
+  const double fx1 = std::floor(bounds.right() / _cellsize);
+  const double fy1 = std::floor(bounds.bottom() / _cellsize);
+
+  // also catches non-finite and very large coordinates
+  if( ! ((fx1-fx0+1)*(fy1-fy0+1) <= MAX_RECT_CELLS) ||
+      ! (std::fabs(fx0) < 1e9 && std::fabs(fy0) < 1e9) )
+    return false;
+
+  x0 = int(fx0); y0 = int(fy0); x1 = int(fx1); y1 = int(fy1);
+  return true;
+}
+
 bool RectangleOverlapTester::willOverlap(const RotatedRectangle& rect)
 {
   const QPolygonF thispoly(rect.makePolygon());
+  const QRectF thisbounds(thispoly.boundingRect());
+
+  int x0, y0, x1, y1;
+  if( _cellsize <= 0 || ! cellRange(thisbounds, x0, y0, x1, y1) )
+    {
+      // test against all rectangles
+      for(int i = 0; i < _polys.size(); ++i)
+        {
+          if( boundsOverlap(thisbounds, _bounds[i]) &&
+              doPolygonsIntersect(thispoly, _polys[i]) )
+            return true;
+        }
+      return false;
+    }
 
-  for(int i = 0; i < _rects.size(); ++i)
+  // test rectangles in the cells covered, and large rectangles
+  QVector<int> candidates(_large);
+  for(int y = y0; y <= y1; ++y)
+    for(int x = x0; x <= x1; ++x)
+      {
+        const QHash< Cell, QVector<int> >::const_iterator it =
+          _grid.constFind(Cell(x, y));
+        if( it != _grid.constEnd() )
+          candidates += it.value();
+      }
+
+  for(int j = 0; j < candidates.size(); ++j)
     {
-      if( doPolygonsIntersect(thispoly, _rects.at(i).makePolygon()) )
+      const int i = candidates[j];
+      if( boundsOverlap(thisbounds, _bounds[i]) &&
+          doPolygonsIntersect(thispoly, _polys[i]) )
         return true;
     }
 
   return false;
 }
 
+void RectangleOverlapTester::addRect(const RotatedRectangle& rect)
+{
+  const QPolygonF poly(rect.makePolygon());
+  const QRectF bounds(poly.boundingRect());
+  const int idx = _polys.size();
+  _polys.append(poly);
+  _bounds.append(bounds);
+
+  if( _cellsize <= 0 )
+    {
+      // make cells the size of the first rectangle
+      _cellsize = std::max(bounds.width(), bounds.height());
+      if( ! (_cellsize > 0 && _cellsize < 1e100) )
+        _cellsize = 1;
+    }
+
+  int x0, y0, x1, y1;
+  if( ! cellRange(bounds, x0, y0, x1, y1) )
+    {
+      _large.append(idx);
+      return;
+    }
+
+  for(int y = y0; y <= y1; ++y)
+    for(int x = x0; x <= x1; ++x)
+      _grid[Cell(x, y)].append(idx);
+}
+
 ///////////////////////////////////////////////////////
 
 LineLabeller::LineLabeller(QRectF cliprect, bool rotatelabels)
@@ -26,6 +26,8 @@
 #include <QPolygonF>
 #include <QVector>
 #include <QSizeF>
+#include <QHash>
+#include <QPair>
 
 // clip a line made up of the points given, returning true
 // if is in region or false if not
@@ -101,15 +103,34 @@ private:
   QVector<QSizeF> _textsizes;
 };
 
+// keep track of whether rectangles overlap
+// rectangles are indexed in a uniform grid by their bounding boxes,
+// so that only nearby rectangles are tested for overlap
 class RectangleOverlapTester
 {
 public:
   RectangleOverlapTester();
   bool willOverlap(const RotatedRectangle& rect);
-  void addRect(const RotatedRectangle& rect) { _rects.append(rect); };
+  void addRect(const RotatedRectangle& rect);
 
 private:
-  QVector<RotatedRectangle> _rects;
+  typedef QPair<int,int> Cell;
+
+  // get range of grid cells covered by bounds
+  // returns false if there are too many cells
+  bool cellRange(const QRectF& bounds,
+                 int& x0, int& y0, int& x1, int& y1) const;
+
+private:
+  QVector<QPolygonF> _polys;
+  QVector<QRectF> _bounds;
+
+  // size of grid cells, set from the first rectangle
+  double _cellsize;
+  // indices of rectangles in each grid cell
+  QHash< Cell, QVector<int> > _grid;
+  // rectangles covering too many cells to be put in the grid
+  QVector<int> _large;
 };
 
 #endif
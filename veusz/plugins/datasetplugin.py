@@ -21,16 +21,18 @@
 """Plugins for creating datasets."""
 
 from __future__ import division, print_function
+import atexit
+import math
+import multiprocessing
+
 import numpy as N
 from . import field
 
-from ..compat import czip, citems, cstr
+from ..compat import czip, citems, cvalues, cstr, cbasestr
+from ..utils import sharedmem
 from .. import utils
 from .. import datasets
-try:
-    from ..helpers import qtloops
-except ImportError:
-    pass
+from .. import setting
 from .. import qtall as qt4
 
 def _(text, disambiguation=None, context='DatasetPlugin'):
@@ -205,6 +207,29 @@ class Function(object):
         self.name = name
         self.val = val
 
+def _groupKeys(data, kind, locale):
+    """Return (integer codes, list of text labels) for grouping rows by
+    values of data. kind is 'text', 'date' or 'numeric'."""
+
+    if kind == 'text':
+        # categorical values return their stored codes
+        codes, labels = datasets.encodeCategories(data)
+        return N.asarray(codes, dtype=N.int64), list(labels)
+
+    data = N.asarray(data, dtype=N.float64)
+    finite = N.isfinite(data)
+    uniq, inverse = N.unique(data[finite], return_inverse=True)
+    codes = N.full(len(data), -1, dtype=N.int64)
+    codes[finite] = inverse
+
+    if kind == 'date':
+        labels = [utils.dateFloatToString(v) for v in uniq]
+    else:
+        # keys are often identifiers, so avoid scientific notation
+        point = locale.decimalPoint()
+        labels = [('%.15g' % v).replace('.', point) for v in uniq]
+    return codes, labels
+
 # class to pass to plugin to give parameters
 class DatasetPluginHelper(object):
     """Helpers to get existing datasets for plugins."""
@@ -307,6 +332,248 @@ class DatasetPluginHelper(object):
             return DatasetText(name, ds.data)
         raise DatasetPluginException(_("Dataset '%s' is not a text datset") % name)
 
+    def getGroupKeys(self, name):
+        """Return keys for grouping rows by the values of a 1D numeric
+        or text dataset, as (integer codes, list of text labels).
+
+        Numeric values are labelled in increasing order. Rows with
+        non-finite numeric values have a code of -1.
+
+        name not found: raise a DatasetPluginException
+        """
+
+        try:
+            ds = self._doc.data[name]
+        except KeyError:
+            raise DatasetPluginException(_("Unknown dataset '%s'") % name)
+        if ds.dimensions != 1:
+            raise DatasetPluginException(
+                _("Dataset '%s' does not have %i dimensions") % (name, 1))
+
+        if ds.datatype == 'text':
+            kind = 'text'
+        elif isinstance(ds, datasets.DatasetDateTimeBase):
+            kind = 'date'
+        else:
+            kind = 'numeric'
+        return _groupKeys(ds.data, kind, self.locale)
+
+class _SnapshotHelper(DatasetPluginHelper):
+    """Helper for plugins run in another process, which uses copies of
+    the datasets named in the fields of the plugin."""
+
+    def __init__(self, dsvals, localename):
+        """dsvals is a dict of names to plugin datasets."""
+        self._datasets = dsvals
+        self._locale = qt4.QLocale(localename)
+
+    def _names(self, kls):
+        return [name for name, ds in citems(self._datasets)
+                if isinstance(ds, kls)]
+
+    @property
+    def datasets1d(self):
+        return self._names((Dataset1D, DatasetDateTime))
+
+    @property
+    def datasets2d(self):
+        return self._names(Dataset2D)
+
+    @property
+    def datasetstext(self):
+        return self._names(DatasetText)
+
+    @property
+    def datasetsdatetime(self):
+        return self._names(DatasetDateTime)
+
+    @property
+    def locale(self):
+        return self._locale
+
+    def evaluateExpression(self, expr, part='data'):
+        raise DatasetPluginException(
+            _('Expressions cannot be evaluated by plugins run in a '
+              'separate process'))
+
+    def _get(self, name):
+        try:
+            return self._datasets[name]
+        except KeyError:
+            raise DatasetPluginException(_("Unknown dataset '%s'") % name)
+
+    def getDataset(self, name, dimensions=1):
+        ds = self._get(name)
+        if isinstance(ds, DatasetText):
+            raise DatasetPluginException(
+                _("Dataset '%s' is not a numerical dataset") % name)
+        if (2 if isinstance(ds, Dataset2D) else 1) != dimensions:
+            raise DatasetPluginException(
+                _("Dataset '%s' does not have %i dimensions") % (
+                    name, dimensions))
+        return ds
+
+    def getTextDataset(self, name):
+        ds = self._get(name)
+        if isinstance(ds, DatasetText):
+            return ds
+        raise DatasetPluginException(_("Dataset '%s' is not a text datset") % name)
+
+    def getGroupKeys(self, name):
+        ds = self._get(name)
+        if isinstance(ds, Dataset2D):
+            raise DatasetPluginException(
+                _("Dataset '%s' does not have %i dimensions") % (name, 1))
+        elif isinstance(ds, DatasetText):
+            kind = 'text'
+        elif isinstance(ds, DatasetDateTime):
+            kind = 'date'
+        else:
+            kind = 'numeric'
+        return _groupKeys(ds.data, kind, self.locale)
+
+def _snapshotDatasets(doc, fields, exclude):
+    """Return dict of names to plugin datasets, for document datasets
+    named in fields, except those in exclude."""
+
+    names = set()
+    for val in cvalues(fields):
+        vals = val if isinstance(val, (list, tuple)) else [val]
+        for v in vals:
+            if isinstance(v, cbasestr) and v in doc.data and v not in exclude:
+                names.add(v)
+
+    helper = DatasetPluginHelper(doc)
+    out = {}
+    for name in names:
+        ds = doc.data[name]
+        if ds.datatype == 'text':
+            out[name] = textds = DatasetText(name)
+            if isinstance(ds.data, datasets.CategoricalValues):
+                # keep categorical values, so their codes can be used
+                textds.data = datasets.CategoricalValues(
+                    N.array(ds.data.codes), list(ds.data.categories))
+            else:
+                textds.data = list(ds.data)
+        elif ds.datatype == 'numeric' and ds.dimensions in (1, 2):
+            out[name] = helper.getDataset(name, dimensions=ds.dimensions)
+    return out
+
+def _sameValue(a, b):
+    """Are the two values the same?"""
+    if a is b:
+        return True
+    if isinstance(a, datasets.CategoricalValues):
+        return ( isinstance(b, datasets.CategoricalValues) and
+                 a.categories == b.categories and
+                 N.array_equal(a.codes, b.codes) )
+    if isinstance(a, N.ndarray) or isinstance(b, N.ndarray):
+        return ( isinstance(a, N.ndarray) and isinstance(b, N.ndarray) and
+                 a.dtype == b.dtype and N.array_equal(a, b, equal_nan=True) )
+    try:
+        return bool(a == b)
+    except ValueError:
+        return False
+
+def _sameDatasets(dsvals1, dsvals2):
+    """Are the two dicts of plugin datasets the same?"""
+    if set(dsvals1) != set(dsvals2):
+        return False
+    for name, ds1 in citems(dsvals1):
+        ds2 = dsvals2[name]
+        if type(ds1) is not type(ds2) or set(vars(ds1)) != set(vars(ds2)):
+            return False
+        for attr, val in citems(vars(ds1)):
+            if not _sameValue(val, vars(ds2)[attr]):
+                return False
+    return True
+
+def _packDatasets(dslist, blocks):
+    """Pack list of plugin datasets to send to another process."""
+    return [ (type(ds), dict([ (attr, sharedmem.packArray(val, blocks))
+                               for attr, val in citems(vars(ds)) ]))
+             for ds in dslist ]
+
+def _unpackDatasets(packed, blocks):
+    """Unpack list of plugin datasets packed by _packDatasets."""
+    out = []
+    for kls, attrs in packed:
+        ds = kls.__new__(kls)
+        for attr, desc in citems(attrs):
+            setattr(ds, attr, sharedmem.unpackArray(desc, blocks))
+        out.append(ds)
+    return out
+
+def _runInProcess(pluginkls, fields, packed, localename):
+    """Run plugin in a worker process, returning packed outputs."""
+
+    inblocks = []
+    outblocks = []
+    try:
+        inputs = _unpackDatasets(packed, inblocks)
+        helper = _SnapshotHelper(
+            dict([(ds.name, ds) for ds in inputs]), localename)
+        plugin = pluginkls()
+        outputs = plugin.getDatasets(fields)
+        plugin.updateDatasets(fields, helper)
+        result = _packDatasets(outputs, outblocks)
+    except Exception:
+        sharedmem.closeBlocks(outblocks, unlink=True)
+        raise
+    finally:
+        inputs = helper = plugin = outputs = None
+        sharedmem.closeBlocks(inblocks)
+
+    # the receiver removes the output blocks
+    sharedmem.closeBlocks(outblocks)
+    return result
+
+class _ProcessPool(qt4.QObject):
+    """Pool of processes for running plugins. Results are passed back
+    to callbacks in the main thread."""
+
+    sigFinished = qt4.pyqtSignal(object, bool, object)
+
+    def __init__(self, numprocesses):
+        qt4.QObject.__init__(self)
+        sharedmem.ensureTracker()
+        self.pool = multiprocessing.Pool(numprocesses)
+
+        # jobs may be submitted when painting in other threads, but
+        # the results are received by the event loop of the main thread
+        app = qt4.QCoreApplication.instance()
+        if app is not None:
+            self.moveToThread(app.thread())
+        self.sigFinished.connect(
+            self.slotFinished, qt4.Qt.QueuedConnection)
+        atexit.register(self.close)
+
+    def close(self):
+        """Stop worker processes."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def submit(self, func, args, callback):
+        """Run func(*args) in a process, then call callback(ok, result)."""
+        self.pool.apply_async(
+            func, args,
+            callback=lambda res: self.sigFinished.emit(callback, True, res),
+            error_callback=lambda e: self.sigFinished.emit(callback, False, e))
+
+    def slotFinished(self, callback, ok, result):
+        callback(ok, result)
+
+_processpool = None
+def _getProcessPool():
+    """Return pool for running plugins, creating it if necessary."""
+    global _processpool
+    if _processpool is None:
+        _processpool = _ProcessPool(
+            setting.settingdb.get('plugin_processes', 2))
+    return _processpool
+
 # internal object to synchronise datasets created by a plugin
 class DatasetPluginManager(object):
     """Manage datasets generated by plugin."""
@@ -325,6 +592,13 @@ class DatasetPluginManager(object):
         self.fields = dict(fields)
         self.changeset = -1
 
+        # for running plugin in a separate process
+        self.jobid = 0
+        self.jobinputs = None
+        self.jobrunning = False
+        self.jobpending = False
+        self.processfailed = False
+
         self.fixMissingFields()
         self.setupDatasets()
 
@@ -381,21 +655,121 @@ class DatasetPluginManager(object):
         when updating the dataset
         """
 
-        if self.document.changeset == self.changeset:
+        # the document may be painted in another thread
+        with self.document.changelock:
+            if self.document.changeset == self.changeset:
+                return
+            self.changeset = self.document.changeset
+
+            if not raiseerrors and self.useProcess():
+                self.submitJob()
+                return
+
+            # run the plugin with its parameters
+            try:
+                self.plugin.updateDatasets(self.fields, self.helper)
+            except DatasetPluginException as ex:
+                # this is for immediate notification
+                if raiseerrors:
+                    raise
+
+                # otherwise if there's an error, then log and null outputs
+                self.document.log( cstr(ex) )
+                self.nullDatasets()
+
+    def useProcess(self):
+        """Should the plugin be run in a separate process?
+
+        This needs the event loop of the main thread to receive the
+        results. Documents painted in other threads are painted for
+        the user interface, so the loop is running."""
+        if not ( self.plugin.run_in_process and not self.processfailed and
+                 setting.settingdb.get('plugin_processes', 2) > 0 ):
+            return False
+        app = qt4.QCoreApplication.instance()
+        thread = qt4.QThread.currentThread()
+        return app is not None and (
+            thread is not app.thread() or thread.loopLevel() > 0 )
+
+    def submitJob(self):
+        """Start running plugin in a separate process, if its input
+        datasets have changed. The existing output is kept until the
+        new output is ready."""
+
+        if self.jobrunning:
+            # wait for current job to finish before starting another
+            self.jobpending = True
             return
-        self.changeset = self.document.changeset
 
-        # run the plugin with its parameters
-        try:
-            self.plugin.updateDatasets(self.fields, self.helper)
-        except DatasetPluginException as ex:
-            # this is for immediate notification
-            if raiseerrors:
-                raise
-
-            # otherwise if there's an error, then log and null outputs
-            self.document.log( cstr(ex) )
+        inputs = _snapshotDatasets(
+            self.document, self.fields, self.datasetnames)
+        if self.jobinputs is not None and _sameDatasets(
+                inputs, self.jobinputs):
+            return
+        self.jobinputs = inputs
+
+        self.jobid += 1
+        self.jobrunning = True
+        jobid = self.jobid
+        blocks = []
+
+        def finished(ok, result):
+            sharedmem.closeBlocks(blocks, unlink=True)
+            self.jobFinished(jobid, ok, result)
+
+        _getProcessPool().submit(
+            _runInProcess,
+            (self.plugin.__class__, self.fields,
+             _packDatasets(list(cvalues(inputs)), blocks),
+             self.document.locale.name()),
+            finished)
+
+    def jobFinished(self, jobid, ok, result):
+        """Take output of plugin run in process, and redraw."""
+
+        # jobs are also submitted when the document is painted in
+        # another thread
+        with self.document.changelock:
+            self._jobFinished(jobid, ok, result)
+
+    def _jobFinished(self, jobid, ok, result):
+        self.jobrunning = False
+        if ok:
+            outblocks = []
+            try:
+                outputs = _unpackDatasets(result, outblocks)
+                if jobid == self.jobid:
+                    for ds, newds in czip(self.datasets, outputs):
+                        for attr, val in citems(vars(newds)):
+                            if isinstance(val, N.ndarray):
+                                val = N.array(val)
+                            setattr(ds, attr, val)
+            finally:
+                outputs = None
+                sharedmem.closeBlocks(outblocks, unlink=True)
+        elif isinstance(result, DatasetPluginException):
+            self.document.log( cstr(result) )
             self.nullDatasets()
+        else:
+            # could not run in process (e.g. plugin could not be
+            # pickled), so run here in future
+            self.document.log(
+                _('Could not run plugin %s in separate process: %s') % (
+                    self.plugin.name, cstr(result)) )
+            self.processfailed = True
+            self.jobinputs = None
+            self.changeset = -1
+            self.update()
+
+        if self.jobpending:
+            self.jobpending = False
+            self.submitJob()
+
+        # redraw without marking document as modified by user
+        for ds in self.veuszdatasets:
+            ds.dataversion += 1
+        self.document.setModified(self.document.modified)
+        self.changeset = self.document.changeset
 
 class DatasetPlugin(object):
     """Base class for defining dataset plugins."""
@@ -412,6 +786,12 @@ class DatasetPlugin(object):
     # if the plugin takes no parameters, set this to False
     has_parameters = True
 
+    # set this to True to run slow plugins in a separate process when
+    # using the user interface. The previous output is shown until the
+    # new output is ready. Only datasets named in the fields can be
+    # used by the plugin, and expressions cannot be evaluated.
+    run_in_process = False
+
     def __init__(self):
         """Override this to declare a list of input fields if required."""
         self.fields = []
@@ -475,19 +855,22 @@ def combineAddedErrors(inds, length):
         nerr = N.zeros(length, dtype=N.float64)
 
     for d in inds:
-        f = N.isfinite(d.data)
+        f = N.isfinite(d.data[:length])
+        n = len(f)
+
+        def add(out, err):
+            out[:n] += N.where(f, err[:n]**2, 0.)
 
         if errortype == 'symmetric' and d.serr is not None:
-            serr[f] += d.serr[f]**2
+            add(serr, d.serr)
         elif errortype == 'asymmetric':
             if d.serr is not None:
-                v = (d.serr[f])**2
-                perr[f] += v
-                nerr[f] += v
+                add(perr, d.serr)
+                add(nerr, d.serr)
             if d.perr is not None:
-                perr[f] += (d.perr[f])**2
+                add(perr, d.perr)
             if d.nerr is not None:
-                nerr[f] += (d.nerr[f])**2
+                add(nerr, d.nerr)
 
     if serr is not None: serr = N.sqrt(serr)
     if perr is not None: perr = N.sqrt(perr)
@@ -507,27 +890,92 @@ def combineMultipliedErrors(inds, length, data):
         nerr = N.zeros(length, dtype=N.float64)
 
     for d in inds:
-        f = N.isfinite(d.data)
-        if len(f) > length:
-            f = f[:length]
+        vals = d.data[:length]
+        f = N.isfinite(vals)
+        n = len(f)
+
+        def add(out, err):
+            with N.errstate(invalid='ignore', divide='ignore'):
+                out[:n] += N.where(f, (err[:n]/vals)**2, 0.)
 
         if errortype == 'symmetric' and d.serr is not None:
-            serr[f] += (d.serr[f]/d.data[f])**2
+            add(serr, d.serr)
         elif errortype == 'asymmetric':
             if d.serr is not None:
-                v = (d.serr[f]/d.data[f])**2
-                perr[f] += v
-                nerr[f] += v
+                add(perr, d.serr)
+                add(nerr, d.serr)
             if d.perr is not None:
-                perr[f] += (d.perr[f]/d.data[f])**2
+                add(perr, d.perr)
             if d.nerr is not None:
-                nerr[f] += (d.nerr[f]/d.data[f])**2
+                add(nerr, d.nerr)
 
-    if serr is not None: serr = N.abs(N.sqrt(serr) * data)
-    if perr is not None: perr = N.abs(N.sqrt(perr) * data)
-    if nerr is not None: nerr = -N.abs(N.sqrt(nerr) * data)
+    with N.errstate(invalid='ignore'):
+        if serr is not None: serr = N.abs(N.sqrt(serr) * data)
+        if perr is not None: perr = N.abs(N.sqrt(perr) * data)
+        if nerr is not None: nerr = -N.abs(N.sqrt(nerr) * data)
     return serr, perr, nerr
 
+def binData(data, binsize, average):
+    """Sum (or average if average is set) the finite values in each
+    set of binsize values of data. Bins with no finite values are NaN."""
+
+    if len(data) == 0:
+        return N.array([], dtype=N.float64)
+    finite = N.isfinite(data)
+    starts = N.arange(0, len(data), binsize)
+    sums = N.add.reduceat(N.where(finite, data, 0.), starts)
+    counts = N.add.reduceat(finite.astype(N.int64), starts)
+    with N.errstate(invalid='ignore', divide='ignore'):
+        out = sums / counts if average else sums
+    out[counts == 0] = N.nan
+    return out
+
+def _windowSums(vals, width):
+    """Sum vals within width values either side of each value.
+
+    The values are split into blocks of the window size, so that each
+    window is a suffix of one block plus a prefix of the next. Unlike
+    differences of cumulative sums, each sum only includes values in
+    its window, so large values elsewhere do not lose precision."""
+
+    size = len(vals)
+    win = 2*width+1
+    nblocks = (size+win-1) // win + 1
+    padded = N.zeros(nblocks*win)
+    padded[width:width+size] = vals
+    blocks = padded.reshape((nblocks, win))
+    prefix = N.cumsum(blocks, axis=1).ravel()
+    suffix = N.cumsum(blocks[:,::-1], axis=1)[:,::-1].ravel()
+
+    sums = suffix[:size] + prefix[win-1:win-1+size]
+    # windows aligned with a block lie within it
+    sums[::win] = suffix[:size:win]
+    return sums
+
+def rollingAverage(data, weights, width):
+    """Average finite values of data within width values either side
+    of each value, optionally weighted by weights.
+
+    Values with no finite values to average are NaN."""
+
+    size = len(data) if weights is None else min(len(data), len(weights))
+    data = data[:size]
+    valid = N.isfinite(data)
+    if weights is None:
+        w = valid.astype(N.float64)
+    else:
+        w = N.asarray(weights[:size], dtype=N.float64)
+        w = N.where(valid & N.isfinite(w), w, 0.)
+
+    with N.errstate(invalid='ignore'):
+        wd = N.where(w != 0, w*data, 0.)
+    sumw = _windowSums(w, width)
+    sumwd = _windowSums(wd, width)
+    with N.errstate(invalid='ignore', divide='ignore'):
+        out = sumwd / sumw
+    out[sumw == 0] = N.nan
+    return out
+
 ###########################################################################
 ## Real plugins are below
 
@@ -664,21 +1112,24 @@ class InterleaveDatasetPlugin(_OneOutputDatasetPlugin):
         if len(dsin) == 0:
             raise DatasetPluginException(_('Requires one or more input datasets'))
 
-        maxlength = max( [len(d.data) for d in dsin] )
+        lengths = [len(d.data) for d in dsin]
+        maxlength = max(lengths)
+
+        # which elements are valid, if datasets have different lengths
+        good = None
+        if min(lengths) != maxlength:
+            good = N.zeros((maxlength, len(dsin)), dtype=N.bool_)
+            for i, length in enumerate(lengths):
+                good[:length, i] = True
+            good = good.ravel()
 
         def interleave(datasets):
-            """This is complex to account for different length datasets."""
-            # stick in columns
-            ds = [ N.hstack( (d, N.zeros(maxlength-len(d))) )
-                   for d in datasets ]
-            # which elements are valid
-            good = [ N.hstack( (N.ones(len(d), dtype=N.bool),
-                                N.zeros(maxlength-len(d), dtype=N.bool)) )
-                     for d in datasets ]
-
-            intl = N.column_stack(ds).reshape(maxlength*len(datasets))
-            goodintl = N.column_stack(good).reshape(maxlength*len(datasets))
-            return intl[goodintl]
+            """Put datasets into columns, then read out rows."""
+            intl = N.zeros((maxlength, len(datasets)))
+            for i, d in enumerate(datasets):
+                intl[:len(d), i] = d
+            intl = intl.ravel()
+            return intl if good is None else intl[good]
 
         # do interleaving
         data = interleave([d.data for d in dsin])
@@ -1071,11 +1522,12 @@ class MultiplyDatasetsPlugin(_OneOutputDatasetPlugin):
 
         # output data and where data is finite
         data = N.ones(maxlength, dtype=N.float64)
-        anyfinite = N.zeros(maxlength, dtype=N.bool)
+        anyfinite = N.zeros(maxlength, dtype=N.bool_)
         for d in inds:
+            n = len(d.data)
             f = N.isfinite(d.data)
-            anyfinite[f] = True
-            data[f] *= d.data[f]
+            anyfinite[:n] |= f
+            data[:n] *= N.where(f, d.data, 1.)
 
         # where always NaN, make NaN
         data[N.logical_not(anyfinite)] = N.nan
@@ -1239,12 +1691,17 @@ class ExtremesDatasetPlugin(DatasetPlugin):
         inds = [ helper.getDataset(d) for d in names ]
         maxlength = max( [d.data.shape[0] for d in inds] )
 
-        minvals = N.zeros(maxlength, dtype=N.float64) + 1e100
-        maxvals = N.zeros(maxlength, dtype=N.float64) - 1e100
-        anyfinite = N.zeros(maxlength, dtype=N.bool)
+        minvals = N.full(maxlength, N.inf)
+        maxvals = N.full(maxlength, -N.inf)
+        anyfinite = N.zeros(maxlength, dtype=N.bool_)
+        tot = N.zeros(maxlength, dtype=N.float64)
+        num = N.zeros(maxlength, dtype=N.int64)
         for d in inds:
+            n = len(d.data)
             f = N.isfinite(d.data)
-            anyfinite[f] = True
+            anyfinite[:n] |= f
+            tot[:n] += N.where(f, d.data, 0.)
+            num[:n] += f
 
             v = d.data
             if fields['errorbars']:
@@ -1252,7 +1709,7 @@ class ExtremesDatasetPlugin(DatasetPlugin):
                     v = v - d.serr
                 elif d.nerr is not None:
                     v = v + d.nerr
-            minvals[f] = N.min( (minvals[f], v[f]), axis=0 )
+            N.minimum(minvals[:n], N.where(f, v, N.inf), out=minvals[:n])
 
             v = d.data
             if fields['errorbars']:
@@ -1260,7 +1717,7 @@ class ExtremesDatasetPlugin(DatasetPlugin):
                     v = v + d.serr
                 elif d.perr is not None:
                     v = v + d.perr
-            maxvals[f] = N.max( (maxvals[f], v[f]), axis=0 )
+            N.maximum(maxvals[:n], N.where(f, v, -N.inf), out=maxvals[:n])
 
         minvals[N.logical_not(anyfinite)] = N.nan
         maxvals[N.logical_not(anyfinite)] = N.nan
@@ -1271,13 +1728,8 @@ class ExtremesDatasetPlugin(DatasetPlugin):
             self.dsmax.update(data=maxvals)
         if self.dserror is not None:
             # compute mean and look at differences from it
-            tot = N.zeros(maxlength, dtype=N.float64)
-            num = N.zeros(maxlength, dtype=N.int)
-            for d in inds:
-                f = N.isfinite(d.data)
-                tot[f] += d.data[f]
-                num[f] += 1
-            mean = tot / num
+            with N.errstate(invalid='ignore', divide='ignore'):
+                mean = tot / num
             self.dserror.update(data=mean, nerr=minvals-mean, perr=maxvals-mean)
 
 class CumulativePlugin(_OneOutputDatasetPlugin):
@@ -1495,7 +1947,7 @@ class MovingAveragePlugin(_OneOutputDatasetPlugin):
             elif ds_in.perr is not None and ds_in.nerr is not None:
                 weights = 1. / ( (ds_in.perr**2+ds_in.nerr**2)/2. )
         width = fields['width']
-        data = qtloops.rollingAverage(ds_in.data, weights, width)
+        data = rollingAverage(ds_in.data, weights, width)
         self.dsout.update(data=data)
 
 class LinearInterpolatePlugin(_OneOutputDatasetPlugin):
@@ -1584,13 +2036,13 @@ class ReBinXYPlugin(DatasetPlugin):
             """Compute binned error."""
             if err is None:
                 return None
-            err2 = qtloops.binData(err**2, binsize, False)
-            cts = qtloops.binData(N.ones(err.shape), binsize, False)
+            err2 = binData(err**2, binsize, False)
+            cts = N.minimum(binsize, len(err) - N.arange(0, len(err), binsize))
             return N.sqrt(err2) / cts
 
         # bin up data and calculate errors (if any)
         dsy = helper.getDataset(fields['ds_y'])
-        binydata = qtloops.binData(dsy.data, binsize, average)
+        binydata = binData(dsy.data, binsize, average)
         binyserr = binerr(dsy.serr)
         binyperr = binerr(dsy.perr)
         binynerr = binerr(dsy.nerr)
@@ -1800,10 +2252,21 @@ class Histogram2D(DatasetPlugin):
         maxx = fields['maxx']
         if maxx == 'Auto': maxx = N.nanmax(dsx)
 
-        # compute counts in each bin
-        histo, xedge, yedge = N.histogram2d(
-            dsy, dsx, bins=[fields['binsy'], fields['binsx']],
-            range=[[miny,maxy], [minx,maxx]], normed=False)
+        # compute counts in each bin, as numpy.histogram2d would
+        binsx, binsy = fields['binsx'], fields['binsy']
+        if minx == maxx:
+            minx, maxx = minx-0.5, maxx+0.5
+        if miny == maxy:
+            miny, maxy = miny-0.5, maxy+0.5
+        length = min(len(dsx), len(dsy))
+        ix = datasets.uniformBinIndices(
+            dsx[:length], N.linspace(minx, maxx, binsx+1))
+        iy = datasets.uniformBinIndices(
+            dsy[:length], N.linspace(miny, maxy, binsy+1))
+        sel = (ix >= 0) & (iy >= 0)
+        histo = N.bincount(
+            iy[sel]*binsx + ix[sel], minlength=binsx*binsy).reshape(
+                binsy, binsx).astype(N.float64)
 
         m = fields['mode']
         if m == 'Count':
@@ -2010,6 +2473,429 @@ class ExpPlugin(_OneOutputDatasetPlugin):
 
         self.dsout.update(data=expdata, perr=expperr, nerr=expnerr)
 
+###########################################################################
+## Group-by plugins
+
+def _normalQuantile(prob):
+    """Return x where the standard normal cumulative distribution is prob."""
+    lo, hi = -40., 40.
+    for i in range(100):
+        mid = 0.5*(lo+hi)
+        if 0.5*math.erfc(-mid/math.sqrt(2.)) < prob:
+            lo = mid
+        else:
+            hi = mid
+    return 0.5*(lo+hi)
+
+class _Groups(object):
+    """Rows of datasets divided into groups with the same key values.
+
+    Groups are found by sorting combined integer key codes once, and
+    statistics are computed for all groups with numpy array operations.
+
+    index: group of each row, or -1 if a key of the row is invalid
+    num: number of groups
+    labels: text label for each group
+    """
+
+    def __init__(self, keys):
+        """keys is a list of (codes, labels), as returned by
+        DatasetPluginHelper.getGroupKeys."""
+
+        length = min([len(codes) for codes, labels in keys])
+        combined = N.zeros(length, dtype=N.int64)
+        valid = N.ones(length, dtype=N.bool_)
+        radix = 1
+        for codes, labels in keys:
+            codes = codes[:length]
+            valid &= codes >= 0
+            nlabels = max(len(labels), 1)
+            if radix*nlabels >= 2**62:
+                # renumber the combinations so far to avoid overflow
+                uniq, combined = N.unique(combined, return_inverse=True)
+                combined = combined.astype(N.int64)
+                radix = len(uniq)
+            combined = combined*nlabels + N.maximum(codes, 0)
+            radix *= nlabels
+
+        rows = N.nonzero(valid)[0]
+        self.index = N.full(length, -1, dtype=N.int64)
+        if radix <= max(length, 2**20):
+            # renumber combinations which are present, without sorting
+            present = N.bincount(combined[rows], minlength=radix) > 0
+            codemap = N.cumsum(present) - 1
+            self.num = int(present.sum())
+            self.index[rows] = codemap[combined[rows]]
+        else:
+            uniq, inverse = N.unique(combined[rows], return_inverse=True)
+            self.num = len(uniq)
+            self.index[rows] = inverse.ravel()
+
+        # label groups using key values of any row in each group
+        reprows = N.zeros(self.num, dtype=N.int64)
+        reprows[self.index[rows]] = rows
+        parts = [[labels[c] for c in codes[reprows]]
+                 for codes, labels in keys]
+        self.labels = [', '.join(p) for p in czip(*parts)]
+
+    def count(self):
+        """Return number of rows in each group."""
+        return N.bincount(self.index[self.index >= 0], minlength=self.num)
+
+    def select(self, vals):
+        """Return (group index, values) for rows with valid keys and
+        finite values."""
+        vals = N.asarray(vals, dtype=N.float64)
+        length = min(len(vals), len(self.index))
+        idx, vals = self.index[:length], vals[:length]
+        ok = (idx >= 0) & N.isfinite(vals)
+        return idx[ok], vals[ok]
+
+    def meanStd(self, vals):
+        """Return (number, mean, standard deviation) of finite values in
+        each group."""
+        idx, vals = self.select(vals)
+        num = N.bincount(idx, minlength=self.num)
+        with N.errstate(invalid='ignore', divide='ignore'):
+            mean = N.bincount(idx, weights=vals, minlength=self.num) / num
+            sqdev = N.bincount(
+                idx, weights=(vals-mean[idx])**2, minlength=self.num)
+            std = N.sqrt(sqdev / (num-1))
+        return num, mean, std
+
+    def sortValues(self, vals):
+        """Sort finite values by group, then by value.
+
+        Returns (sorted values, first index of each group, number in
+        each group)."""
+        idx, vals = self.select(vals)
+        num = N.bincount(idx, minlength=self.num)
+        starts = N.cumsum(num) - num
+
+        # sort by value, then sort combined group and rank (faster
+        # than a lexsort)
+        if self.num > 1:
+            order = N.argsort(vals)
+            key = idx[order]*len(vals) + N.arange(len(vals))
+            key.sort()
+            vals = vals[order][key % len(vals)]
+        else:
+            vals = N.sort(vals)
+        return vals, starts, num
+
+    @staticmethod
+    def quantile(svals, starts, num, frac):
+        """Return quantile frac (0 to 1) of each group from values
+        sorted by sortValues, interpolating linearly like
+        numpy.percentile."""
+        out = N.full(len(num), N.nan)
+        have = num > 0
+        pos = starts[have] + frac*(num[have]-1)
+        lo = N.floor(pos).astype(N.int64)
+        hi = N.minimum(lo+1, starts[have]+num[have]-1)
+        out[have] = svals[lo] + (svals[hi]-svals[lo])*(pos-lo)
+        return out
+
+class _GroupByPlugin(DatasetPlugin):
+    """Base for plugins computing statistics of rows with the same
+    values of one or more key datasets.
+
+    Subclasses should define getOutputs and updateGroups."""
+
+    def getDatasets(self, fields):
+        """Returns output datasets and optional label dataset."""
+        dsout = self.getOutputs(fields)
+        if not dsout:
+            raise DatasetPluginException(
+                _('Provide at least one output dataset'))
+        self.dslabels = None
+        if fields['ds_labels'] != '':
+            self.dslabels = DatasetText(fields['ds_labels'])
+            dsout.append(self.dslabels)
+        return dsout
+
+    def getOutputs(self, fields):
+        """Return list of numeric output datasets."""
+        return []
+
+    def updateDatasets(self, fields, helper):
+        """Divide rows into groups and compute statistics."""
+        names = [n.strip() for n in fields['ds_keys'] if n.strip() != '']
+        if len(names) == 0:
+            raise DatasetPluginException(
+                _('Requires at least one key dataset'))
+
+        groups = _Groups([helper.getGroupKeys(n) for n in names])
+        if self.dslabels is not None:
+            self.dslabels.update(data=groups.labels)
+        self.updateGroups(fields, helper, groups)
+
+    def updateGroups(self, fields, helper, groups):
+        """Override this to update outputs given _Groups object."""
+
+class _OneOutputGroupByPlugin(_GroupByPlugin):
+    """Group-by plugin with single output with field ds_out."""
+
+    def getOutputs(self, fields):
+        if fields['ds_out'] == '':
+            raise DatasetPluginException(_('Invalid output dataset name'))
+        self.dsout = Dataset1D(fields['ds_out'])
+        return [self.dsout]
+
+class GroupCountPlugin(_OneOutputGroupByPlugin):
+    """Count number of rows in each group."""
+
+    menu = (_('Group by'), _('Count'),)
+    name = 'Group count'
+    description_short = _('Count rows with the same key values')
+    description_full = _('Count the number of rows with the same values '
+                         'of one or more key datasets (e.g. lot, wafer or '
+                         'condition). Key datasets can be numeric or text.')
+
+    def __init__(self):
+        """Define fields."""
+        self.fields = [
+            field.FieldDatasetMulti('ds_keys', _('Key datasets'),
+                                    datatype='all'),
+            field.FieldDataset('ds_out', _('Output dataset')),
+            field.FieldDataset('ds_labels', _('Output group labels '
+                                              '(optional)'), datatype='text'),
+            ]
+
+    def updateGroups(self, fields, helper, groups):
+        """Count rows."""
+        self.dsout.update(data=groups.count())
+
+class GroupMeanPlugin(_OneOutputGroupByPlugin):
+    """Compute mean of each group."""
+
+    menu = (_('Group by'), _('Mean'),)
+    name = 'Group mean'
+    description_short = _('Compute mean of rows with the same key values')
+    description_full = _('Compute the mean of the finite values of a '
+                         'dataset, for rows with the same values of one or '
+                         'more key datasets. Optionally the standard '
+                         'deviation or standard error of the mean are '
+                         'given as error bars.')
+
+    def __init__(self):
+        """Define fields."""
+        self.fields = [
+            field.FieldDatasetMulti('ds_keys', _('Key datasets'),
+                                    datatype='all'),
+            field.FieldDataset('ds_in', _('Input dataset')),
+            field.FieldCombo('errorbars', _('Error bars'),
+                             items=('none', 'standard deviation',
+                                    'standard error'),
+                             default='none', editable=False),
+            field.FieldDataset('ds_out', _('Output dataset')),
+            field.FieldDataset('ds_labels', _('Output group labels '
+                                              '(optional)'), datatype='text'),
+            ]
+
+    def updateGroups(self, fields, helper, groups):
+        """Compute means."""
+        ds_in = helper.getDataset(fields['ds_in'])
+        num, mean, std = groups.meanStd(ds_in.data)
+
+        serr = None
+        if fields['errorbars'] == 'standard deviation':
+            serr = std
+        elif fields['errorbars'] == 'standard error':
+            serr = std / N.sqrt(num)
+        self.dsout.update(data=mean, serr=serr)
+
+class GroupMedianPlugin(_OneOutputGroupByPlugin):
+    """Compute median of each group."""
+
+    menu = (_('Group by'), _('Median'),)
+    name = 'Group median'
+    description_short = _('Compute median of rows with the same key values')
+    description_full = _('Compute the median of the finite values of a '
+                         'dataset, for rows with the same values of one or '
+                         'more key datasets. Optionally the range between '
+                         'two percentiles is given as error bars.')
+
+    def __init__(self):
+        """Define fields."""
+        self.fields = [
+            field.FieldDatasetMulti('ds_keys', _('Key datasets'),
+                                    datatype='all'),
+            field.FieldDataset('ds_in', _('Input dataset')),
+            field.FieldBool('errorbars', _('Percentile range as error bars')),
+            field.FieldFloat('lower', _('Lower percentile'), default=25.,
+                             minval=0., maxval=100.),
+            field.FieldFloat('upper', _('Upper percentile'), default=75.,
+                             minval=0., maxval=100.),
+            field.FieldDataset('ds_out', _('Output dataset')),
+            field.FieldDataset('ds_labels', _('Output group labels '
+                                              '(optional)'), datatype='text'),
+            ]
+
+    def updateGroups(self, fields, helper, groups):
+        """Compute medians."""
+        ds_in = helper.getDataset(fields['ds_in'])
+        svals, starts, num = groups.sortValues(ds_in.data)
+        median = groups.quantile(svals, starts, num, 0.5)
+
+        perr = nerr = None
+        if fields['errorbars']:
+            lower = groups.quantile(svals, starts, num, fields['lower']*0.01)
+            upper = groups.quantile(svals, starts, num, fields['upper']*0.01)
+            nerr = lower-median
+            perr = upper-median
+        self.dsout.update(data=median, perr=perr, nerr=nerr)
+
+class GroupQuantilesPlugin(_GroupByPlugin):
+    """Compute percentiles of each group."""
+
+    menu = (_('Group by'), _('Percentiles'),)
+    name = 'Group percentiles'
+    description_short = _('Compute percentiles of rows with the same '
+                          'key values')
+    description_full = _('Compute percentiles of the finite values of a '
+                         'dataset, for rows with the same values of one or '
+                         'more key datasets. One output dataset is created '
+                         'for each percentile.')
+
+    def __init__(self):
+        """Define fields."""
+        self.fields = [
+            field.FieldDatasetMulti('ds_keys', _('Key datasets'),
+                                    datatype='all'),
+            field.FieldDataset('ds_in', _('Input dataset')),
+            field.FieldFloatList('percentiles', _('Percentiles'),
+                                 default=(10., 50., 90.)),
+            field.FieldDatasetMulti('ds_out', _('Output datasets (one per '
+                                                'percentile)')),
+            field.FieldDataset('ds_labels', _('Output group labels '
+                                              '(optional)'), datatype='text'),
+            ]
+
+    def getOutputs(self, fields):
+        """Returns one output for each percentile."""
+        names = [n.strip() for n in fields['ds_out'] if n.strip() != '']
+        if len(names) != len(fields['percentiles']):
+            raise DatasetPluginException(
+                _('Number of output datasets must match number of '
+                  'percentiles'))
+        self.ds_out = [Dataset1D(n) for n in names]
+        return list(self.ds_out)
+
+    def updateGroups(self, fields, helper, groups):
+        """Compute percentiles."""
+        ds_in = helper.getDataset(fields['ds_in'])
+        svals, starts, num = groups.sortValues(ds_in.data)
+        for ds, perc in czip(self.ds_out, fields['percentiles']):
+            if perc < 0 or perc > 100:
+                raise DatasetPluginException(
+                    _('Percentiles must be between 0 and 100'))
+            ds.update(data=groups.quantile(svals, starts, num, perc*0.01))
+
+class GroupExtremesPlugin(_GroupByPlugin):
+    """Compute minimum and maximum of each group."""
+
+    menu = (_('Group by'), _('Extremes'),)
+    name = 'Group extremes'
+    description_short = _('Compute extremes of rows with the same key values')
+    description_full = _('Compute the minimum and maximum finite values of '
+                         'a dataset, for rows with the same values of one '
+                         'or more key datasets. The range can also be '
+                         'given as error bars around the mean.')
+
+    def __init__(self):
+        """Define fields."""
+        self.fields = [
+            field.FieldDatasetMulti('ds_keys', _('Key datasets'),
+                                    datatype='all'),
+            field.FieldDataset('ds_in', _('Input dataset')),
+            field.FieldDataset('ds_min', _('Output minimum dataset (optional)')),
+            field.FieldDataset('ds_max', _('Output maximum dataset (optional)')),
+            field.FieldDataset('ds_errorbar', _('Output range as error bars '
+                                                'in dataset (optional)')),
+            field.FieldDataset('ds_labels', _('Output group labels '
+                                              '(optional)'), datatype='text'),
+            ]
+
+    def getOutputs(self, fields):
+        """Returns output datasets."""
+        dsout = []
+        self.dsmin = self.dsmax = self.dserror = None
+        if fields['ds_min'] != '':
+            self.dsmin = Dataset1D(fields['ds_min'])
+            dsout.append(self.dsmin)
+        if fields['ds_max'] != '':
+            self.dsmax = Dataset1D(fields['ds_max'])
+            dsout.append(self.dsmax)
+        if fields['ds_errorbar'] != '':
+            self.dserror = Dataset1D(fields['ds_errorbar'])
+            dsout.append(self.dserror)
+        return dsout
+
+    def updateGroups(self, fields, helper, groups):
+        """Compute extremes."""
+        ds_in = helper.getDataset(fields['ds_in'])
+        svals, starts, num = groups.sortValues(ds_in.data)
+        minvals = groups.quantile(svals, starts, num, 0.)
+        maxvals = groups.quantile(svals, starts, num, 1.)
+
+        if self.dsmin is not None:
+            self.dsmin.update(data=minvals)
+        if self.dsmax is not None:
+            self.dsmax.update(data=maxvals)
+        if self.dserror is not None:
+            mean = groups.meanStd(ds_in.data)[1]
+            self.dserror.update(data=mean, nerr=minvals-mean,
+                                perr=maxvals-mean)
+
+class GroupFailureFractionPlugin(_OneOutputGroupByPlugin):
+    """Compute fraction of failed rows in each group."""
+
+    menu = (_('Group by'), _('Failure fraction'),)
+    name = 'Group failure fraction'
+    description_short = _('Compute failure fraction of rows with the same '
+                          'key values')
+    description_full = _('Compute the fraction of rows which have failed, '
+                         'for rows with the same values of one or more key '
+                         'datasets. The input dataset is non-zero for '
+                         'failed rows and zero otherwise. Non-finite values '
+                         'are ignored. Optionally the Wilson score '
+                         'confidence interval is given as error bars.')
+
+    def __init__(self):
+        """Define fields."""
+        self.fields = [
+            field.FieldDatasetMulti('ds_keys', _('Key datasets'),
+                                    datatype='all'),
+            field.FieldDataset('ds_in', _('Input failure dataset')),
+            field.FieldBool('errorbars', _('Confidence interval as error '
+                                           'bars')),
+            field.FieldFloat('confidence', _('Confidence level (%)'),
+                             default=95., minval=1., maxval=99.9999),
+            field.FieldDataset('ds_out', _('Output dataset')),
+            field.FieldDataset('ds_labels', _('Output group labels '
+                                              '(optional)'), datatype='text'),
+            ]
+
+    def updateGroups(self, fields, helper, groups):
+        """Compute failure fractions."""
+        ds_in = helper.getDataset(fields['ds_in'])
+        idx, vals = groups.select(ds_in.data)
+        num = N.bincount(idx, minlength=groups.num)
+        failed = N.bincount(idx[vals != 0], minlength=groups.num)
+
+        perr = nerr = None
+        with N.errstate(invalid='ignore', divide='ignore'):
+            frac = failed / num
+            if fields['errorbars']:
+                z = _normalQuantile(0.5 + fields['confidence']*0.005)
+                denom = 1 + z**2/num
+                centre = (frac + z**2/(2*num)) / denom
+                half = z*N.sqrt(frac*(1-frac)/num + z**2/(4*num**2)) / denom
+                nerr = centre-half-frac
+                perr = centre+half-frac
+        self.dsout.update(data=frac, perr=perr, nerr=nerr)
+
 datasetpluginregistry += [
     AddDatasetPlugin,
     AddDatasetsPlugin,
@@ -2049,4 +2935,11 @@ datasetpluginregistry += [
     SortTextPlugin,
 
     Histogram2D,
+
+    GroupCountPlugin,
+    GroupMeanPlugin,
+    GroupMedianPlugin,
+    GroupQuantilesPlugin,
+    GroupExtremesPlugin,
+    GroupFailureFractionPlugin,
     ]
@@ -47,6 +47,22 @@ def wrap(text, width):
     out = [textwrap.fill(l, width).strip() for l in lines]
     return "\n\n".join(out)
 
+def formatMemory(ds):
+    """Return text giving memory used by dataset, and type of values."""
+    size = ds.memorySize()
+    for unit in ('B', 'kB', 'MB'):
+        if size < 1024:
+            break
+        size /= 1024.
+    else:
+        unit = 'GB'
+    text = ('%i %s' if unit == 'B' else '%.1f %s') % (size, unit)
+
+    data = getattr(ds, 'data', None)
+    if ds.datatype == 'numeric' and isinstance(data, N.ndarray):
+        text += ' (%s)' % data.dtype.name
+    return text
+
 class DatasetNode(TMNode):
     """Node for a dataset."""
 
@@ -130,6 +146,7 @@ class DatasetNode(TMNode):
         c = self.cols[column]
         if c == "name":
             text = '%s: %s' % (self.data[0], ds.description())
+            text += '\n\n' + _('Memory: %s') % formatMemory(ds)
             if ds.linked:
                 text += '\n\n' + _('Linked to %s') % ds.linked.filename
             if ds.tags:
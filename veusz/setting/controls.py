@@ -1636,7 +1636,7 @@ class Datasets(MultiSettingWidget):
         datasets = []
         for name, ds in citems(self.document.data):
             if (ds.dimensions == self.dimensions and
-                ds.datatype == self.datatype):
+                (ds.datatype == self.datatype or self.datatype == 'all')):
                 datasets.append(name)
         datasets.sort()
         return datasets
@@ -43,6 +43,10 @@ defaultValues = {
     'plot_updatepolicy': -1, # update on document changed
     'plot_antialias': True,
     'plot_numthreads': 2,
+    # paint document in rendering threads rather than user interface
+    'plot_threadedrecord': True,
+    # memory for pages rendered in advance (MB, 0 to disable)
+    'plot_prerendermemory': 256,
 
     # recent files list
     'main_recentfiles': [],
@@ -80,6 +84,41 @@ defaultValues = {
 
     # add these directories to the python path (colon-separated)
     'external_pythonpath': '',
+
+    # cache results of custom functions (number of results kept)
+    'custom_memoise': False,
+    'custom_memoise_size': 256,
+
+    # evaluate dataset expressions in a separate process
+    # time limit (s) and memory limit (MB) for process (0 for none)
+    'eval_worker': False,
+    'eval_worker_timeout': 30,
+    'eval_worker_memlimit': 4096,
+
+    # evaluate element-wise expressions over long datasets in chunks
+    # (number of elements), writing to a temporary file
+    'eval_streaming': False,
+    'eval_stream_chunksize': 1048576,
+
+    # memory used by data in undo history before older data are
+    # compressed to a temporary file, and the total allowed (MB)
+    'undo_memory': 256,
+    'undo_budget': 2048,
+    'undo_spill': True,
+    # maximum number of operations in undo history
+    'undo_steps': 100,
+
+    # keep integer, boolean and float32 data in datasets in their
+    # own type, rather than converting to float64
+    'dataset_native_dtype': False,
+
+    # store imported text with many repeated values as codes into a
+    # list of unique values
+    'text_categorical': False,
+
+    # number of processes for running dataset plugins which ask to be
+    # run in a separate process (0 to run them in the program)
+    'plugin_processes': 2,
     }
 
 class _SettingDB(object):
@@ -25,6 +25,7 @@ from .fitlm import fitLM
 
 from .utilfuncs import *
 from .points import *
+from .decimate import *
 from .action import *
 from .dates import *
 from .formatting import *
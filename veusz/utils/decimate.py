@@ -0,0 +1,155 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+
+"""Remove points which make little difference to the image at the
+output resolution.
+
+Coordinates are in painter units, which are the pixels of the output
+device. The images are not identical to those of all the points, as
+the antialiased edges of lines and markers change.
+"""
+
+from __future__ import division
+import numpy as N
+
+# do not try to decimate fewer points than this
+decimateminpoints = 2048
+
+# largest coordinate used when computing pixels
+_maxpixel = 1e9
+
+# lines are decimated in columns or rows of this width (in pixels),
+# so that antialiased lines cover the same fraction of each pixel
+linecellsize = 0.5
+
+# markers are considered to be in the same place if they are at the
+# same position, rounded to this size (in pixels), which is the
+# precision sprites of markers are positioned to
+markercellsize = 0.25
+
+def _firstInRuns(match, starts):
+    """Return index of first True value in match for each run
+    beginning at starts (runs without a True value are skipped)."""
+    idx = N.flatnonzero(match)
+    run = N.searchsorted(starts, idx, side='right')
+    first = N.ones(len(idx), dtype=bool)
+    first[1:] = run[1:] != run[:-1]
+    return idx[first]
+
+def decimateLine(x, y, breaks=()):
+    """Decimate a polyline through the points x, y.
+
+    Runs of consecutive points in the same pixel column (or row, if
+    this removes more points) are replaced by the first and last
+    points and the points with the minimum and maximum values in the
+    run (M4 decimation). This covers the same range of values in each
+    column as the original line, but the shape of the line within the
+    column changes, so antialiased or thin lines change by up to a
+    pixel.
+
+    breaks are indices of points which must start a new run, such as
+    the start of separate lines.
+
+    Returns a boolean array of points to keep, or None if decimation
+    is not worthwhile.
+    """
+
+    n = len(x)
+    if ( n < decimateminpoints or
+         not N.isfinite(x).all() or not N.isfinite(y).all() ):
+        return None
+
+    scale = 1./linecellsize
+    col = N.floor(N.clip(x*scale, -_maxpixel, _maxpixel)).astype(N.int64)
+    row = N.floor(N.clip(y*scale, -_maxpixel, _maxpixel)).astype(N.int64)
+    colchange = col[1:] != col[:-1]
+    rowchange = row[1:] != row[:-1]
+    if N.count_nonzero(colchange) <= N.count_nonzero(rowchange):
+        change, vals = colchange, y
+    else:
+        change, vals = rowchange, x
+
+    # forced breaks start new runs
+    breaks = N.asarray(breaks, dtype=N.intp)
+    breaks = breaks[(breaks > 0) & (breaks < n)]
+    change[breaks-1] = True
+
+    starts = N.concatenate(([0], N.flatnonzero(change)+1))
+    if len(starts)*4 >= n:
+        return None
+    ends = N.append(starts[1:], n)
+    lengths = ends - starts
+
+    keep = N.zeros(n, dtype=bool)
+    keep[starts] = True
+    keep[ends-1] = True
+    for reduction in N.minimum, N.maximum:
+        extreme = N.repeat(reduction.reduceat(vals, starts), lengths)
+        keep[_firstInRuns(vals == extreme, starts)] = True
+
+    return keep
+
+def decimateMarkers(x, y, clip, margin, colorvals=None):
+    """Decimate markers at x, y of the same size.
+
+    Only the last marker plotted at each position (rounded to
+    markercellsize pixels) is kept, as this is drawn on top of the
+    others. Markers are only removed if they have the same color value
+    (to 1/256) as the marker kept. Markers further than margin outside
+    the clip rectangle are not kept.
+
+    The markers must be opaque. Even so, the image is not exactly the
+    same, as the antialiased edges of the markers removed are no
+    longer drawn under those of the markers kept.
+
+    Returns indices of markers to plot.
+    """
+
+    scale = 1./markercellsize
+    xmin = N.floor((clip.left() - margin)*scale)
+    ymin = N.floor((clip.top() - margin)*scale)
+    nx = int((clip.width() + 2*margin)*scale) + 2
+    ny = int((clip.height() + 2*margin)*scale) + 2
+
+    with N.errstate(invalid='ignore'):
+        ix = N.rint(x*scale) - xmin
+        iy = N.rint(y*scale) - ymin
+        inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+    idx = N.flatnonzero(inside)
+    key = iy[idx].astype(N.int64)*nx + ix[idx].astype(N.int64)
+    numkeys = nx*ny
+
+    if colorvals is not None:
+        cvals = colorvals[idx]
+        with N.errstate(invalid='ignore'):
+            level = N.where(
+                N.isfinite(cvals), N.rint(N.clip(cvals, 0, 1)*255), 256)
+        key = key*257 + level.astype(N.int64)
+        numkeys *= 257
+
+    if numkeys <= 2*len(key) + (1<<20):
+        # find last in each pixel using an image of the pixels
+        last = N.full(numkeys, -1, dtype=N.intp)
+        N.maximum.at(last, key, N.arange(len(key)))
+        sel = last[last >= 0]
+        sel.sort()
+    else:
+        # too many pixels: find last by sorting
+        first = N.unique(key[::-1], return_index=True)[1]
+        sel = N.sort(len(key)-1-first)
+
+    return idx[sel]
@@ -0,0 +1,212 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+
+"""Plot markers on bitmaps by copying images of the markers (sprites).
+
+Drawing a marker path with antialiasing for each point is slow. If
+the output is only ever a bitmap, each marker is instead drawn once
+into a small image, which is copied to the position of each point.
+Sprites are drawn at several sub-pixel offsets, so that markers are
+placed to within 1/8 of a pixel.
+"""
+
+from __future__ import division
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as N
+
+from ..compat import crange, czip
+from .. import qtall as qt4
+from . import colormap
+
+# do not use sprites for fewer markers than this
+spriteminpoints = 256
+
+# number of sub-pixel offsets in each direction
+spritephases = 4
+
+# maximum number of sprites kept
+maxsprites = 4096
+
+# maximum size of sprite (pixels)
+maxspritesize = 256
+
+# levels of color for colored markers
+_colorlevels = 256
+
+_sprites = OrderedDict()
+_spriteslock = threading.Lock()
+
+def spriteAntialias(painter):
+    """Return whether markers drawn with painter will be antialiased,
+    if painter only draws to bitmaps, or None otherwise."""
+
+    # painter of a PaintHelper recording the output (a QPicture copies
+    # images each time they are drawn, so is not used)
+    helper = getattr(painter, 'helper', None)
+    if helper is not None:
+        if not helper.bitmap or isinstance(painter.device(), qt4.QPicture):
+            return None
+        return helper.antialias
+
+    if isinstance(painter.device(), qt4.QImage):
+        return painter.testRenderHint(qt4.QPainter.Antialiasing)
+    return None
+
+def _penKey(pen):
+    """Key describing pen."""
+    dashes = ( tuple(pen.dashPattern())
+               if pen.style() == qt4.Qt.CustomDashLine else None )
+    return ( pen.color().rgba(), pen.widthF(), int(pen.style()),
+             int(pen.capStyle()), int(pen.joinStyle()), pen.miterLimit(),
+             pen.isCosmetic(), dashes )
+
+def _makeSprite(path, pen, brush, antialias, offset, size, phase):
+    """Draw path into new image, with origin at offset plus phase."""
+    img = qt4.QImage(size[0], size[1], qt4.QImage.Format_ARGB32_Premultiplied)
+    img.fill(0)
+    painter = qt4.QPainter(img)
+    painter.setRenderHint(qt4.QPainter.Antialiasing, antialias)
+    painter.setPen(pen)
+    painter.setBrush(brush)
+    painter.translate(offset[0] + phase[0], offset[1] + phase[1])
+    painter.drawPath(path)
+    painter.end()
+    return img
+
+def _getSprite(key, makefn):
+    """Get sprite with key from cache, or make it using makefn."""
+    with _spriteslock:
+        img = _sprites.pop(key, None)
+        if img is not None:
+            _sprites[key] = img
+            return img
+
+    img = makefn()
+    with _spriteslock:
+        _sprites[key] = img
+        while len(_sprites) > maxsprites:
+            _sprites.popitem(last=False)
+    return img
+
+def _colorLUT(cmap, trans):
+    """Return list of colors for levels of color value, with the
+    color for invalid values last."""
+    ramp = N.append(N.linspace(0., 1., _colorlevels), N.nan)
+    img = colormap.applyColorMap(
+        cmap, 'linear', ramp.reshape(1, len(ramp)), 0., 1., trans)
+    return [ qt4.QColor.fromRgba(img.pixel(i, 0))
+             for i in crange(len(ramp)) ]
+
+def plotMarkerSprites(painter, xpos, ypos, path, pathkey, clip=None,
+                      cmap=None, colorvals=None):
+    """Plot markers with path at xpos, ypos using sprites.
+
+    pathkey identifies the path (such as name, size and dpi). The
+    painter pen and brush are used, except that the brush color is
+    taken from the colormap cmap for colorvals (0-1), if given.
+
+    Returns False if sprites cannot be used, and nothing is drawn.
+    """
+
+    antialias = spriteAntialias(painter)
+    numpts = min(len(xpos), len(ypos))
+    if colorvals is not None:
+        numpts = min(numpts, len(colorvals))
+    if antialias is None or numpts < spriteminpoints:
+        return False
+
+    # only translations can be handled
+    trans = painter.worldTransform()
+    if trans.type() > qt4.QTransform.TxTranslate:
+        return False
+
+    pen, brush = painter.pen(), painter.brush()
+    if brush.style() not in (qt4.Qt.NoBrush, qt4.Qt.SolidPattern):
+        return False
+
+    # space needed around path for pen and antialiasing
+    margin = pen.widthF()*max(pen.miterLimit(), 1.) + 2
+    bounds = path.boundingRect()
+    offset = ( int(math.ceil(margin - bounds.left())),
+               int(math.ceil(margin - bounds.top())) )
+    size = ( int(math.ceil(offset[0] + bounds.right() + margin)) + 1,
+             int(math.ceil(offset[1] + bounds.bottom() + margin)) + 1 )
+    if max(size) > maxspritesize:
+        return False
+
+    x = N.asarray(xpos[:numpts], dtype=N.float64) + trans.dx()
+    y = N.asarray(ypos[:numpts], dtype=N.float64) + trans.dy()
+
+    # remove markers outside of clipping region
+    with N.errstate(invalid='ignore'):
+        sel = N.isfinite(x) & N.isfinite(y)
+        if clip is not None:
+            sel &= ( (x >= clip.left() + trans.dx() - size[0]) &
+                     (x <= clip.right() + trans.dx() + size[0]) &
+                     (y >= clip.top() + trans.dy() - size[1]) &
+                     (y <= clip.bottom() + trans.dy() + size[1]) )
+    idx = N.flatnonzero(sel)
+    x, y = x[idx], y[idx]
+
+    # position of each sprite and the sub-pixel phase
+    qx = N.rint(x*spritephases).astype(N.int64)
+    qy = N.rint(y*spritephases).astype(N.int64)
+    phx, phy = qx % spritephases, qy % spritephases
+    key = phx*spritephases + phy
+
+    if colorvals is None or brush.style() == qt4.Qt.NoBrush:
+        colors = [brush.color()]
+    else:
+        # use colormap lookup table for levels of color value
+        colors = _colorLUT(cmap, (1-brush.color().alphaF())*100)
+        cvals = N.asarray(colorvals[:numpts])[idx]
+        with N.errstate(invalid='ignore'):
+            level = N.where(
+                N.isfinite(cvals),
+                N.rint(N.clip(cvals, 0., 1.)*(_colorlevels-1)),
+                _colorlevels).astype(N.int64)
+        key = key*len(colors) + level
+
+    uniq, inverse = N.unique(key, return_inverse=True)
+    basekey = ( pathkey, _penKey(pen), int(brush.style()), antialias )
+    sprites = []
+    for k in uniq.tolist():
+        k, icolor = divmod(k, len(colors))
+        phase = ( (k // spritephases) / spritephases,
+                  (k % spritephases) / spritephases )
+        spritebrush = qt4.QBrush(brush)
+        if brush.style() != qt4.Qt.NoBrush:
+            spritebrush.setColor(colors[icolor])
+        sprites.append(_getSprite(
+            basekey + (spritebrush.color().rgba(), phase),
+            lambda: _makeSprite(path, pen, spritebrush, antialias,
+                                offset, size, phase)))
+
+    # copy the sprites to whole pixels, without the painter translation
+    px = (qx // spritephases - offset[0]).tolist()
+    py = (qy // spritephases - offset[1]).tolist()
+    painter.save()
+    painter.setWorldTransform(qt4.QTransform())
+    draw = painter.drawImage
+    for xi, yi, k in czip(px, py, inverse.tolist()):
+        draw(xi, yi, sprites[k])
+    painter.restore()
+
+    return True
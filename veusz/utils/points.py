@@ -28,6 +28,7 @@ except ImportError:
     from .slowfuncs import plotPathsToPainter
 
 from . import colormap
+from . import markersprites
 
 """This is the symbol plotting part of OpenReliability
 
@@ -440,6 +441,15 @@ def plotMarkers(painter, xpos, ypos, markername, markersize, scaling=None,
         # turn off brush
         painter.setBrush( qt4.QBrush() )
 
+    # copy images of markers if only drawing to bitmaps
+    if scaling is None:
+        dpi = painter.device().logicalDpiY()
+        if markersprites.plotMarkerSprites(
+                painter, xpos, ypos, path, (markername, markersize, dpi),
+                clip=clip, cmap=cmap, colorvals=colorvals):
+            painter.restore()
+            return
+
     # if using colored points
     colorimg = None
     if colorvals is not None:
@@ -0,0 +1,81 @@
+#    Copyright (C) 2026 OpenReliability contributors
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+##############################################################################
+
+"""Pass numpy arrays to other processes using shared memory.
+
+Values are packed into descriptions which can be pickled. Arrays are
+copied into shared memory blocks, where available, and other values
+are pickled with the description. Blocks are added to a list, which
+should be closed with closeBlocks when the values are no longer
+needed.
+"""
+
+import numpy as N
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+def ensureTracker():
+    """Start the shared memory tracker before starting other processes,
+    so that blocks are only tracked once."""
+    if shared_memory is not None:
+        resource_tracker.ensure_running()
+
+def _shmOpen(name):
+    """Attach to existing shared memory without tracking it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # track parameter only in python >= 3.13
+        return shared_memory.SharedMemory(name=name)
+
+def packArray(val, blocks):
+    """Convert value to something to send to the other process.
+
+    Numeric arrays are copied to shared memory, which is added to
+    blocks. Other values are pickled.
+    """
+    if ( shared_memory is not None and isinstance(val, N.ndarray) and
+         not val.dtype.hasobject and val.nbytes > 0 ):
+        shm = shared_memory.SharedMemory(create=True, size=val.nbytes)
+        blocks.append(shm)
+        N.ndarray(val.shape, dtype=val.dtype, buffer=shm.buf)[...] = val
+        return ('shm', shm.name, val.dtype.str, val.shape)
+    return ('obj', val)
+
+def unpackArray(desc, blocks):
+    """Convert packed value back. Shared memory is added to blocks.
+
+    The returned array is a view onto the shared memory."""
+    if desc[0] == 'shm':
+        shm = _shmOpen(desc[1])
+        blocks.append(shm)
+        return N.ndarray(desc[3], dtype=N.dtype(desc[2]), buffer=shm.buf)
+    return desc[1]
+
+def closeBlocks(blocks, unlink=False):
+    """Close (and optionally remove) shared memory blocks."""
+    for shm in blocks:
+        try:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        except (BufferError, OSError):
+            pass
+    del blocks[:]
@@ -328,19 +328,90 @@ class RotatedRectangle:
                                 ( xw/2.)*s + (-yw/2.)*c + cy))
         return poly
 
+def _boundsOverlap(a, b):
+    """Do rectangles a and b overlap (including touching)?"""
+    return ( a.left() <= b.right() and b.left() <= a.right() and
+             a.top() <= b.bottom() and b.top() <= a.bottom() )
+
 class RectangleOverlapTester:
-    """Keep track of whether RotatedRectangles overlap."""
+    """Keep track of whether RotatedRectangles overlap.
+
+    Rectangles are indexed in a uniform grid by their bounding boxes,
+    so that only nearby rectangles are tested for overlap.
+    """
+
+    # rectangles covering more grid cells than this are not in the grid
+    maxrectcells = 64
+
     def __init__(self):
-        self._rects = []
+        self._polys = []
+        self._bounds = []
+        # size of grid cells, set from the first rectangle
+        self._cellsize = None
+        # indices of rectangles in each grid cell
+        self._grid = {}
+        # rectangles covering too many cells to be put in the grid
+        self._large = []
+
+    def _cellRange(self, bounds):
+        """Return range of grid cells (x0, y0, x1, y1) covered by
+        bounds, or None if too many."""
+        cs = self._cellsize
+        try:
+            x0 = int(math.floor(bounds.left()/cs))
+            y0 = int(math.floor(bounds.top()/cs))
+            x1 = int(math.floor(bounds.right()/cs))
+            y1 = int(math.floor(bounds.bottom()/cs))
+        except (ValueError, OverflowError):
+            return None
+        if (x1-x0+1)*(y1-y0+1) > self.maxrectcells:
+            return None
+        return x0, y0, x1, y1
 
     def willOverlap(self, rect):
         """Will this rectangle overlap with the others?"""
         poly = rect.makePolygon()
-        for r in self._rects:
-            if len( poly.intersected(r.makePolygon()) ) > 0:
+        bounds = poly.boundingRect()
+
+        cells = None
+        if self._cellsize is not None:
+            cells = self._cellRange(bounds)
+        if cells is None:
+            # test against all rectangles
+            candidates = crange(len(self._polys))
+        else:
+            x0, y0, x1, y1 = cells
+            candidates = set(self._large)
+            grid = self._grid
+            for y in crange(y0, y1+1):
+                for x in crange(x0, x1+1):
+                    candidates.update(grid.get((x, y), ()))
+
+        for i in candidates:
+            if ( _boundsOverlap(bounds, self._bounds[i]) and
+                 len( poly.intersected(self._polys[i]) ) > 0 ):
                 return True
         return False
 
     def addRect(self, rect):
         """Add rectangle to list."""
-        self._rects.append(rect)
+        poly = rect.makePolygon()
+        bounds = poly.boundingRect()
+        idx = len(self._polys)
+        self._polys.append(poly)
+        self._bounds.append(bounds)
+
+        if self._cellsize is None:
+            # make cells the size of the first rectangle
+            cs = max(bounds.width(), bounds.height())
+            self._cellsize = cs if 0 < cs < 1e100 else 1.
+
+        cells = self._cellRange(bounds)
+        if cells is None:
+            self._large.append(idx)
+            return
+        x0, y0, x1, y1 = cells
+        grid = self._grid
+        for y in crange(y0, y1+1):
+            for x in crange(x0, x1+1):
+                grid.setdefault((x, y), []).append(idx)
@@ -22,6 +22,8 @@
 from __future__ import division
 import math
 import re
+import threading
+from collections import OrderedDict
 
 import numpy as N
 
@@ -634,14 +636,20 @@ class PartText(Part):
     """Fundamental bit of text to be rendered: some text."""
     def __init__(self, text):
         self.text = text
+        # a tree of parts is always rendered in the same font, so the
+        # width is kept after it is first measured
+        self.width = None
 
     def addText(self, text):
         self.text += text
+        self.width = None
 
     def render(self, state):
         """Render some text."""
 
-        width = state.fontMetrics().width(self.text)
+        if self.width is None:
+            self.width = state.fontMetrics().width(self.text)
+        width = self.width
 
         # actually write the text if requested
         if state.actually_render:
@@ -1161,6 +1169,43 @@ def makePartTree(partlist):
     else:
         return PartLines(lines)
 
+class _LayoutCache(object):
+    """Least-recently-used cache of text layouts.
+
+    Each layout is the tree of parts for the text, measured for a
+    font, device resolution and scaling, and the size of the text.
+    The tree of parts is only used for one layout, as the parts store
+    measurements.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.layouts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Remove cached layouts."""
+        with self.lock:
+            self.layouts.clear()
+
+    def get(self, key):
+        """Return (parttree, size) for key, or None."""
+        with self.lock:
+            layout = self.layouts.pop(key, None)
+            if layout is not None:
+                self.layouts[key] = layout
+            return layout
+
+    def set(self, key, parttree, size):
+        """Store layout for key."""
+        with self.lock:
+            self.layouts[key] = (parttree, size)
+            while len(self.layouts) > self.maxsize:
+                self.layouts.popitem(last=False)
+
+# layouts of text kept for reuse
+layoutcache = _LayoutCache(4096)
+
 class _Renderer:
     """Different renderer types based on this."""
 
@@ -1326,9 +1371,27 @@ class _StdRenderer(_Renderer):
             text = text[:delta+m.start()] + expanded + text[delta+m.end():]
             delta += len(expanded) - (m.end()-m.start())
 
+        # reuse the tree of parts and size if already laid out
+        self.layoutkey = self._layoutKey(text)
+        layout = layoutcache.get(self.layoutkey)
+        if layout is not None:
+            self.parttree, self.layoutsize = layout
+            return
+
         # make internal tree
         partlist = makePartList(text)
         self.parttree = makePartTree(partlist)
+        self.layoutsize = None
+
+    def _layoutKey(self, text):
+        """Key for layout of text, which includes everything changing
+        how the text is measured."""
+        dev = self.painter.device()
+        return (
+            text, self.font.key(), dev.logicalDpiX(), dev.logicalDpiY(),
+            getattr(self.painter, 'scaling', None),
+            getattr(self.painter, 'pixperpt', None),
+            self.alignvert == 0, self.usefullheight, FontMetrics )
 
     def _expandExpr(self, expr):
         """Expand expression."""
@@ -1345,6 +1408,14 @@ class _StdRenderer(_Renderer):
     def _getWidthHeight(self):
         """Get size of box around text."""
 
+        if self.layoutsize is None:
+            self.layoutsize = self._measure()
+            layoutcache.set(self.layoutkey, self.parttree, self.layoutsize)
+        return self.layoutsize
+
+    def _measure(self):
+        """Measure size of box around text."""
+
         # work out total width and height
         self.painter.setFont(self.font)
 
@@ -178,6 +178,9 @@ class Axis(widget.Widget):
     description = 'Axis to a plot or shared in a grid'
     isaxis = True
 
+    # data values are converted to plotter coordinates in the same order
+    monotoniccoords = True
+
     def __init__(self, parent, name=None):
         """Initialise axis."""
 
@@ -572,9 +575,17 @@ class Axis(widget.Widget):
 
         return self.coordParr1 + fracposns*(self.coordParr2-self.coordParr1)
 
+    def coordinateState(self):
+        """Return values, other than settings and bounds, which
+        determine the conversion to plotter coordinates, or None if
+        this cannot be determined."""
+        return tuple(self.plottedrange)
+
     def dataToPlotterCoords(self, posn, data):
         """Convert data values to plotter coordinates, scaling if necessary."""
         self.updateAxisLocation(posn)
+        # datasets may be stored in other numeric types
+        data = N.asarray(data, dtype=N.float64)
         return self._graphToPlotter(data*self.settings.datascale)
 
     def plotterToGraphCoords(self, bounds, vals):
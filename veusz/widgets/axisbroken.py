@@ -42,6 +42,9 @@ class AxisBroken(axis.Axis):
     typename = 'axis-broken'
     description = 'Axis with breaks in it'
 
+    # values outside the parts of the axis are not converted
+    monotoniccoords = False
+
     def __init__(self, parent, name=None):
         """Initialise axis."""
         axis.Axis.__init__(self, parent, name=name)
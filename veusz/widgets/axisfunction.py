@@ -173,6 +173,9 @@ class AxisFunction(axis.Axis):
     typename = 'axis-function'
     description = 'An axis based on a function of the values of another axis'
 
+    # the function may not be monotonic
+    monotoniccoords = False
+
     def __init__(self, *args, **argsv):
         axis.Axis.__init__(self, *args, **argsv)
 
@@ -308,6 +311,12 @@ class AxisFunction(axis.Axis):
             return None
         return linked
 
+    def coordinateState(self):
+        '''Conversion of linked axes depends on the other axis.'''
+        if self.isLinked():
+            return None
+        return axis.Axis.coordinateState(self)
+
     def computePlottedRange(self, force=False):
         '''Use other axis to compute range.'''
 
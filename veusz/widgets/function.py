@@ -357,20 +357,24 @@ class FunctionPlotter(GenericPlotter):
             return (dpts, ipts), (pdpts, pipts)
 
     def _pickable(self, posn):
-        s = self.settings
+        def make():
+            s = self.settings
 
-        axisnames = [s.xAxis, s.yAxis]
-        axes = self.parent.getAxes(axisnames)
+            axisnames = [s.xAxis, s.yAxis]
+            axes = self.parent.getAxes(axisnames)
 
-        if s.variable == 'x':
-            axisnames[1] = axisnames[1] + '(' + axisnames[0] + ')'
-        else:
-            axisnames[0] = axisnames[0] + '(' + axisnames[1] + ')'
+            if s.variable == 'x':
+                axisnames[1] = axisnames[1] + '(' + axisnames[0] + ')'
+            else:
+                axisnames[0] = axisnames[0] + '(' + axisnames[1] + ')'
 
-        (xpts, ypts), (pxpts, pypts) = self.calcFunctionPoints(axes, posn)
+            (xpts, ypts), (pxpts, pypts) = self.calcFunctionPoints(
+                axes, posn)
+
+            return pickable.GenericPickable(
+                        self, axisnames, (xpts, ypts), (pxpts, pypts) )
 
-        return pickable.GenericPickable(
-                    self, axisnames, (xpts, ypts), (pxpts, pypts) )
+        return pickable.cachedPickable(self, tuple(posn), make)
 
     def pickPoint(self, x0, y0, bounds, distance='radial'):
         return self._pickable(bounds).pickPoint(x0, y0, bounds, distance)
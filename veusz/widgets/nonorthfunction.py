@@ -142,22 +142,26 @@ class NonOrthFunction(Widget):
     def updateDataRanges(self, inrange):
         '''Update ranges of data given function.'''
 
-    def _pickable(self):
-        apts, bpts = self.getFunctionPoints()
-        px, py = self.parent.graphToPlotCoords(apts, bpts)
+    def _pickable(self, bounds):
+        def make():
+            apts, bpts = self.getFunctionPoints()
+            px, py = self.parent.graphToPlotCoords(apts, bpts)
 
-        if self.settings.variable == 'a':
-            labels = ('a', 'b(a)')
-        else:
-            labels = ('a(b)', 'b')
+            if self.settings.variable == 'a':
+                labels = ('a', 'b(a)')
+            else:
+                labels = ('a(b)', 'b')
+
+            return pickable.GenericPickable(
+                self, labels, (apts, bpts), (px, py) )
 
-        return pickable.GenericPickable( self, labels, (apts, bpts), (px, py) )
+        return pickable.cachedPickable(self, tuple(bounds), make)
 
     def pickPoint(self, x0, y0, bounds, distance='radial'):
-        return self._pickable().pickPoint(x0, y0, bounds, distance)
+        return self._pickable(bounds).pickPoint(x0, y0, bounds, distance)
 
     def pickIndex(self, oldindex, direction, bounds):
-        return self._pickable().pickIndex(oldindex, direction, bounds)
+        return self._pickable(bounds).pickIndex(oldindex, direction, bounds)
 
     def draw(self, parentposn, phelper, outerbounds=None):
         '''Plot the function on a plotter.'''
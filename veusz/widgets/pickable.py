@@ -20,11 +20,17 @@
 ###############################################################################
 
 from __future__ import division
+import itertools
+import math
+
 import numpy as N
 
 from ..compat import CBool
 from .. import document
 
+# points are found using an index if there are at least this many
+indexminpoints = 4096
+
 class PickInfo(CBool):
     """Encapsulates the results of a Pick operation. screenpos and coords are
        numeric (x,y) tuples, labels are the textual labels for the x and y
@@ -87,6 +93,175 @@ def _chooseOrderingSign(m, c, p):
     else:
         assert m is not None or p is not None
 
+def cachedPickable(widget, key, makefn):
+    """Return pickable for widget made by calling makefn.
+
+    The pickable (and its index of points) is reused until the
+    document changes or key (such as the bounds) changes.
+    """
+    fullkey = (widget.document.changeset, key)
+    cached = getattr(widget, '_pickablecache', None)
+    if cached is not None and cached[0] == fullkey:
+        return cached[1]
+    p = makefn()
+    widget._pickablecache = (fullkey, p)
+    return p
+
+class _ScreenIndex(object):
+    """Index of the finite screen coordinates of points inside bounds,
+    for quickly finding the closest point to a position.
+
+    Points are sorted along each axis for finding the closest
+    horizontally or vertically, and are put in a uniform grid for
+    finding the closest radially. The indices are made when first
+    used.
+    """
+
+    # rings of grid cells searched before testing all points
+    maxrings = 64
+
+    def __init__(self, xscreen, yscreen, bounds):
+        xscreen = N.asarray(xscreen, dtype=N.float64)
+        yscreen = N.asarray(yscreen, dtype=N.float64)
+        with N.errstate(invalid='ignore'):
+            inside = (
+                (xscreen >= bounds[0]) & (xscreen <= bounds[2]) &
+                (yscreen >= bounds[1]) & (yscreen <= bounds[3]) &
+                N.isfinite(xscreen) & N.isfinite(yscreen) )
+        # indices of points in the original arrays
+        self.idx = N.flatnonzero(inside)
+        self.x = xscreen[self.idx]
+        self.y = yscreen[self.idx]
+        self._sorted = {}
+        self._grid = None
+
+    def _best(self, cand, dist):
+        """Return (index, distance) of first candidate with the
+        smallest distance."""
+        m = dist.min()
+        i = self.idx[cand[dist == m]].min()
+        return i, m
+
+    def closest(self, x0, y0, direction):
+        """Return (index, distance) of closest point to x0, y0, or
+        None if there are no points.
+
+        direction is 'radial', 'horizontal' or 'vertical'. As when
+        calculated directly, the first point is chosen if several are
+        the same distance away.
+        """
+        if direction == 'horizontal':
+            pos = (x0,)
+        elif direction == 'vertical':
+            pos = (y0,)
+        else:
+            # programming error
+            assert direction == 'radial'
+            pos = (x0, y0)
+        if len(self.idx) == 0 or not N.isfinite(pos).all():
+            return None
+
+        if direction == 'horizontal':
+            return self._closestAlong('x', x0)
+        elif direction == 'vertical':
+            return self._closestAlong('y', y0)
+        else:
+            return self._closestRadial(x0, y0)
+
+    def _closestAlong(self, axis, v0):
+        """Find closest point along axis ('x' or 'y')."""
+        vals = self.x if axis == 'x' else self.y
+        if axis not in self._sorted:
+            order = N.argsort(vals, kind='mergesort')
+            self._sorted[axis] = (order, vals[order])
+        order, svals = self._sorted[axis]
+
+        # closest on either side of the position
+        pos = N.searchsorted(svals, v0)
+        near = order[max(pos-1, 0):pos+1]
+        m = N.abs(vals[near] - v0).min()
+
+        # find all points at this distance (allowing for rounding)
+        margin = 4*N.spacing(max(abs(v0), m))
+        lo = N.searchsorted(svals, v0-m-margin, side='left')
+        hi = N.searchsorted(svals, v0+m+margin, side='right')
+        cand = order[lo:hi]
+        return self._best(cand, N.abs(vals[cand] - v0))
+
+    def _makeGrid(self):
+        """Put points in a uniform grid, with a few points per cell."""
+        x, y = self.x, self.y
+        n = len(x)
+        xmin, ymin = x.min(), y.min()
+        w, h = x.max()-xmin, y.max()-ymin
+        cellsize = max(math.sqrt(w*h*4/n), max(w, h)*4/n, 1e-6)
+        nx = int(w/cellsize) + 1
+        ny = int(h/cellsize) + 1
+
+        ix = N.minimum( ((x-xmin)/cellsize).astype(N.int64), nx-1 )
+        iy = N.minimum( ((y-ymin)/cellsize).astype(N.int64), ny-1 )
+        keys = iy*nx + ix
+        order = N.argsort(keys, kind='mergesort')
+        self._grid = (xmin, ymin, cellsize, nx, ny, order, keys[order])
+
+    def _closestRadial(self, x0, y0):
+        """Find closest point, searching rings of grid cells outwards
+        from the position."""
+        if self._grid is None:
+            self._makeGrid()
+        xmin, ymin, cellsize, nx, ny, order, skeys = self._grid
+
+        qx = int(math.floor((x0-xmin)/cellsize))
+        qy = int(math.floor((y0-ymin)/cellsize))
+        minring = max(0, -qx, qx-nx+1, -qy, qy-ny+1)
+        maxring = max(qx, nx-1-qx, qy, ny-1-qy)
+
+        best = None
+        for r in itertools.count(minring):
+            # after each ring, points in later rings are further than
+            # r cells away
+            if r > maxring or (best is not None and best[1] < (r-1)*cellsize):
+                break
+            if r >= minring + self.maxrings:
+                # far from the points, so quicker to test them all
+                cand = N.arange(len(self.idx))
+                dist = N.sqrt((self.x - x0)**2 + (self.y - y0)**2)
+                return self._best(cand, dist)
+
+            # key ranges of the cells in the ring, along each row
+            rows = N.arange(max(qy-r, 0), min(qy+r, ny-1)+1)
+            edge = N.abs(rows-qy) == r
+            starts, ends = [], []
+            if r == 0:
+                starts.append(rows*nx + qx)
+                ends.append(rows*nx + qx)
+            else:
+                # full rows at the top and bottom of the ring
+                if 0 <= qx+r and qx-r <= nx-1:
+                    starts.append(rows[edge]*nx + max(qx-r, 0))
+                    ends.append(rows[edge]*nx + min(qx+r, nx-1))
+                # cells at each side of the ring
+                for cx in (qx-r, qx+r):
+                    if 0 <= cx < nx:
+                        starts.append(rows[~edge]*nx + cx)
+                        ends.append(rows[~edge]*nx + cx)
+            if not starts:
+                continue
+            lo = N.searchsorted(skeys, N.concatenate(starts), side='left')
+            hi = N.searchsorted(skeys, N.concatenate(ends), side='right')
+            if (hi-lo).sum() == 0:
+                continue
+            cand = order[N.concatenate(
+                [N.arange(a, b) for a, b in zip(lo.tolist(), hi.tolist())])]
+
+            dist = N.sqrt((self.x[cand] - x0)**2 + (self.y[cand] - y0)**2)
+            found = self._best(cand, dist)
+            if best is None or found[1] < best[1] or (
+                    found[1] == best[1] and found[0] < best[0]):
+                best = found
+
+        return best
+
 class GenericPickable:
     """Utility class which abstracts the math of picking the closest point out
        of a list of points"""
@@ -96,6 +271,15 @@ class GenericPickable:
         self.labels = labels
         self.xvals, self.yvals = vals
         self.xscreen, self.yscreen = screenvals
+        self._index = None
+
+    def _getIndex(self, bounds):
+        """Get index of screen points for bounds."""
+        bounds = tuple(bounds)
+        if self._index is None or self._index[0] != bounds:
+            self._index = (
+                bounds, _ScreenIndex(self.xscreen, self.yscreen, bounds))
+        return self._index[1]
 
     def _pickSign(self, i):
         if len(self.xscreen) <= 1:
@@ -136,6 +320,18 @@ class GenericPickable:
         if len(self.xscreen) == 0 or len(self.yscreen) == 0:
             return info
 
+        if min(len(self.xscreen), len(self.yscreen)) >= indexminpoints:
+            # use index of points for large numbers of points
+            found = self._getIndex(bounds).closest(x0, y0, distance_direction)
+            if found is None:
+                return info
+            i, m = found
+            info.screenpos = self.xscreen[i], self.yscreen[i]
+            info.coords = self.xvals[i], self.yvals[i]
+            info.distance = m
+            info.index = Index(self.xvals[i], i, self._pickSign(i))
+            return info
+
         # calculate distances
         if distance_direction == 'vertical':
             # measure distance along y
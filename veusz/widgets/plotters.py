@@ -25,6 +25,9 @@ from __future__ import division
 from .. import qtall as qt4
 import numpy as N
 
+from .. import document
+from ..compat import cbasestr
+from ..document import evaluate
 from .. import setting
 
 from . import widget
@@ -167,9 +170,14 @@ class GenericPlotter(widget.Widget):
 
         # clip data within bounds of plotter
         cliprect = self.clipAxesBounds(axes, posn)
-        painter = painthelper.painter(self, posn, clip=cliprect)
-        with painter:
-            self.dataDraw(painter, axes, posn, cliprect)
+
+        # draw unless unchanged since the last paint
+        if not painthelper.reuseLayer(
+                self, posn, lambda: self.renderCacheKey(axes),
+                clip=cliprect):
+            painter = painthelper.painter(self, posn, clip=cliprect)
+            with painter:
+                self.dataDraw(painter, axes, posn, cliprect)
 
         for c in self.children:
             c.draw(posn, painthelper, outerbounds)
@@ -180,6 +188,49 @@ class GenericPlotter(widget.Widget):
         """Actually plot the data."""
         pass
 
+    def renderCacheKey(self, axes):
+        """Return key for reusing the drawing of the plotter from an
+        earlier paint, or None if it should not be reused.
+
+        The key includes the settings and datasets of the plotter and
+        its axes, and the custom definitions. Plotters with expressions
+        using data not in their settings, such as DATA() or SETTING(),
+        are not reused.
+        """
+
+        doc = self.document
+        if _usesImpure(self.settings, doc.evaluate.impurecustoms):
+            return None
+
+        axeskeys = []
+        for axis in axes:
+            state = axis.coordinateState()
+            if state is None:
+                return None
+            axeskeys.append(
+                (document.settingsDigest(axis.settings, doc), state))
+
+        return (
+            document.settingsDigest(self.settings, doc),
+            tuple(axeskeys),
+            repr(doc.evaluate.customs),
+        )
+
+def _usesImpure(settings, impurecustoms):
+    """Do any text settings use functions or custom definitions whose
+    values depend on more than their arguments?"""
+
+    for s in settings.getList():
+        if isinstance(s, setting.Settings):
+            if _usesImpure(s, impurecustoms):
+                return True
+        elif isinstance(s.val, cbasestr):
+            if ( evaluate.impure_re.search(s.val) or
+                 not impurecustoms.isdisjoint(
+                    evaluate.identifier_split_re.findall(s.val)) ):
+                return True
+    return False
+
 class FreePlotter(widget.Widget):
     """A plotter which can be plotted on the page or in a graph."""
 
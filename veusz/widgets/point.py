@@ -247,6 +247,31 @@ def _errorBarsFilled(style, xmin, xmax, ymin, ymax, xplotter, yplotter,
     utils.plotClippedPolyline(painter, clip, ptsabove)
     utils.plotClippedPolyline(painter, clip, ptsbelow)
 
+def _segmentParts(segments, xplotter, yplotter, xdata, ydata):
+    """Yield (xplotter, yplotter, xdata, ydata) for each segment.
+    If there is a single segment, the values are not copied."""
+    if len(segments) == 1:
+        yield xplotter, yplotter, xdata, ydata
+        return
+    for start, end in segments:
+        yield ( xplotter[start:end], yplotter[start:end],
+                xdata[start:end], ydata[start:end] )
+
+def _sliceOrNone(vals, sl):
+    """Return slice of array, or None if None."""
+    return None if vals is None else vals[sl]
+
+def _thinSegments(segments, thin):
+    """Thin every run of points in segments, starting at the first
+    point of each run.
+
+    Returns the indices of the points kept and the segments of the
+    thinned points.
+    """
+    idx = [N.arange(start, end, thin) for start, end in segments]
+    bounds = N.cumsum([0] + [len(i) for i in idx]).tolist()
+    return N.concatenate(idx), list(czip(bounds[:-1], bounds[1:]))
+
 # map error bar names to lists of functions (above)
 _errorBarFunctionMap = {
     'none': (),
@@ -365,6 +390,14 @@ class PointPlotter(GenericPlotter):
                     ' for each datapoint by this factor'),
             usertext=_('Thin markers'),
             formatting=True), 0 )
+        s.add( setting.Bool(
+            'decimate', False,
+            descr=_('Skip drawing line points and opaque markers hidden'
+                    ' by later markers at the output resolution. This is'
+                    ' faster for large datasets, but lines and marker'
+                    ' edges may differ by up to a pixel'),
+            usertext=_('Decimate'),
+            formatting=True), 0 )
         s.add( setting.Color(
             'color',
             'black',
@@ -439,8 +472,11 @@ class PointPlotter(GenericPlotter):
             s.xData, s.yData, s.marker)
 
     def _plotErrors(self, posn, painter, xplotter, yplotter,
-                    axes, xdata, ydata, cliprect):
+                    axes, xdata, ydata, cliprect, segments=None):
         """Plot error bars (horizontal and vertical).
+
+        segments is an optional list of (start, end) indices of runs of
+        points, which are used for error styles joining the points.
         """
 
         s = self.settings
@@ -448,8 +484,14 @@ class PointPlotter(GenericPlotter):
         if style == 'none':
             return
 
-        # optional thinning of error bars plotted
+        if segments is None:
+            segments = [(0, len(xplotter))]
+
+        # optional thinning of error bars plotted, separately in each
+        # run of points
         thin = s.errorthin
+        if thin > 1:
+            thinidx, segments = _thinSegments(segments, thin)
 
         # default is no error bars
         xmin = xmax = ymin = ymax = None
@@ -458,7 +500,7 @@ class PointPlotter(GenericPlotter):
         if xdata.hasErrors():
             xmin, xmax = xdata.getPointRanges()
             if thin>1:
-                xmin, xmax = xmin[::thin], xmax[::thin]
+                xmin, xmax = xmin[thinidx], xmax[thinidx]
 
             # convert xmin and xmax to graph coordinates
             xmin = axes[0].dataToPlotterCoords(posn, xmin)
@@ -468,7 +510,7 @@ class PointPlotter(GenericPlotter):
         if ydata.hasErrors():
             ymin, ymax = ydata.getPointRanges()
             if thin>1:
-                ymin, ymax = ymin[::thin], ymax[::thin]
+                ymin, ymax = ymin[thinidx], ymax[thinidx]
 
             # convert ymin and ymax to graph coordinates
             ymin = axes[1].dataToPlotterCoords(posn, ymin)
@@ -479,7 +521,7 @@ class PointPlotter(GenericPlotter):
             return
 
         if thin>1:
-            xplotter, yplotter = xplotter[::thin], yplotter[::thin]
+            xplotter, yplotter = xplotter[thinidx], yplotter[thinidx]
 
         # iterate to call the error bars functions required to draw style
         pen = s.ErrorBarLine.makeQPenWHide(painter)
@@ -487,8 +529,17 @@ class PointPlotter(GenericPlotter):
 
         painter.setPen(pen)
         for function in _errorBarFunctionMap[style]:
-            function(style, xmin, xmax, ymin, ymax,
-                     xplotter, yplotter, s, painter, cliprect)
+            if function is _errorBarsFilled and len(segments) > 1:
+                # do not join error regions across invalid points
+                for start, end in segments:
+                    sl = slice(start, end)
+                    function(style, _sliceOrNone(xmin, sl),
+                             _sliceOrNone(xmax, sl), _sliceOrNone(ymin, sl),
+                             _sliceOrNone(ymax, sl),
+                             xplotter[sl], yplotter[sl], s, painter, cliprect)
+            else:
+                function(style, xmin, xmax, ymin, ymax,
+                         xplotter, yplotter, s, painter, cliprect)
 
     def affectsAxisRange(self):
         """This widget provides range information about these axes."""
@@ -666,6 +717,136 @@ class PointPlotter(GenericPlotter):
         if not s.PlotLine.hide:
             painter.strokePath(path, s.PlotLine.makeQPen(painter))
 
+    def _canDrawLineSegments(self):
+        """Can the line be drawn as a single multi-segment path?"""
+        s = self.settings
+        return ( s.PlotLine.steps == 'off' and
+                 s.FillBelow.hide and s.FillAbove.hide )
+
+    def _drawPlotLineSegments(self, painter, xplotter, yplotter, segments,
+                              cliprect):
+        """Draw lines joining runs of points as a single path."""
+
+        s = self.settings
+        if s.PlotLine.hide:
+            return
+
+        # clip to a larger box, to avoid seeing line ends
+        bigclip = qt4.QRectF(
+            cliprect.left()-cliprect.width()*0.5,
+            cliprect.top()-cliprect.height()*0.5,
+            cliprect.width()*2, cliprect.height()*2)
+
+        path = qt4.QPainterPath()
+        for start, end in segments:
+            if end - start < 2:
+                continue
+            xp, yp = xplotter[start:end], yplotter[start:end]
+            pts = qt4.QPolygonF()
+            if hasqtloops:
+                utils.addNumpyToPolygonF(pts, xp, yp)
+                for part in qtloops.clipPolyline(bigclip, pts):
+                    path.addPolygon(part)
+            else:
+                # as in plotClippedPolyline, just limit the coordinates
+                utils.addNumpyToPolygonF(
+                    pts, N.clip(xp, -32767., 32767.),
+                    N.clip(yp, -32767., 32767.))
+                path.addPolygon(pts)
+
+        painter.setPen( s.PlotLine.makeQPen(painter) )
+        painter.setBrush( qt4.QBrush() )
+        painter.drawPath(path)
+
+    def _canDecimateLine(self):
+        """Can points be removed from the line, leaving the same
+        outline at the output resolution?"""
+        s = self.settings
+        return ( s.decimate and s.PlotLine.steps == 'off' and
+                 not s.PlotLine.bezierJoin and
+                 (s.PlotLine.hide or s.PlotLine.style == 'solid') )
+
+    def _canDecimateMarkers(self, cmap):
+        """Can markers hidden by later markers be removed? They must
+        be filled shapes drawn with opaque fills and borders."""
+        s = self.settings
+        fill, line = s.MarkerFill, s.MarkerLine
+        if ( not s.decimate or s.marker in utils.linesymbols or
+             s.marker.endswith('hole') ):
+            return False
+        if ( fill.hide or fill.transparency != 0 or fill.style != 'solid' or
+             qt4.QColor(fill.color).alpha() != 255 ):
+            return False
+        if not line.hide and (
+                line.transparency != 0 or line.style != 'solid' or
+                qt4.QColor(line.color).alpha() != 255 ):
+            return False
+        # colormaps can be transparent (ignoring step mode marker)
+        if cmap is not None and any((c[3] != 255 for c in cmap if c[0] >= 0)):
+            return False
+        return True
+
+    def _decimateLine(self, xplotter, yplotter, bounds):
+        """Remove points from a line which make little difference to
+        the image.
+
+        Returns the x and y plotter coordinates and list of segments
+        of the line to plot.
+        """
+
+        keep = None
+        if self._canDecimateLine():
+            keep = utils.decimateLine(xplotter, yplotter, bounds[1:-1])
+        if keep is None:
+            return xplotter, yplotter, list(czip(bounds[:-1], bounds[1:]))
+
+        newbounds = N.concatenate(([0], N.cumsum(keep)))[bounds]
+        return ( xplotter[keep], yplotter[keep],
+                 list(czip(newbounds[:-1], newbounds[1:])) )
+
+    def _visibleLinePoints(self, painter, axes, posn, cliprect, xv, yv):
+        """If only a line is drawn through points with sorted x
+        values, return datasets of the points needed to draw it at the
+        output resolution, as decimated by _decimateLine. Otherwise
+        return xv and yv.
+
+        The points are chosen using the pyramids of minimum and maximum
+        values of the y data, so that the time taken depends on the
+        number of pixels, not the number of points.
+        """
+
+        s = self.settings
+        if ( not self._canDecimateLine() or
+             (s.marker != 'none' and not (
+                 s.MarkerLine.hide and s.MarkerFill.hide)) or
+             xv.hasErrors() or yv.hasErrors() or
+             not getattr(axes[0], 'monotoniccoords', False) or
+             not getattr(axes[1], 'monotoniccoords', False) or
+             not hasattr(xv, 'getPyramid') or
+             not hasattr(yv, 'getPyramid') ):
+            return xv, yv
+
+        xdata, ydata = xv.data, yv.data
+        numpts = min(len(xdata), len(ydata))
+        if ( numpts < utils.decimateminpoints or
+             not xv.getPyramid().ascending or not yv.getPyramid().finite ):
+            return xv, yv
+
+        # drop points further than this outside the clip region
+        margin = s.PlotLine.get('width').convert(painter) + 1
+        if axes[0].settings.direction == 'horizontal':
+            lo, hi = cliprect.left()-margin, cliprect.right()+margin
+        else:
+            lo, hi = cliprect.top()-margin, cliprect.bottom()+margin
+
+        idx = yv.getPyramid().selectIndices(
+            numpts, lambda i: axes[0].dataToPlotterCoords(posn, xdata[i]),
+            lo, hi, utils.linecellsize)
+        if len(idx)*2 > numpts:
+            return xv, yv
+        return datasets.Dataset(data=xdata[idx]), datasets.Dataset(
+            data=ydata[idx])
+
     def _drawPlotLine( self, painter, xvals, yvals, posn, xdata, ydata,
                        cliprect ):
         """Draw the line connecting the points."""
@@ -795,16 +976,19 @@ class PointPlotter(GenericPlotter):
             return (text, yv.data)
 
     def _pickable(self, bounds):
-        axes = self.fetchAxes()
+        def make():
+            axes = self.fetchAxes()
 
-        if axes is None:
-            map_fn = None
-        else:
-            map_fn = lambda x, y: (
-                axes[0].dataToPlotterCoords(bounds, x),
-                axes[1].dataToPlotterCoords(bounds, y) )
+            if axes is None:
+                map_fn = None
+            else:
+                map_fn = lambda x, y: (
+                    axes[0].dataToPlotterCoords(bounds, x),
+                    axes[1].dataToPlotterCoords(bounds, y) )
+
+            return pickable.DiscretePickable(self, 'xData', 'yData', map_fn)
 
-        return pickable.DiscretePickable(self, 'xData', 'yData', map_fn)
+        return pickable.cachedPickable(self, tuple(bounds), make)
 
     def pickPoint(self, x0, y0, bounds, distance = 'radial'):
         return self._pickable(bounds).pickPoint(x0, y0, bounds, distance)
@@ -850,111 +1034,146 @@ class PointPlotter(GenericPlotter):
         if text:
             length = min( len(xv.data), len(yv.data) )
             text = text*(length // len(text)) + text[:length % len(text)]
+        elif not scalepoints and not colorpoints:
+            xv, yv = self._visibleLinePoints(
+                painter, axes, posn, cliprect, xv, yv)
+
+        # remove invalid points, keeping track of the runs of valid
+        # points, which are joined by lines
+        (xvals, yvals, tvals, ptvals, cvals), bounds = (
+            datasets.validDatasetSegments(
+                [xv, yv, text, scalepoints, colorpoints]))
+        segments = list(czip(bounds[:-1], bounds[1:]))
+        if bounds[-1] == 0:
+            return
 
-        # loop over chopped up values
-        for xvals, yvals, tvals, ptvals, cvals in (
-            datasets.generateValidDatasetParts(
-                [xv, yv, text, scalepoints, colorpoints])):
-
-            #print "Calculating coordinates"
-            # calc plotter coords of x and y points
-            xplotter = axes[0].dataToPlotterCoords(posn, xvals.data)
-            yplotter = axes[1].dataToPlotterCoords(posn, yvals.data)
+        #print "Calculating coordinates"
+        # calc plotter coords of x and y points
+        xplotter = axes[0].dataToPlotterCoords(posn, xvals.data)
+        yplotter = axes[1].dataToPlotterCoords(posn, yvals.data)
 
-            # points are plotted offset in shift-points modes
-            if s.PlotLine.steps != 'off':
-                xpltpoint = N.array(xplotter)
+        # points are plotted offset in shift-points modes
+        if s.PlotLine.steps != 'off':
+            xpltpoint = N.array(xplotter)
+            for start, end in segments:
+                xp = xplotter[start:end]
                 if s.PlotLine.steps == 'right-shift-points':
-                    xpltpoint[1:] = 0.5*(xplotter[:-1] + xplotter[1:])
+                    xpltpoint[start+1:end] = 0.5*(xp[:-1] + xp[1:])
                 elif s.PlotLine.steps == 'left-shift-points':
-                    xpltpoint[:-1] = 0.5*(xplotter[:-1] + xplotter[1:])
-            else:
-                xpltpoint = xplotter
-            ypltpoint = yplotter
-
-            # plot filled error bars
-            if s.errorStyle in ('fillvert', 'fillhorz'):
-                # filled region errors are painted first
-                self._plotErrors(
-                    posn, painter, xpltpoint, ypltpoint,
-                    axes, xvals, yvals, cliprect)
-
-            #print "Painting plot line"
-            # plot data line (and/or filling above or below)
-            if not s.PlotLine.hide or not s.FillAbove.hide or not s.FillBelow.hide:
-                if s.PlotLine.bezierJoin and hasqtloops:
+                    xpltpoint[start:end-1] = 0.5*(xp[:-1] + xp[1:])
+        else:
+            xpltpoint = xplotter
+        ypltpoint = yplotter
+
+        # plot filled error bars
+        if s.errorStyle in ('fillvert', 'fillhorz'):
+            # filled region errors are painted first
+            self._plotErrors(
+                posn, painter, xpltpoint, ypltpoint,
+                axes, xvals, yvals, cliprect, segments)
+
+        #print "Painting plot line"
+        # plot data line (and/or filling above or below)
+        if not s.PlotLine.hide or not s.FillAbove.hide or not s.FillBelow.hide:
+            if s.PlotLine.bezierJoin and hasqtloops:
+                for xp, yp, xd, yd in _segmentParts(
+                        segments, xplotter, yplotter, xvals, yvals):
                     self._drawBezierLine(
-                        painter, xplotter, yplotter, posn,
-                        xvals, yvals, cliprect )
-                else:
-                    self._drawPlotLine(
-                        painter, xplotter, yplotter, posn,
-                        xvals, yvals, cliprect )
-
-            #print "Painting error bars"
-            # plot normal errors bars
-            if s.errorStyle not in ('fillvert', 'fillhorz'):
-                # normally the error bar is painted after the line
-                self._plotErrors(posn, painter, xpltpoint, ypltpoint,
-                                 axes, xvals, yvals, cliprect)
-
-            # plot the points (we do this last so they are on top)
-            markersize = s.get('markerSize').convert(painter)
-            if not s.MarkerLine.hide or not s.MarkerFill.hide:
-
-                #print "Painting marker fill"
-                if not s.MarkerFill.hide:
-                    # filling for markers
-                    painter.setBrush( s.MarkerFill.makeQBrush() )
+                        painter, xp, yp, posn, xd, yd, cliprect )
+            else:
+                xline, yline, linesegs = self._decimateLine(
+                    xplotter, yplotter, bounds)
+                if len(linesegs) > 1 and self._canDrawLineSegments():
+                    self._drawPlotLineSegments(
+                        painter, xline, yline, linesegs, cliprect)
+                elif xline is not xplotter:
+                    # decimated lines are not stepped, so need no data
+                    for start, end in linesegs:
+                        self._drawPlotLine(
+                            painter, xline[start:end], yline[start:end],
+                            posn, None, None, cliprect )
                 else:
-                    # no-filling brush
-                    painter.setBrush( qt4.QBrush() )
+                    for xp, yp, xd, yd in _segmentParts(
+                            segments, xplotter, yplotter, xvals, yvals):
+                        self._drawPlotLine(
+                            painter, xp, yp, posn, xd, yd, cliprect )
+
+        #print "Painting error bars"
+        # plot normal errors bars (the error bars of all the runs of
+        # points are drawn before any of the markers)
+        if s.errorStyle not in ('fillvert', 'fillhorz'):
+            # normally the error bar is painted after the line
+            self._plotErrors(posn, painter, xpltpoint, ypltpoint,
+                             axes, xvals, yvals, cliprect, segments)
+
+        # plot the points (we do this last so they are on top)
+        markersize = s.get('markerSize').convert(painter)
+        if not s.MarkerLine.hide or not s.MarkerFill.hide:
 
-                #print "Painting marker lines"
-                if not s.MarkerLine.hide:
-                    # edges of markers
-                    painter.setPen( s.MarkerLine.makeQPen(painter) )
-                else:
-                    # invisible pen
-                    painter.setPen( qt4.QPen(qt4.Qt.NoPen) )
+            #print "Painting marker fill"
+            if not s.MarkerFill.hide:
+                # filling for markers
+                painter.setBrush( s.MarkerFill.makeQBrush() )
+            else:
+                # no-filling brush
+                painter.setBrush( qt4.QBrush() )
 
-                # thin datapoints as required
-                if s.thinfactor <= 1:
-                    xplt, yplt = xpltpoint, ypltpoint
-                else:
-                    xplt, yplt = (
-                        xpltpoint[::s.thinfactor],
-                        ypltpoint[::s.thinfactor])
-
-                # whether to scale markers
-                scaling = colorvals = cmap = None
-                if ptvals:
-                    scaling = ptvals.data
-                    if s.thinfactor > 1:
-                        scaling = scaling[::s.thinfactor]
-
-                # color point individually
-                if cvals and not s.MarkerFill.hide:
-                    colorvals = utils.applyScaling(
-                        cvals.data, s.Color.scaling,
-                        s.Color.min, s.Color.max)
-                    if s.thinfactor > 1:
-                        colorvals = colorvals[::s.thinfactor]
-                    cmap = self.document.evaluate.getColormap(
-                        s.MarkerFill.colorMap, s.MarkerFill.colorMapInvert)
-
-                # actually plot datapoints
-                utils.plotMarkers(
-                    painter, xplt, yplt, s.marker, markersize,
-                    scaling=scaling, clip=cliprect,
-                    cmap=cmap, colorvals=colorvals,
-                    scaleline=s.MarkerLine.scaleLine)
-
-            # finally plot any labels
-            if tvals and not s.Label.hide:
-                self.drawLabels(
-                    painter, xpltpoint, ypltpoint,
-                    tvals, markersize)
+            #print "Painting marker lines"
+            if not s.MarkerLine.hide:
+                # edges of markers
+                painter.setPen( s.MarkerLine.makeQPen(painter) )
+            else:
+                # invisible pen
+                painter.setPen( qt4.QPen(qt4.Qt.NoPen) )
+
+            # thin datapoints as required, separately in each run of
+            # valid points
+            thinidx = None
+            if s.thinfactor <= 1:
+                xplt, yplt = xpltpoint, ypltpoint
+            else:
+                thinidx = _thinSegments(segments, s.thinfactor)[0]
+                xplt, yplt = xpltpoint[thinidx], ypltpoint[thinidx]
+
+            # whether to scale markers
+            scaling = colorvals = cmap = None
+            if ptvals:
+                scaling = ptvals.data
+                if thinidx is not None:
+                    scaling = scaling[thinidx]
+
+            # color point individually
+            if cvals and not s.MarkerFill.hide:
+                colorvals = utils.applyScaling(
+                    cvals.data, s.Color.scaling,
+                    s.Color.min, s.Color.max)
+                if thinidx is not None:
+                    colorvals = colorvals[thinidx]
+                cmap = self.document.evaluate.getColormap(
+                    s.MarkerFill.colorMap, s.MarkerFill.colorMapInvert)
+
+            # remove markers hidden by later markers in the same pixel
+            if ( scaling is None and len(xplt) >= utils.decimateminpoints
+                 and self._canDecimateMarkers(cmap) ):
+                margin = markersize*2 + painter.pen().widthF()
+                idx = utils.decimateMarkers(
+                    xplt, yplt, cliprect, margin, colorvals=colorvals)
+                xplt, yplt = xplt[idx], yplt[idx]
+                if colorvals is not None:
+                    colorvals = colorvals[idx]
+
+            # actually plot datapoints
+            utils.plotMarkers(
+                painter, xplt, yplt, s.marker, markersize,
+                scaling=scaling, clip=cliprect,
+                cmap=cmap, colorvals=colorvals,
+                scaleline=s.MarkerLine.scaleLine)
+
+        # finally plot any labels
+        if tvals and not s.Label.hide:
+            self.drawLabels(
+                painter, xpltpoint, ypltpoint,
+                tvals, markersize)
 
 # allow the factory to instantiate an x,y plotter
 document.thefactory.register( PointPlotter )
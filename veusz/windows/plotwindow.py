@@ -22,6 +22,7 @@
 from __future__ import division
 import sys
 import traceback
+from collections import OrderedDict
 
 from ..compat import crange
 from .. import qtall as qt4
@@ -30,6 +31,7 @@ import numpy as N
 from .. import setting
 from ..dialogs import exceptiondialog
 from .. import document
+from ..document import RenderCache
 from .. import utils
 from .. import widgets
 
@@ -75,6 +77,14 @@ class RenderControl(qt4.QObject):
     signalRenderFinished = qt4.pyqtSignal(
         int, qt4.QImage, document.PaintHelper)
 
+    # painting the document in a rendering thread failed (exc_info)
+    signalRecordFailed = qt4.pyqtSignal(object)
+
+    # page of document painted and rendered in a rendering thread
+    # ((page, scaling, changeset), img, painthelper)
+    signalPageRendered = qt4.pyqtSignal(
+        object, qt4.QImage, document.PaintHelper)
+
     def __init__(self, plotwindow):
         """Start up numthreads rendering threads."""
         qt4.QObject.__init__(self)
@@ -85,6 +95,9 @@ class RenderControl(qt4.QObject):
         self.latestjobs = []
         self.latestaddedjob = -1
         self.latestdrawnjob = -1
+        self.latestsnapshot = None
+        self.idlejobs = []
+        self.idlesnapshots = []
         self.plotwindow = plotwindow
 
         self.updateNumberThreads()
@@ -100,7 +113,10 @@ class RenderControl(qt4.QObject):
                 num = 0
 
         if self.threads:
-            # delete old ones
+            # delete old ones, stopping any painting
+            if self.latestsnapshot is not None:
+                self.latestsnapshot.cancel()
+            self.cancelIdleJobs()
             self.exit = True
             self.sem.release(len(self.threads))
             for t in self.threads:
@@ -123,26 +139,32 @@ class RenderControl(qt4.QObject):
 
         emits renderfinished(jobid, img, painthelper)
         when done, if job has not been superseded
+
+        Idle jobs are only processed if there are no other jobs.
         """
 
         self.mutex.lock()
-        jobid, helper = self.latestjobs[-1]
+        if not self.latestjobs:
+            idlejob = self.idlejobs.pop(0) if self.idlejobs else None
+            self.mutex.unlock()
+            if idlejob is not None:
+                self.processIdleJob(*idlejob)
+            return
+
+        jobid, helper, snapshot, page = self.latestjobs[-1]
         del self.latestjobs[-1]
         lastadded = self.latestaddedjob
         self.mutex.unlock()
 
+        if lastadded == jobid and snapshot is not None:
+            helper = self.recordJob(jobid, helper, snapshot, page)
+
         # don't process jobs which have been superseded
-        if lastadded == jobid:
-            img = qt4.QImage(helper.pagesize[0], helper.pagesize[1],
-                             qt4.QImage.Format_ARGB32_Premultiplied)
-            img.fill( setting.settingdb.color('page').rgb() )
-
-            painter = qt4.QPainter(img)
-            aa = self.plotwindow.antialias
-            painter.setRenderHint(qt4.QPainter.Antialiasing, aa)
-            painter.setRenderHint(qt4.QPainter.TextAntialiasing, aa)
-            helper.renderToPainter(painter)
-            painter.end()
+        if lastadded == jobid and helper is not None:
+            img = self.renderImage(helper)
+            if snapshot is not None:
+                self.signalPageRendered.emit(
+                    (page, helper.scaling, snapshot.changeset), img, helper)
 
             self.mutex.lock()
             # just throw away result if it older than the latest one
@@ -154,8 +176,65 @@ class RenderControl(qt4.QObject):
         # tell any listeners that a job has been processed
         self.sigQueueChange.emit(-1)
 
-    def addJob(self, helper):
-        """Process drawing job in PaintHelper given."""
+    def renderImage(self, helper):
+        """Render painted helper to an image."""
+        img = qt4.QImage(helper.pagesize[0], helper.pagesize[1],
+                         qt4.QImage.Format_ARGB32_Premultiplied)
+        img.fill( setting.settingdb.color('page').rgb() )
+
+        # large images are rendered in tiles using several threads
+        helper.renderToImage(
+            img, antialias=helper.antialias,
+            numthreads=len(self.threads))
+        return img
+
+    def processIdleJob(self, helper, snapshot, page):
+        """Paint and render page of snapshot, emitting
+        signalPageRendered if it is not cancelled."""
+
+        try:
+            snapshot.paintTo(helper, page)
+        except document.PaintCancelled:
+            return
+        except Exception:
+            # errors are shown if the page is shown
+            return
+
+        img = self.renderImage(helper)
+        if not snapshot.cancelled:
+            self.signalPageRendered.emit(
+                (page, helper.scaling, snapshot.changeset), img, helper)
+
+    def recordJob(self, jobid, helper, snapshot, page):
+        """Paint page of document snapshot into helper.
+
+        If painting is cancelled by a change to the document, it is
+        repeated into a new helper, unless a newer job has been added.
+        Returns the helper painted, or None if cancelled.
+        """
+
+        while True:
+            try:
+                snapshot.paintTo(helper, page)
+                return helper
+            except document.PaintCancelled:
+                if snapshot.cancelled or self.latestaddedjob != jobid:
+                    return None
+                helper = document.PaintHelper(
+                    helper.pagesize, scaling=helper.scaling, dpi=helper.dpi,
+                    rendercache=helper.rendercache, bitmap=helper.bitmap,
+                    antialias=helper.antialias)
+            except Exception:
+                # show what was painted, as when painting directly
+                self.signalRecordFailed.emit(sys.exc_info())
+                return helper
+
+    def addJob(self, helper, snapshot=None, page=None):
+        """Process drawing job in PaintHelper given.
+
+        If snapshot is given, page of the DocumentSnapshot is painted
+        into helper first in the rendering thread.
+        """
 
         # indicate that there is a new item to be processed to listeners
         self.sigQueueChange.emit(1)
@@ -163,9 +242,17 @@ class RenderControl(qt4.QObject):
         # add the job to the queue
         self.mutex.lock()
         self.latestaddedjob += 1
-        self.latestjobs.append( (self.latestaddedjob, helper) )
+        self.latestjobs.append(
+            (self.latestaddedjob, helper, snapshot, page) )
+        if self.latestsnapshot is not None:
+            # stop painting superseded snapshot
+            self.latestsnapshot.cancel()
+        self.latestsnapshot = snapshot
         self.mutex.unlock()
 
+        # new jobs take priority over idle jobs
+        self.cancelIdleJobs()
+
         if self.threads:
             # tell a thread to process job
             self.sem.release(1)
@@ -173,6 +260,47 @@ class RenderControl(qt4.QObject):
             # process job in current thread if multithreading disabled
             self.processNextJob()
 
+    def addIdleJob(self, helper, snapshot, page):
+        """Paint and render page of DocumentSnapshot into helper when
+        there are no other jobs, emitting signalPageRendered.
+
+        Idle jobs are cancelled when another job is added, and are
+        not processed without rendering threads. Jobs for a page and
+        scaling already queued are ignored.
+        """
+
+        if not self.threads:
+            return
+
+        self.mutex.lock()
+        queued = any( (p == page and h.scaling == helper.scaling)
+                      for h, s, p in self.idlejobs )
+        if not queued:
+            self.idlejobs.append( (helper, snapshot, page) )
+            self.idlesnapshots.append(snapshot)
+        self.mutex.unlock()
+        if not queued:
+            self.sem.release(1)
+
+    def cancelIdleJobs(self):
+        """Remove queued idle jobs and stop any being processed."""
+        self.mutex.lock()
+        for snapshot in self.idlesnapshots:
+            snapshot.cancel()
+        del self.idlejobs[:]
+        del self.idlesnapshots[:]
+        self.mutex.unlock()
+
+    def supersedeJobs(self):
+        """Throw away results of jobs which have been added."""
+        self.mutex.lock()
+        self.latestaddedjob += 1
+        self.latestdrawnjob = self.latestaddedjob
+        if self.latestsnapshot is not None:
+            self.latestsnapshot.cancel()
+        self.latestsnapshot = None
+        self.mutex.unlock()
+
 class RenderThread( qt4.QThread ):
     """A thread for processing rendering jobs.
     This is controlled by a RenderControl object
@@ -208,6 +336,58 @@ class ControlGraphRoot(qt4.QGraphicsItem):
     def boundingRect(self):
         return qt4.QRectF()
 
+def pageKey(page, zoom, changeset, dpi, antialias):
+    """Key for page rendered at zoom for document changeset, with
+    the screen dpi and antialiasing given."""
+    # zooming in and out again may not give exactly the same zoom
+    return (page, round(zoom, 6), changeset, tuple(dpi), bool(antialias))
+
+class PageImageCache(object):
+    """Least-recently-used cache of rendered pages.
+
+    Entries are (image, painthelper) pairs keyed by pageKey. The total
+    size of the images is kept below maxbytes.
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+    def clear(self):
+        """Remove all entries."""
+        self.entries.clear()
+        self.nbytes = 0
+
+    def _remove(self, key):
+        img = self.entries.pop(key)[0]
+        self.nbytes -= img.bytesPerLine()*img.height()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return (image, painthelper) for key or None."""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.entries[key] = entry
+        return entry
+
+    def add(self, key, img, helper):
+        """Store image and helper, removing entries for other document
+        changesets and the least recently used entries if too large."""
+
+        for k in [k for k in self.entries if k[2] != key[2] or k == key]:
+            self._remove(k)
+
+        size = img.bytesPerLine()*img.height()
+        if size > self.maxbytes:
+            return
+        while self.entries and self.nbytes+size > self.maxbytes:
+            self._remove(next(iter(self.entries)))
+        self.entries[key] = (img, helper)
+        self.nbytes += size
+
 class PlotWindow( qt4.QGraphicsView ):
     """Class to show the plot(s) in a scrollable window."""
 
@@ -289,6 +469,12 @@ class PlotWindow( qt4.QGraphicsView ):
 
         # state of last plot from painthelper
         self.painthelper = None
+        # recorded layers of unchanged widgets are reused between plots
+        # (the document argument hides the module here)
+        self.rendercache = RenderCache()
+        # pages rendered in advance, and recently shown
+        self.pagecache = PageImageCache(
+            setting.settingdb['plot_prerendermemory']*1024*1024)
 
         self.lastwidgetsselected = []
         self.oldzoom = -1.
@@ -300,6 +486,10 @@ class PlotWindow( qt4.QGraphicsView ):
         self.rendercontrol = RenderControl(self)
         self.rendercontrol.signalRenderFinished.connect(
             self.slotRenderFinished)
+        self.rendercontrol.signalRecordFailed.connect(
+            self.slotRecordFailed)
+        self.rendercontrol.signalPageRendered.connect(
+            self.slotPageRendered)
         self.rendercontrol.sigQueueChange.connect(
             self.sigQueueChange)
 
@@ -601,20 +791,28 @@ class PlotWindow( qt4.QGraphicsView ):
         pos = self.mapToScene(mousepos)
         px, py = pos.x(), pos.y()
 
+        # axes are not available while painting in another thread
+        if not self.document.changelock.acquire(False):
+            return []
+
         axes = []
-        for widget, bounds in self.painthelper.widgetBoundsIterator(
-            widgettype=widgets.Axis):
-            # if widget is axis, and point lies within bounds
-            if ( px>=bounds[0] and px<=bounds[2] and
-                 py>=bounds[1] and py<=bounds[3] ):
-
-                # convert correct pointer position
-                if widget.settings.direction == 'horizontal':
-                    val = px
-                else:
-                    val = py
-                coords=widget.plotterToGraphCoords(bounds, N.array([val]))
-                axes.append( (widget, coords[0]) )
+        try:
+            for widget, bounds in self.painthelper.widgetBoundsIterator(
+                widgettype=widgets.Axis):
+                # if widget is axis, and point lies within bounds
+                if ( px>=bounds[0] and px<=bounds[2] and
+                     py>=bounds[1] and py<=bounds[3] ):
+
+                    # convert correct pointer position
+                    if widget.settings.direction == 'horizontal':
+                        val = px
+                    else:
+                        val = py
+                    coords=widget.plotterToGraphCoords(
+                        bounds, N.array([val]))
+                    axes.append( (widget, coords[0]) )
+        finally:
+            self.document.changelock.release()
 
         return axes
 
@@ -628,6 +826,17 @@ class PlotWindow( qt4.QGraphicsView ):
     def doPick(self, mousepos):
         """Find the point on any plot-like widget closest to the cursor"""
 
+        # skip picking while painting in another thread
+        if not self.document.changelock.acquire(False):
+            return
+        try:
+            self._doPickUnlocked(mousepos)
+        finally:
+            self.document.changelock.release()
+
+    def _doPickUnlocked(self, mousepos):
+        """Pick point, with document locked."""
+
         self.pickerwidgets = []
 
         pickinfo = widgets.PickInfo()
@@ -789,63 +998,77 @@ class PlotWindow( qt4.QGraphicsView ):
     def keyPressEvent(self, event):
         """Keypad motion moves the picker if it has focus"""
         if self.pickeritem.hasFocus():
-
-            k = event.key()
-            if k == qt4.Qt.Key_Left or k == qt4.Qt.Key_Right:
-                # navigate to the previous or next point on the curve
+            # skip moving picker while painting in another thread
+            if not self.document.changelock.acquire(False):
                 event.accept()
-                dir = 'right' if k == qt4.Qt.Key_Right else 'left'
-                ix = self.pickerinfo.index
-                pickinfo = self.pickerinfo.widget.pickIndex(
-                    ix, dir, self.painthelper.widgetBounds(
-                        self.pickerinfo.widget))
-                if pickinfo:
-                    # more points visible in this direction
-                    self.emitPicked(pickinfo)
                 return
+            try:
+                if self._pickerKeyPress(event):
+                    return
+            finally:
+                self.document.changelock.release()
 
-            elif k == qt4.Qt.Key_Up or k == qt4.Qt.Key_Down:
-                # navigate to the next plot up or down on the screen
-                event.accept()
-                p = self.pickeritem.pos()
+        # handle up-stream
+        qt4.QGraphicsView.keyPressEvent(self, event)
 
-                oldw = self.pickerinfo.widget
-                pickinfo = widgets.PickInfo()
+    def _pickerKeyPress(self, event):
+        """Move picker for key, returning True if handled."""
 
-                dist = float('inf')
-                for w in self.pickerwidgets:
-                    if w == oldw:
-                        continue
+        k = event.key()
+        if k == qt4.Qt.Key_Left or k == qt4.Qt.Key_Right:
+            # navigate to the previous or next point on the curve
+            event.accept()
+            dir = 'right' if k == qt4.Qt.Key_Right else 'left'
+            ix = self.pickerinfo.index
+            pickinfo = self.pickerinfo.widget.pickIndex(
+                ix, dir, self.painthelper.widgetBounds(
+                    self.pickerinfo.widget))
+            if pickinfo:
+                # more points visible in this direction
+                self.emitPicked(pickinfo)
+            return True
+
+        elif k == qt4.Qt.Key_Up or k == qt4.Qt.Key_Down:
+            # navigate to the next plot up or down on the screen
+            event.accept()
+            p = self.pickeritem.pos()
 
-                    # ask the widgets to pick their point which is closest horizontally
-                    # to the last (screen) x value picked
-                    pi = w.pickPoint(self.pickerinfo.screenpos[0], p.y(),
-                                     self.painthelper.widgetBounds(w),
-                                     distance='horizontal')
-                    if not pi:
-                        continue
+            oldw = self.pickerinfo.widget
+            pickinfo = widgets.PickInfo()
 
-                    dy = p.y() - pi.screenpos[1]
+            dist = float('inf')
+            for w in self.pickerwidgets:
+                if w == oldw:
+                    continue
 
-                    # take the new point which is closest vertically to the current
-                    # one and either above or below it as appropriate
-                    if abs(dy) < dist and ( (k == qt4.Qt.Key_Up and dy > 0)
-                            or (k == qt4.Qt.Key_Down and dy < 0) ):
-                        pickinfo = pi
-                        dist = abs(dy)
+                # ask the widgets to pick their point which is closest horizontally
+                # to the last (screen) x value picked
+                pi = w.pickPoint(self.pickerinfo.screenpos[0], p.y(),
+                                 self.painthelper.widgetBounds(w),
+                                 distance='horizontal')
+                if not pi:
+                    continue
 
-                if pickinfo:
-                    oldx = self.pickerinfo.screenpos[0]
-                    self.emitPicked(pickinfo)
+                dy = p.y() - pi.screenpos[1]
 
-                    # restore the previous x-position, so that vertical navigation
-                    # stays repeatable
-                    pickinfo.screenpos = (oldx, pickinfo.screenpos[1])
+                # take the new point which is closest vertically to the current
+                # one and either above or below it as appropriate
+                if abs(dy) < dist and ( (k == qt4.Qt.Key_Up and dy > 0)
+                        or (k == qt4.Qt.Key_Down and dy < 0) ):
+                    pickinfo = pi
+                    dist = abs(dy)
 
-                return
+            if pickinfo:
+                oldx = self.pickerinfo.screenpos[0]
+                self.emitPicked(pickinfo)
 
-        # handle up-stream
-        qt4.QGraphicsView.keyPressEvent(self, event)
+                # restore the previous x-position, so that vertical navigation
+                # stays repeatable
+                pickinfo.screenpos = (oldx, pickinfo.screenpos[1])
+
+            return True
+
+        return False
 
     def wheelEvent(self, event):
         """For zooming in or moving."""
@@ -929,6 +1152,11 @@ class PlotWindow( qt4.QGraphicsView ):
         """Check whether plot needs updating."""
 
         # print >>sys.stderr, "checking update"
+        # events are processed while waiting for the evaluation worker,
+        # so do not start another update from inside this one
+        if self.document.evaluate.workerBusy():
+            return
+
         # no threads, so can't get interrupted here
         # draw data into background pixmap if modified
         if ( self.zoomfactor != self.oldzoom or
@@ -946,22 +1174,47 @@ class PlotWindow( qt4.QGraphicsView ):
                 size = self.document.pageSize(
                     self.pagenumber, scaling=self.zoomfactor)
 
-                # draw the data into the buffer
-                # errors cause an exception window to pop up
-                try:
-                    phelper = document.PaintHelper(
-                        size, scaling=self.zoomfactor, dpi=self.dpi)
-                    self.document.paintTo(phelper, self.pagenumber)
-
-                except Exception:
-                    # stop updates this time round and show exception dialog
-                    d = exceptiondialog.ExceptionDialog(sys.exc_info(), self)
-                    self.oldzoom = self.zoomfactor
-                    self.docchangeset = self.document.changeset
-                    d.exec_()
-
-                self.painthelper = phelper
-                self.rendercontrol.addJob(phelper)
+                phelper = document.PaintHelper(
+                    size, scaling=self.zoomfactor, dpi=self.dpi,
+                    rendercache=self.rendercache, bitmap=True,
+                    antialias=self.antialias)
+
+                cached = self.pagecache.get(pageKey(
+                    self.pagenumber, self.zoomfactor,
+                    self.document.changeset, self.dpi, self.antialias))
+                if cached is not None:
+                    # use page rendered in advance
+                    self.rendercontrol.supersedeJobs()
+                    self.showRenderedPage(*cached)
+                    self.prerenderPages()
+
+                elif ( self.rendercontrol.threads and
+                       setting.settingdb['plot_threadedrecord'] ):
+                    # draw the data into the buffer in a rendering
+                    # thread, keeping the last helper until finished
+                    self.rendercontrol.addJob(
+                        phelper, snapshot=document.DocumentSnapshot(
+                            self.document),
+                        page=self.pagenumber)
+                else:
+                    # draw the data into the buffer
+                    # errors cause an exception window to pop up
+                    try:
+                        self.document.paintTo(phelper, self.pagenumber)
+                        self.rendercache.finishPaint()
+
+                    except Exception:
+                        # stop updates this time round and show
+                        # exception dialog
+                        self.rendercache.abortPaint()
+                        d = exceptiondialog.ExceptionDialog(
+                            sys.exc_info(), self)
+                        self.oldzoom = self.zoomfactor
+                        self.docchangeset = self.document.changeset
+                        d.exec_()
+
+                    self.painthelper = phelper
+                    self.rendercontrol.addJob(phelper)
             else:
                 self.painthelper = None
                 self.pagenumber = 0
@@ -981,15 +1234,74 @@ class PlotWindow( qt4.QGraphicsView ):
     def slotRenderFinished(self, jobid, img, helper):
         """Update image on display if rendering (usually in other
         thread) finished."""
+        self.showRenderedPage(img, helper)
+        if jobid == self.rendercontrol.latestaddedjob:
+            self.prerenderPages()
+
+    def showRenderedPage(self, img, helper):
+        """Show image of page, rendered using helper."""
         bufferpixmap = qt4.QPixmap.fromImage(img)
         self.setSceneRect(0, 0, bufferpixmap.width(), bufferpixmap.height())
         self.pixmapitem.setPixmap(bufferpixmap)
 
+        if helper is not self.painthelper:
+            # document was painted in the rendering thread
+            self.painthelper = helper
+            self.updateControlGraphs(self.lastwidgetsselected)
+
+    def slotPageRendered(self, key, img, helper):
+        """Keep page rendered in a rendering thread, if up to date."""
+        page, zoom, changeset = key
+        if changeset == self.document.changeset:
+            self.pagecache.add(
+                pageKey(page, zoom, changeset, helper.dpi, helper.antialias),
+                img, helper)
+
+    def prerenderPages(self):
+        """Render the pages either side of the current page and the
+        current page at the next zoom levels, while the rendering
+        threads are idle."""
+
+        if ( not self.rendercontrol.threads or
+             not setting.settingdb['plot_threadedrecord'] or
+             self.pagecache.maxbytes <= 0 or
+             self.pagenumber < 0 ):
+            return
+
+        page, zoom = self.pagenumber, self.zoomfactor
+        changeset = self.document.changeset
+        targets = (
+            (page+1, zoom), (page-1, zoom),
+            (page, self.clampZoom(zoom*N.sqrt(2.))),
+            (page, self.clampZoom(zoom/N.sqrt(2.))),
+        )
+        for tpage, tzoom in targets:
+            if ( tpage < 0 or tpage >= self.document.getNumberPages() or
+                 pageKey(tpage, tzoom, changeset, self.dpi,
+                         self.antialias) in self.pagecache ):
+                continue
+            size = self.document.pageSize(tpage, scaling=tzoom)
+            helper = document.PaintHelper(
+                size, scaling=tzoom, dpi=self.dpi, bitmap=True,
+                antialias=self.antialias)
+            self.rendercontrol.addIdleJob(
+                helper, document.DocumentSnapshot(
+                    self.document, background=True), tpage)
+
+    def slotRecordFailed(self, excinfo):
+        """Show exception dialog if painting the document failed in
+        a rendering thread."""
+        d = exceptiondialog.ExceptionDialog(excinfo, self)
+        d.exec_()
+
     def updatePlotSettings(self):
         """Update plot window settings from settings."""
         self.setTimeout(setting.settingdb['plot_updatepolicy'])
         self.antialias = setting.settingdb['plot_antialias']
         self.rendercontrol.updateNumberThreads()
+        self.pagecache.clear()
+        self.pagecache.maxbytes = (
+            setting.settingdb['plot_prerendermemory']*1024*1024)
         self.actionForceUpdate()
 
     def contextMenuEvent(self, event):
@@ -1037,6 +1349,7 @@ class PlotWindow( qt4.QGraphicsView ):
 
     def actionForceUpdate(self):
         """Force an update for the graph."""
+        self.pagecache.clear()
         self.docchangeset = -100
         self.checkPlotUpdate()
 
@@ -1078,12 +1391,17 @@ class PlotWindow( qt4.QGraphicsView ):
         """Toggle antialias."""
         self.antialias = not self.antialias
         setting.settingdb['plot_antialias'] = self.antialias
+        # also clears pages rendered with the old setting
         self.actionForceUpdate()
 
+    @staticmethod
+    def clampZoom(zoomfactor):
+        """Return zoom factor in allowed range."""
+        return float(max(0.05, min(20, zoomfactor)))
+
     def setZoomFactor(self, zoomfactor):
         """Set the zoom factor of the window."""
-        zoomfactor = max(0.05, min(20, zoomfactor))
-        self.zoomfactor = float(zoomfactor)
+        self.zoomfactor = self.clampZoom(zoomfactor)
         self.checkPlotUpdate()
 
     def slotViewZoomIn(self):